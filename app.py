@@ -1,81 +1,124 @@
 import streamlit as st
 import pandas as pd
 import os
-import json
-import secrets
-from components.data_processing import process_bank_data
-from components.broker import broker_data_process
-from components.pdf_processing import process_pdf_bank_data 
+import hashlib
+import inspect
+from concurrent.futures.process import BrokenProcessPool
+from components.broker import broker_data_process, BROKER_COLUMNS, BROKER_COLUMN_DTYPES
+from components.excel_reader import read_excel_columns
+from components.fuzzy_matching import FUZZY_NAME_THRESHOLD, FUZZY_PREMIUM_TOLERANCE
+from components.match_cascade import MIN_AFFIX_LENGTH
+from components.export import (
+    EXPORT_FORMATS, DEFAULT_EXPORT_FORMAT, export_bytes, export_file_name, format_export_stats
+)
+from components.pdf_extractors import summarize_page_report
+from components.results_view import (
+    PAGE_ROWS, PAGE_SIZES, view_options, view_rows, page_count, result_page, insurer_aggregates
+)
+from components.statements import parse_statement, statement_file_type, detect_bank_from_filename
+from components.bank_detection import DETECTION_MIN_CONFIDENCE, detect_bank
+from components.value_cleaning import parse_amounts, normalize_text
+from components.stage_graph import StageGraph, Fingerprinted
+from components.compaction import concat_frames
+from components.session_snapshot import save_session_snapshot, load_session_snapshot, encode_output
+from components.session_store import (
+    SESSION_TTL_SECONDS, open_session_store, create_session, get_session, end_session, cleanup_expired_sessions,
+    workspace_dir
+)
+from components.jobs import (
+    create_job_pool, submit_job, new_job_id, job_directory, list_jobs, job_result, mark_collected,
+    delete_session_jobs, delete_expired_jobs, job_table, run_comparison, stream_comparison
+)
 from datetime import datetime, timedelta
 
-UPLOAD_DIR = './uploads'
-AUTH_FILE = '.streamlit/auth.json'
+SESSION_LIFETIME = timedelta(seconds=SESSION_TTL_SECONDS)
 
-def clean_and_trim_policy_number(policy):
-    """
-    Clean and trim policy numbers by:
-    1. Removing extra trailing digits beyond 9 digits.
-    2. Zero-padding to ensure consistent 9-digit format.
-    3. Removing non-numeric characters.
-    """
-    if pd.isna(policy):
-        return None
+# Cookie carrying the session id, so reloading the page resumes the session.
+# It is kept out of the URL, where shared links, browser history, screenshots
+# and proxy logs would hand the session to anyone.
+SESSION_COOKIE = 'reconciliation_session'
 
-    # Convert to string and remove non-numeric characters
-    policy_str = ''.join(filter(str.isdigit, str(policy)))
+# Query parameter that carried the session id in earlier versions; it is
+# removed from the URL and never used to resume a session
+LEGACY_SESSION_PARAM = 'session'
 
-    # Trim to the first 9 digits if longer, or pad with zeros if shorter
-    if len(policy_str) > 9:
-        policy_str = policy_str[:9]
-    policy_str = policy_str.zfill(9)
+# Banks a statement can be assigned to
+BANK_NAMES = ["Bajaj", "CARE", "Cholamandalam", "FUTURE", "IFFCO", "LIBERTY",
+              "TATA AIG", "SBI", "HDFC", "RELIANCE", "NATIONAL NEHRU",
+              "MANIPAL SIGNA", "ICICI", "GO-DIGIT", "The New India Pdf", "United Pdf"]
 
-    return policy_str
+FILE_TYPE_CHOICES = ["Excel", "PDF", "DOCX"]
 
+# While jobs are queued or running, the job list refreshes itself this often (seconds)
+JOB_POLL_SECONDS = 1
+
+# st.cache_resource / st.fragment only exist in newer Streamlit releases
+cache_resource = getattr(st, 'cache_resource', None) or st.experimental_singleton
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
 
 def force_login_check():
     """Force login check before any operation"""
-    if os.path.exists(AUTH_FILE) and verify_auth_file():
-        # If valid, rehydrate session state
-        load_auth_status()
+    if get_session(open_session_store(), st.session_state.get('session_id')) is not None:
         return True
-    # If auth file is missing or invalid, reset authentication state
+    # If the session is missing or expired, reset authentication state
     st.session_state.authentication_status = False
     return False
 
 
-def verify_auth_file():
-    """Verify if auth file exists and is valid"""
-    try:
-        if not os.path.exists(AUTH_FILE):
-            return False
+def get_session_cookie():
+    """Return the session id in this browser's session cookie, if any (older Streamlit releases can't read cookies)."""
+    cookies = getattr(getattr(st, 'context', None), 'cookies', None)
+    return cookies.get(SESSION_COOKIE) if cookies is not None else None
 
-        with open(AUTH_FILE, 'r') as f:
-            auth_data = json.load(f)
 
-        # Check session validity
-        if 'session_start_time' in auth_data:
-            session_start_time = datetime.strptime(auth_data['session_start_time'], "%Y-%m-%d %H:%M:%S.%f")
-            if datetime.now() - session_start_time > timedelta(hours=8):
-                os.remove(AUTH_FILE)
-                return False
+def set_session_cookie(session_id):
+    """
+    Keep the session id in a cookie of this browser (None deletes it).
+
+    The cookie is set by a script rendered on every run, so it is there
+    whatever rerun interrupts; it is SameSite=Strict and, over HTTPS, Secure.
+    """
+    value, max_age = ("", 0) if session_id is None else (session_id, SESSION_TTL_SECONDS)
+    # window.parent is the page itself outside the iframe older releases render into
+    script = (
+        "<script>window.parent.document.cookie = "
+        f"'{SESSION_COOKIE}={value}; Max-Age={max_age}; Path=/; SameSite=Strict'"
+        " + (window.parent.location.protocol === 'https:' ? '; Secure' : '');</script>"
+    )
+    html_params = inspect.signature(st.html).parameters if hasattr(st, 'html') else {}
+    if 'unsafe_allow_javascript' in html_params:
+        st.html(script, unsafe_allow_javascript=True)
+    else:
+        from streamlit.components.v1 import html as component_html
+        component_html(script, height=0)
 
-        required_fields = ['username', 'authentication_status', 'session_id']
-        return all(field in auth_data for field in required_fields)
-    except Exception as e:
-        print(f"Auth verification error: {e}")
-        return False
+
+def drop_legacy_session_param():
+    """Remove a session id left in the URL by earlier versions, without using it."""
+    if hasattr(st, 'query_params'):
+        if LEGACY_SESSION_PARAM in st.query_params:
+            del st.query_params[LEGACY_SESSION_PARAM]
+    elif LEGACY_SESSION_PARAM in st.experimental_get_query_params():
+        st.experimental_set_query_params()
 
 
 def init_session_state():
     """Initialize session state variables"""
-    if 'authentication_status' not in st.session_state:
-        st.session_state.authentication_status = False
-
-    # Rehydrate session state from AUTH_FILE if valid
-    if verify_auth_file():
-        load_auth_status()
-    else:
-        # Clear session state if the auth file is invalid
+    # The session store and the session snapshot are read once per browser session;
+    # later reruns use what is already in st.session_state
+    if 'session_loaded' not in st.session_state:
+        drop_legacy_session_param()
+        session = get_session(open_session_store(), get_session_cookie())
+        if session is not None:
+            # Resume the session named in this browser's cookie and restore its data
+            load_session(session)
+            restore_session()
+        else:
+            # Clear session state if the session is unknown or expired
+            clear_session_state()
+    elif (st.session_state.get('authentication_status')
+          and datetime.now() - st.session_state.session_start_time > SESSION_LIFETIME):
+        # Expired while in use
         clear_session_state()
 
     # Initialize other state variables if not present
@@ -83,91 +126,56 @@ def init_session_state():
         'authentication_status': False,
         'username': None,
         'file_data': [],
-        'processed_files': [],
+        'statement_uploads': [],
+        'broker_upload': None,
         'final_submission_done': False,
-        'processed_broker_data': pd.DataFrame(),
-        'combined_df': pd.DataFrame(),
         'session_start_time': datetime.now(),
-        'session_id': generate_session_id() if 'session_id' not in st.session_state else st.session_state.session_id,
+        'session_id': None,
+        'workspace': None,
+        'comparison_requested': False,
     }
 
     for key, default in state_defaults.items():
         if key not in st.session_state:
             st.session_state[key] = default
-    
-    for key, default in state_defaults.items():
-        if key not in st.session_state:
-            st.session_state[key] = default
-    
-    # Load authentication status from file if possible
-    load_auth_status()
+    st.session_state.session_loaded = True
 
 def authenticate(username, password):
     """Authenticate user"""
     if username == "ravi" and password == "12345":
-        st.session_state.authentication_status = True
-        st.session_state.username = username
-        # Generate a secure, persistent session ID
-        st.session_state.session_id = generate_session_id()
-        st.session_state.session_start_time = datetime.now()
-        save_auth_status()
+        conn = open_session_store()
+        cleanup_expired_sessions(conn)
+        delete_expired_jobs()
+        # Start a session with a secure session ID and its own workspace
+        load_session(create_session(conn, username))
         return True
     return False
 
-def generate_session_id():
-    """Generate a unique and secure session ID"""
-    # Use secrets.token_hex for a more secure, persistent session ID
-    return secrets.token_hex(16)
-
-def save_auth_status():
-    """Save authentication status to file"""
-    os.makedirs(os.path.dirname(AUTH_FILE), exist_ok=True)
-    auth_data = {
-        'username': st.session_state.username,
-        'authentication_status': st.session_state.authentication_status,
-        'file_data': st.session_state.file_data,
-        'session_start_time': str(st.session_state.session_start_time),
-        'session_id': st.session_state.session_id
-    }
-    with open(AUTH_FILE, 'w') as f:
-        json.dump(auth_data, f)
-
-def load_auth_status():
-    """Load authentication status from file"""
-    try:
-        if not os.path.exists(AUTH_FILE):
-            # Auth file doesn't exist, initialize default state
-            st.session_state.authentication_status = False
-            st.session_state.username = None
-            return
+def load_session(session):
+    """Put a session from the session store into the session state."""
+    st.session_state.authentication_status = True
+    st.session_state.username = session['username']
+    st.session_state.session_id = session['session_id']
+    st.session_state.session_start_time = datetime.fromtimestamp(session['created_at'])
+    st.session_state.workspace = workspace_dir(session['session_id'])
 
-        with open(AUTH_FILE, 'r') as f:
-            auth_data = json.load(f)
-
-        # Update session state with loaded data
-        st.session_state.authentication_status = auth_data.get('authentication_status', False)
-        st.session_state.username = auth_data.get('username')
-        st.session_state.file_data = auth_data.get('file_data', [])
-        st.session_state.session_id = auth_data.get('session_id')
-        st.session_state.session_start_time = datetime.strptime(
-            auth_data['session_start_time'], 
-            "%Y-%m-%d %H:%M:%S.%f"
-        )
-    except Exception as e:
-        print(f"Error loading auth status: {e}")
-        # Reset session state on error
-        st.session_state.authentication_status = False
-        st.session_state.username = None
+def workspace_path(*parts):
+    """Return a path in this session's workspace, creating its directory."""
+    path = os.path.join(st.session_state.workspace, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
 
 
 def clear_session_state():
-    """Clear session state and remove temporary files"""
-    # Clear auth file
-    try:
-        if os.path.exists(AUTH_FILE):
-            os.remove(AUTH_FILE)
-    except Exception as e:
-        print(f"Error removing auth file: {e}")
+    """End the current session: remove its workspace and clear the session state"""
+    # Drop the memoized stage outputs, including their spill files
+    if 'stage_graph' in st.session_state:
+        st.session_state.stage_graph.clear()
+
+    # Only this session's workspace (uploads, snapshot) is removed
+    if st.session_state.get('authentication_status') and st.session_state.get('session_id'):
+        delete_session_jobs(st.session_state.session_id)
+        end_session(open_session_store(), st.session_state.session_id)
 
     # Clear all session state
     for key in list(st.session_state.keys()):
@@ -176,14 +184,6 @@ def clear_session_state():
     # Reset authentication status
     st.session_state.authentication_status = False
 
-    # Clear upload directory
-    if os.path.exists(UPLOAD_DIR):
-        for file in os.listdir(UPLOAD_DIR):
-            try:
-                os.remove(os.path.join(UPLOAD_DIR, file))
-            except Exception as e:
-                print(f"Error removing file {file}: {e}")
-
 def logout():
     """Handle logout"""
     clear_session_state()
@@ -191,6 +191,9 @@ def logout():
 
 def login():
     """Display login form"""
+    # A session cookie left by a logout or an expired session is removed
+    if get_session_cookie() is not None:
+        set_session_cookie(None)
     st.title("Login")
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
@@ -214,6 +217,7 @@ def main():
         return
     
     # Rest of your main application logic
+    set_session_cookie(st.session_state.session_id)
     st.title("File Upload and Analysis System")
     
     # Add logout to sidebar
@@ -221,10 +225,52 @@ def main():
         st.write(f"Welcome {st.session_state.username}!")
         if st.button("Logout"):
             logout()
-    
+
+        # Endorsement matching settings used by the final comparison
+        st.subheader("Endorsement Matching")
+        st.checkbox("Fuzzy-match endorsements", value=True, key="fuzzy_endorsements")
+        st.slider("Minimum name similarity", 0.5, 1.0, FUZZY_NAME_THRESHOLD, 0.01, key="fuzzy_threshold")
+        st.number_input("Premium tolerance", min_value=0.01, value=FUZZY_PREMIUM_TOLERANCE, step=0.5,
+                        key="premium_tolerance")
+
+        # Policies without an exact policy number match
+        st.subheader("Policy Matching")
+        st.checkbox("Match by 9-digit number, prefix / suffix, then name and premium", value=True,
+                    key="match_cascade")
+        st.number_input("Shortest prefix / suffix", min_value=3, value=MIN_AFFIX_LENGTH, step=1,
+                        key="min_affix_length")
+        st.checkbox("Compare insurers in parallel", value=False, key="sharded_comparison")
+
+        # Skip broker rows already settled in earlier runs
+        st.checkbox("Only reconcile new / changed rows (ledger)", value=False, key="use_ledger")
+
+        # Broker files too large to load at once are compared chunk by chunk into a results file
+        st.subheader("Large Broker Files")
+        st.checkbox("Stream the broker file (results as a download only)", value=False, key="stream_broker",
+                    help="The broker file is read and compared in chunks and its rows aren't shown; the ledger "
+                         "and parallel insurer settings don't apply.")
+
+        # Format of the downloadable results
+        st.selectbox("Download format", list(EXPORT_FORMATS), index=list(EXPORT_FORMATS).index(DEFAULT_EXPORT_FORMAT),
+                     key="export_format")
+
+        show_session_memory()
+
+    # Take in finished jobs before showing the pages that use their results
+    collect_finished_jobs()
+    show_jobs()
+
     # Your existing file upload and processing logic goes here
     upload_and_process_files()
 
+def show_session_memory():
+    """Show the memory held by this session's data (the memoized stage outputs)."""
+    stats = get_stage_graph().summary()
+    text = f"Session data: {stats['bytes'] / 1024 ** 2:.1f} MiB in memory ({stats['entries']} stage outputs)"
+    if stats['spilled_entries']:
+        text += f", {stats['spilled_bytes'] / 1024 ** 2:.1f} MiB spilled to disk ({stats['spilled_entries']} outputs)"
+    st.caption(text)
+
 def show_sidebar():
     """Display sidebar with logout option"""
     with st.sidebar:
@@ -236,19 +282,27 @@ def show_sidebar():
 def upload_and_process_files():
     """Handle insurance file uploads and processing"""
     st.header("Upload Insurance Files for Analysis")
-    uploaded_file = st.file_uploader("Select a file to upload", type=["xlsx", "xls", "pdf", "docx"])
-    file_type = st.selectbox("Select the file type", ["Excel", "PDF", "DOCX"])
-    
-    # Updated list of bank names with new entries
-    bank_names = ["Bajaj", "CARE", "Cholamandalam", "FUTURE", "IFFCO", "LIBERTY", 
-                  "TATA AIG", "SBI", "HDFC", "RELIANCE", "NATIONAL NEHRU", 
-                  "MANIPAL SIGNA", "ICICI", "GO-DIGIT", "The New India Pdf", "United Pdf"]
-    
-    selected_bank = st.selectbox("Select a Bank", bank_names)
-
-    if st.button("Add File for Analysis"):
-        if uploaded_file and file_type:
-            process_uploaded_file(uploaded_file, file_type, selected_bank)
+    uploaded_files = st.file_uploader(
+        "Select the files to upload", type=["xlsx", "xls", "pdf", "docx"], accept_multiple_files=True
+    )
+    assignments = assign_statement_files(uploaded_files or [])
+
+    if st.button("Add Files for Analysis"):
+        missing = [uploaded_file.name for uploaded_file, _, bank in assignments if not bank]
+        if missing:
+            st.warning(f"Select a bank for: {', '.join(missing)}")
+        # Each file is parsed in its own job, so the files are parsed concurrently
+        for uploaded_file, file_type, bank in assignments:
+            if not bank:
+                continue
+            detected, confidence = guess_bank(uploaded_file)
+            if confidence is not None and detected != bank:
+                # Caught here rather than by validate_columns after a full parse
+                st.warning(
+                    f"'{uploaded_file.name}' looks like a {detected} statement ({confidence:.0%} of its columns "
+                    f"found); it is parsed as {bank}."
+                )
+            process_uploaded_file(uploaded_file, file_type, bank)
 
     if st.button("Final Submission"):
         combine_and_save_processed_files()
@@ -256,53 +310,227 @@ def upload_and_process_files():
     if st.session_state.final_submission_done:
         handle_broker_file_upload()
 
+def guess_file_type(file_name):
+    """Pre-fill the file type of an upload from its extension."""
+    if file_name.lower().endswith(".docx"):
+        return "DOCX"
+    return statement_file_type(file_name) or "Excel"
+
+def guess_bank(uploaded_file):
+    """
+    Pre-fill the bank of an upload from its header, or failing that from its file name.
+
+    Returns:
+    tuple: (bank or None, header detection confidence or None); detections are
+        kept in the session state so reruns don't read the file again.
+    """
+    detections = st.session_state.setdefault('bank_detections', {})
+    key = (uploaded_file.name, uploaded_file.size)
+    if key not in detections:
+        bank, confidence = detect_bank(uploaded_file, uploaded_file.name, BANK_NAMES)
+        if confidence < DETECTION_MIN_CONFIDENCE:
+            bank, confidence = detect_bank_from_filename(uploaded_file.name, BANK_NAMES), None
+        detections[key] = (bank, confidence)
+    return detections[key]
+
+def describe_detection(bank, confidence):
+    """How a pre-filled bank was found, for the file table."""
+    if bank is None:
+        return "not detected"
+    return "file name" if confidence is None else f"header ({confidence:.0%})"
+
+def assign_statement_files(uploaded_files):
+    """
+    Let the user set the type and bank of each uploaded file, pre-filled from its header or file name.
+
+    Returns:
+    list: (uploaded file, file type, bank or None) per file.
+    """
+    if not uploaded_files:
+        return []
+    detections = [guess_bank(uploaded_file) for uploaded_file in uploaded_files]
+    guesses = pd.DataFrame({
+        'File': [uploaded_file.name for uploaded_file in uploaded_files],
+        'Type': [guess_file_type(uploaded_file.name) for uploaded_file in uploaded_files],
+        'Bank': [bank for bank, _ in detections],
+        'Detected from': [describe_detection(*detection) for detection in detections],
+    })
+
+    if hasattr(st, 'data_editor'):
+        edited = st.data_editor(
+            guesses,
+            column_config={
+                'File': st.column_config.TextColumn(disabled=True),
+                'Type': st.column_config.SelectboxColumn(options=FILE_TYPE_CHOICES, required=True),
+                'Bank': st.column_config.SelectboxColumn(options=BANK_NAMES),
+                'Detected from': st.column_config.TextColumn(disabled=True),
+            },
+            hide_index=True,
+            key="statement_assignments",
+        )
+        return [
+            (uploaded_file, row['Type'], row['Bank'] if isinstance(row['Bank'], str) else None)
+            for uploaded_file, (_, row) in zip(uploaded_files, edited.iterrows())
+        ]
+
+    # Older Streamlit releases: one pair of select boxes per file
+    assignments = []
+    for i, (uploaded_file, (_, guess)) in enumerate(zip(uploaded_files, guesses.iterrows())):
+        type_col, bank_col = st.columns(2)
+        file_type = type_col.selectbox(
+            f"Type of {uploaded_file.name}", FILE_TYPE_CHOICES, index=FILE_TYPE_CHOICES.index(guess['Type']),
+            key=f"file_type_{i}"
+        )
+        # Undetected files (NaN in guesses) start on the blank first option, i.e. no bank until one is picked
+        bank_choices = [None] + BANK_NAMES
+        detected = guess['Bank'] if isinstance(guess['Bank'], str) else None
+        bank = bank_col.selectbox(
+            f"Bank of {uploaded_file.name}", bank_choices, index=bank_choices.index(detected),
+            format_func=lambda name: name or "(select a bank)", key=f"bank_{i}"
+        )
+        assignments.append((uploaded_file, file_type, bank))
+    return assignments
+
 def process_uploaded_file(uploaded_file, file_type, selected_bank):
     """Process the uploaded insurance file"""
-    file_path = f"./uploads/{uploaded_file.name}"
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    file_bytes = uploaded_file.getvalue()
+    file_path = workspace_path("uploads", uploaded_file.name)
     with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    
+        f.write(file_bytes)
+
+    if file_type not in ("Excel", "PDF"):
+        # Unsupported file type
+        st.warning(f"'{uploaded_file.name}': only Excel and PDF files are currently supported for processing.")
+        return
+
     try:
-        if file_type == "Excel":
-            # Read the file directly and pass it to process_bank_data for further processing
-            df = pd.read_excel(file_path)
-            processed_data = process_bank_data(df, selected_bank)
-            st.session_state.processed_files.append(processed_data)
-            st.success(f"File '{uploaded_file.name}' processed successfully.")
-            st.dataframe(processed_data)
-        
-        elif file_type == "PDF":
-            # Process PDF file
-            processed_data = process_pdf_bank_data(file_path, selected_bank)
-            st.session_state.processed_files.append(processed_data)
-            st.success(f"File '{uploaded_file.name}' processed and tabular data extracted successfully.")
-            st.dataframe(processed_data)
-        
+        # Re-uploads of the same statement are served from the parse cache
+        upload = Fingerprinted(
+            {'name': uploaded_file.name, 'path': file_path, 'file_type': file_type, 'bank': selected_bank},
+            f"{hashlib.sha256(file_bytes).hexdigest()}:{file_type}:{selected_bank}"
+        )
+        graph = get_stage_graph()
+        fingerprint = graph.fingerprint('parse', upload=upload)
+        if graph.is_memoized(fingerprint):
+            add_statement_upload(upload)
+            show_parsed_statement(upload)
+        elif find_pending_job(fingerprint) is not None:
+            st.info(f"File '{uploaded_file.name}' is already being processed.")
         else:
-            # Unsupported file type
-            st.warning("Only Excel and PDF files are currently supported for processing.")
-            return
+            # Parsed by a worker process; the job list shows its progress and the
+            # statement is added once it is done
+            submit_session_job(
+                'parse', f"{uploaded_file.name} ({selected_bank})",
+                {'upload': upload.value, 'upload_fingerprint': upload.fingerprint, 'fingerprint': fingerprint}
+            )
+            st.info(f"File '{uploaded_file.name}' queued for processing. You can add more files meanwhile.")
 
     except Exception as e:
         # Handle any errors during file processing
         st.error(f"Error processing the file: {e}")
 
+def add_statement_upload(upload):
+    """Add a parsed statement to the session (once)."""
+    if upload not in st.session_state.statement_uploads:
+        st.session_state.statement_uploads.append(upload)
+        save_session()
+
+def show_parsed_statement(upload):
+    """Show a parsed statement with how it was extracted."""
+    processed_data, from_cache = get_stage_graph().run('parse', upload=upload)
+    name = upload.value['name']
+    if from_cache:
+        st.success(f"File '{name}' loaded from the parse cache.")
+    elif upload.value['file_type'] == "Excel":
+        st.success(f"File '{name}' processed successfully.")
+    else:
+        st.success(f"File '{name}' processed and tabular data extracted successfully.")
 
+    # Show which extractor backend handled the pages and how long it took
+    for backend, stats in summarize_page_report(processed_data.attrs.get("page_report", [])).items():
+        st.caption(f"{backend}: {stats['pages']} pages in {stats['seconds']:.2f}s")
+    fingerprint = get_stage_graph().fingerprint('parse', upload=upload)
+    show_frame(Fingerprinted(processed_data, fingerprint), f"statement_{fingerprint[:16]}")
 
 
 def combine_and_save_processed_files():
     """Combine processed files and save the output"""
-    if st.session_state.processed_files:
-        st.session_state.combined_df = pd.concat(st.session_state.processed_files, ignore_index=True)
-        output_path = "./uploads/final_output.xlsx"
-        st.session_state.combined_df.to_excel(output_path, index=False)
-        st.success(f"All files combined and saved to '{output_path}'.")
-        st.dataframe(st.session_state.combined_df)
+    if st.session_state.statement_uploads:
+        graph = get_stage_graph()
+        uploads = st.session_state.statement_uploads
+        combined = Fingerprinted(graph.run('combine', uploads=uploads), graph.fingerprint('combine', uploads=uploads))
+        st.success("All files combined.")
+        offer_download(combined, "Download combined statements", "final_output")
+        show_frame(combined, "combined")
         st.session_state.final_submission_done = True
+        save_session()
     else:
         st.warning("No files have been processed for final submission.")
 
+def offer_download(frame, label, base_name):
+    """Offer a (fingerprinted) DataFrame as a download in the format selected in the sidebar."""
+    export_format = st.session_state.get('export_format', DEFAULT_EXPORT_FORMAT)
+    data, stats = get_stage_graph().run('export', frame=frame, export_format=export_format)
+    st.download_button(
+        label,
+        data=data,
+        file_name=export_file_name(base_name, export_format),
+        mime=EXPORT_FORMATS[export_format]["mime"],
+        key=f"download_{base_name}"
+    )
+    st.caption(format_export_stats(stats))
+
+def show_frame(frame, key):
+    """
+    Show a (fingerprinted) DataFrame without sending all of it to the browser.
+
+    Frames with an insurer column open on their per-insurer aggregates. The
+    rows are filtered and sorted on FOUND / SOURCE / DIFFERENCE on the server
+    (see components/results_view.py) and sent one page at a time; the
+    aggregates and the filtered row positions are memoized in the stage
+    graph, so paging only slices the frame.
+    """
+    graph = get_stage_graph()
+    df = frame.value
+    aggregates = graph.run('aggregate', frame=frame)
+    views = ["Rows"] if aggregates is None else ["Summary by insurer", "Rows"]
+    if st.radio(f"{len(df)} rows", views, key=f"{key}_view") != "Rows":
+        st.dataframe(aggregates)
+        return
+
+    options = graph.run('view_options', frame=frame)
+    view = {}
+    filters = st.columns(3)
+    for column, role in zip(filters, ('FOUND', 'SOURCE')):
+        if role in options:
+            view[role] = column.multiselect(role, options[role], key=f"{key}_{role.lower()}")
+    if 'DIFFERENCE' in options:
+        low, high = options['DIFFERENCE']
+        if low < high:
+            bounds = filters[2].slider("DIFFERENCE", low, high, (low, high), key=f"{key}_difference")
+            view['difference'] = tuple(None if bound == limit else bound for bound, limit in zip(bounds, (low, high)))
+        view['nonzero_difference'] = filters[2].checkbox("Only rows with a difference", key=f"{key}_nonzero")
+
+    sorting = st.columns(3)
+    sort_by = sorting[0].selectbox("Sort by", ["(file order)"] + options['sort_keys'], key=f"{key}_sort")
+    if sort_by != "(file order)":
+        view['sort_by'] = sort_by
+        view['ascending'] = not sorting[0].checkbox("Descending", key=f"{key}_descending")
+    page_rows = sorting[1].selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(PAGE_ROWS),
+                                     key=f"{key}_page_rows")
+    rows = graph.run('view_rows', frame=frame, view=view)
+    pages = page_count(rows, page_rows)
+    # Filtering can leave fewer pages than the page shown
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = sorting[2].number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=page_key)
+
+    start = (page - 1) * page_rows
+    st.caption(f"Rows {min(start + 1, len(rows))}-{min(start + page_rows, len(rows))} of {len(rows)} "
+               f"matching rows ({len(df)} in total)")
+    st.dataframe(result_page(df, rows, page, page_rows))
+
 def handle_broker_file_upload():
     """Handle broker file upload and comparison"""
     st.header("Upload the Broker File for Comparison")
@@ -312,26 +540,41 @@ def handle_broker_file_upload():
 
 def process_broker_file(broker_file):
     """Process the uploaded broker file"""
-    broker_path = f"./uploads/{broker_file.name}"
-    with open(broker_path, "wb") as f:
-        f.write(broker_file.getbuffer())
+    data = broker_file.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    # Saved under its hash, so reruns with the same upload don't write it again
+    broker_path = workspace_path("uploads", f"{digest[:16]}-{broker_file.name}")
+    if not os.path.exists(broker_path):
+        with open(broker_path, "wb") as f:
+            f.write(data)
+    broker_upload = Fingerprinted({'name': broker_file.name, 'path': broker_path}, digest)
+    # Large-file mode never loads the whole broker file
+    streamed = st.session_state.get('stream_broker', False)
     try:
-        # Read the broker file into a DataFrame
-        broker_df = pd.read_excel(broker_path)
-
-        # Pass the raw broker DataFrame directly to broker_data_process
-        processed_broker_data = broker_data_process(broker_df)
-
-        # Save the processed data to session state
-        st.session_state.processed_broker_data = processed_broker_data
+        if not streamed:
+            # Read and normalize the broker file; reruns with the same upload reuse the memoized result
+            processed_broker_data = get_stage_graph().run('normalize_broker', broker_upload=broker_upload)
+        # Only the upload is kept in the session; the processed data lives in the stage graph
+        if st.session_state.broker_upload != broker_upload:
+            st.session_state.broker_upload = broker_upload
+            save_session()
 
         # Notify the user and display the processed DataFrame
         st.success("Broker file uploaded successfully.")
-        st.dataframe(processed_broker_data)
+        if streamed:
+            st.info("Large-file mode: the broker file is compared chunk by chunk; its rows aren't shown.")
+        else:
+            fingerprint = get_stage_graph().fingerprint('normalize_broker', broker_upload=broker_upload)
+            show_frame(Fingerprinted(processed_broker_data, fingerprint), "broker")
 
-        # Trigger the final comparison if the button is pressed
+        # Trigger the final comparison if the button is pressed; once requested,
+        # its results are shown on every rerun (they arrive when its job is done)
+        compare = perform_streamed_comparison if streamed else perform_final_comparison
         if st.button("Process Broker File"):
-            perform_final_comparison()
+            st.session_state.comparison_requested = True
+            compare(submit=True)
+        elif st.session_state.comparison_requested:
+            compare(submit=False)
 
     except Exception as e:
         # Handle any errors during file processing
@@ -346,31 +589,10 @@ def normalize_column_names(df):
 def preprocess_dataframe(df):
     """Clean and preprocess dataframe values"""
     for col in df.columns:
-        if df[col].dtype == 'object':
-            df[col] = df[col].astype(str).str.strip().str.upper()
+        if df[col].dtype == 'object' or isinstance(df[col].dtype, pd.StringDtype):
+            df[col] = normalize_text(df[col])
     return df
 
-def map_bank_names(bank_name):
-    """Map short bank names to full names"""
-    bank_map = {
-        "BAJAJ": "BAJAJ ALLIANZ GENERAL INSURANCE COMPANY LIMITED",
-        "CARE": "CARE HEALTH INSURANCE LIMITED",
-        "CHOLAMANDALAM": "CHOLAMANDALAM MS GENERAL INSURANCE COMPANY LIMITED",
-        "FUTURE": "FUTURE GENERALI INDIA INSURANCE COMPANY LIMITED",
-        "IFFCO": "IFFCO TOKIO GENERAL INSURANCE COMPANY LIMITED",
-        "LIBERTY": "LIBERTY GENERAL INSURANCE LIMITED",
-        "GO-DIGIT": "GO DIGIT GENERAL INSURANCE LIMITED",
-        "HDFC": "HDFC ERGO GENERAL INSURANCE COMPANY LIMITED",
-        "ICICI": "ICICI LOMBARD GENERAL INSURANCE COMPANY LIMITED",
-        "MANIPAL SIGNA": "MANIPALCIGNA HEALTH INSURANCE COMPANY LIMITED",
-        "NATIONAL NEHRU": "NATIONAL INSURANCE COMPANY LIMITED",
-        "RELIANCE": "RELIANCE GENERAL INSURANCE COMPANY LIMITED",
-        "SBI": "SBI GENERAL INSURANCE COMPANY LIMITED",
-        "TATA AIG": "TATA AIG GENERAL INSURANCE COMPANY LIMITED",
-        "UNITED PDF": "UNITED INDIA INSURANCE COMPANY LIMITED"
-    }
-    return bank_map.get(bank_name.upper(), bank_name)
-
 def standardize_endorsement_values(df):
     """Standardize endorsement-related values"""
     if 'INSNATURE' in df.columns:
@@ -400,7 +622,7 @@ def normalize_premium_columns(df):
     
     for old_col, new_col in premium_column_mappings.items():
         if old_col in df.columns:
-            df[new_col] = pd.to_numeric(df[old_col], errors='coerce')
+            df[new_col] = parse_amounts(df[old_col])
             
     return df
 
@@ -415,108 +637,172 @@ def normalize_customer_names(df):
     
     for old_col, new_col in customer_column_mappings.items():
         if old_col in df.columns:
-            df[new_col] = df[old_col].str.strip().str.upper()
+            df[new_col] = normalize_text(df[old_col])
     
     return df
 
-def perform_final_comparison():
+def perform_final_comparison(submit):
+    """
+    Show the comparison results, or queue the comparison as a job.
+
+    Parameters:
+    submit (bool): Queue the comparison if its results aren't there yet and it isn't running.
+    """
     try:
-        # Get combined bank and broker data from session state
-        combined_df = st.session_state.combined_df.copy()
-        broker_df = st.session_state.processed_broker_data.copy()
+        graph = get_stage_graph()
+        combined_df = graph.run('combine', uploads=st.session_state.statement_uploads)
+        broker_df = graph.run('normalize_broker', broker_upload=st.session_state.broker_upload)
 
-        if combined_df.empty or broker_df.empty:
-            st.error("One or both datasets are empty. Cannot proceed with comparison.")
+        # Debug: Check column names
+        st.write("Combined DataFrame columns:", combined_df.columns.str.strip().str.upper().tolist())
+        st.write("Broker DataFrame columns:", broker_df.columns.str.strip().str.upper().tolist())
+
+        # Reconcile bank and broker data (memoized on the uploads and options) in a worker process
+        inputs = comparison_inputs()
+        fingerprint = graph.fingerprint('compare', **inputs)
+        if not graph.is_memoized(fingerprint):
+            if find_pending_job(fingerprint) is not None:
+                st.info("The comparison is running; its results appear here when it is done.")
+            elif submit:
+                job_id = new_job_id()
+                # The worker memory-maps its inputs from the job directory
+                encoded = encode_output(
+                    [combined_df, broker_df], job_directory(st.session_state.workspace, job_id), "input"
+                )
+                submit_session_job(
+                    'compare', "Comparison",
+                    {'inputs': encoded, 'options': inputs['compare_options'], 'fingerprint': fingerprint},
+                    job_id=job_id
+                )
+                st.info("Comparison queued; its results appear here when it is done.")
             return
 
-        # Normalize column names for consistency
-        combined_df.columns = combined_df.columns.str.strip().str.upper()
-        broker_df.columns = broker_df.columns.str.strip().str.upper()
+        merged_df, ledger_summary, shard_timings = graph.run('compare', **inputs)
 
-        # Debug: Check column names
-        st.write("Combined DataFrame columns:", combined_df.columns.tolist())
-        st.write("Broker DataFrame columns:", broker_df.columns.tolist())
+        if ledger_summary is not None:
+            st.info(
+                f"Ledger: {ledger_summary['settled_rows']} of {ledger_summary['broker_rows']} broker rows already "
+                f"settled; {ledger_summary['new_rows']} new, {ledger_summary['changed_rows']} changed, "
+                f"{ledger_summary['unchanged_rows']} unchanged rows reconciled."
+            )
+            if merged_df.empty:
+                st.success("Nothing new to reconcile.")
+                return
 
-        # Ensure PARSED_POLICY_NUMBER_BANK exists
-        if 'PARSED_POLICY_NUMBER_BANK' not in combined_df.columns:
-            st.error("PARSED_POLICY_NUMBER_BANK column is missing in Combined DataFrame.")
-            return
+        # Display the results in Streamlit
+        st.success("Comparison completed successfully!")
+        results = Fingerprinted(merged_df, graph.fingerprint('compare', **inputs))
+        offer_download(results, "Download comparison results", "comparison_results")
+        show_frame(results, "results")
 
-        # Map the SOURCE column in the bank data to broker bank names
-        combined_df['SOURCE_MAPPED'] = combined_df['SOURCE'].apply(map_bank_names)
-
-        # Filter broker data to include only banks listed in the mapped source column of combined_df
-        relevant_banks = combined_df['SOURCE_MAPPED'].unique()
-        st.write("Relevant Banks after Mapping:", relevant_banks)
-        filtered_broker_df = broker_df[broker_df['BANK NAME'].isin(relevant_banks)]
-
-        # Split broker data into endorsement and regular policies
-        endorsement_broker = filtered_broker_df[filtered_broker_df['INSURANCE NATURE'] == 'Endorsment']
-        regular_broker = filtered_broker_df[filtered_broker_df['INSURANCE NATURE'] != 'Endorsment']
-
-        # Match regular policies on policy number (PARSED_POLICY_NUMBER)
-        merged_regular = pd.merge(
-            regular_broker,
-            combined_df,
-            left_on='PARSED_POLICY_REFERENCE',
-            right_on='PARSED_POLICY_NUMBER_BANK',
-            how='left',
-            suffixes=('_BROKER', '_BANK'),
-            indicator=True
-        )
+        # Display summary statistics
+        display_results_summary(graph.run('summarize', **inputs))
+        show_shard_timings(shard_timings)
 
-        # Match endorsement policies on customer name and premium
-        merged_endorsement = pd.merge(
-            endorsement_broker,
-            combined_df,
-            left_on=['CUSTOMER NAME', 'TOTAL PREMIUM'],
-            right_on=['CUSTOMER NAME', 'PREMIUM BANK'],
-            how='left',
-            suffixes=('_BROKER', '_BANK'),
-            indicator=True
-        )
+    except Exception as e:
+        st.error(f"An error occurred during comparison: {str(e)}")
 
-        # Combine the results
-        merged_df = pd.concat([merged_regular, merged_endorsement], ignore_index=True)
 
-        # Add FOUND column based on the _merge column
-        merged_df['FOUND'] = merged_df['_merge'].map({
-            'both': 'Matched',
-            'left_only': 'Not Found in Bank',
-            'right_only': 'Not Found in Broker'
-        })
+def show_shard_timings(timings):
+    """Show how long each insurer shard of a sharded comparison took, slowest first."""
+    if not timings:
+        return
+    table = pd.DataFrame(timings).sort_values('seconds', ascending=False).set_index('insurer')
+    st.write(f"Time per insurer ({len(table)} shards, slowest {table['seconds'].iloc[0]:.2f}s):")
+    st.dataframe(table.round({'seconds': 2}))
 
-        # Calculate the DIFF column (difference in commissions)
-        merged_df['DIFFERENCE'] = merged_df.apply(
-            lambda row: (
-                row['TOTAL COMMISSION BROKER'] - row['TOTAL COMMISSION']
-                if pd.notna(row['TOTAL COMMISSION BROKER']) and pd.notna(row['TOTAL COMMISSION'])
-                else 0
-            ),
-            axis=1
-        )
 
-        # Drop unnecessary columns
-        merged_df.drop(columns=['_merge', 'SOURCE_MAPPED'], inplace=True)
+def perform_streamed_comparison(submit):
+    """
+    Show the results of the large-file comparison, or queue it as a job.
 
-        # Save the final merged data to an Excel file
-        output_path = './comparison_results.xlsx'
-        merged_df.to_excel(output_path, index=False)
+    The broker file is streamed (see components/broker_stream.py) and the
+    results are written to a file in the session's workspace, offered as a
+    download next to their per-insurer aggregates; they are never loaded.
 
-        # Display the results in Streamlit
-        st.success(f"Comparison completed successfully! Results saved to {output_path}")
-        st.dataframe(merged_df)
+    Parameters:
+    submit (bool): Queue the comparison if its results aren't there yet and it isn't running.
+    """
+    try:
+        graph = get_stage_graph()
+        inputs = streamed_comparison_inputs()
+        fingerprint = graph.fingerprint('stream_compare', **inputs)
+        if not graph.is_memoized(fingerprint):
+            if find_pending_job(fingerprint) is not None:
+                st.info("The comparison is running; its results appear here when it is done.")
+            elif submit:
+                job_id = new_job_id()
+                combined_df = graph.run('combine', uploads=st.session_state.statement_uploads)
+                # The worker memory-maps the bank data from the job directory and reads the broker file in chunks
+                encoded = encode_output(combined_df, job_directory(st.session_state.workspace, job_id), "input")
+                submit_session_job(
+                    'stream_compare', "Comparison (large file)",
+                    {'inputs': encoded, 'broker_path': st.session_state.broker_upload.value['path'],
+                     'options': inputs['stream_options'], 'fingerprint': fingerprint},
+                    job_id=job_id
+                )
+                st.info("Comparison queued; its results appear here when it is done.")
+            return
 
-        # Display summary statistics
-        display_results_summary(merged_df)
+        summary, aggregates, results_path = graph.run('stream_compare', **inputs)
+        st.success(
+            f"Comparison completed successfully: {summary['broker_rows']} broker rows in {summary['chunks']} "
+            f"chunks, {summary['rows']} result rows in {summary['seconds']:.1f}s."
+        )
+        export_format = inputs['stream_options']['export_format']
+        with open(results_path, "rb") as f:
+            st.download_button(
+                "Download comparison results",
+                data=f,
+                file_name=os.path.basename(results_path),
+                mime=EXPORT_FORMATS[export_format]["mime"],
+                key="download_streamed_results"
+            )
+        if aggregates is not None:
+            st.dataframe(aggregates)
+
+        found = summary['found']
+        display_results_summary({
+            'total': summary['rows'],
+            'matched': found.get('Matched', 0),
+            'not_in_bank': found.get('Not Found in Bank', 0),
+            'not_in_broker': found.get('Not Found in Broker', 0),
+            'stages': summary['stages'],
+        })
 
     except Exception as e:
         st.error(f"An error occurred during comparison: {str(e)}")
 
 
+def comparison_inputs():
+    """Inputs of the compare stage: the uploads and the comparison options from the sidebar."""
+    return {
+        'uploads': st.session_state.statement_uploads,
+        'broker_upload': st.session_state.broker_upload,
+        'compare_options': {
+            'fuzzy_endorsements': st.session_state.get('fuzzy_endorsements', True),
+            'name_threshold': st.session_state.get('fuzzy_threshold', FUZZY_NAME_THRESHOLD),
+            'premium_tolerance': st.session_state.get('premium_tolerance', FUZZY_PREMIUM_TOLERANCE),
+            'cascade': st.session_state.get('match_cascade', True),
+            'min_affix_length': st.session_state.get('min_affix_length', MIN_AFFIX_LENGTH),
+            'sharded': st.session_state.get('sharded_comparison', False),
+            'use_ledger': st.session_state.get('use_ledger', False),
+        },
+    }
 
 
-
+def streamed_comparison_inputs():
+    """Inputs of the stream_compare stage: the uploads, the matching options and the download format."""
+    options = dict(comparison_inputs()['compare_options'])
+    # Streaming compares with compare_bank_and_broker itself, chunk by chunk
+    options.pop('sharded')
+    options.pop('use_ledger')
+    options['export_format'] = st.session_state.get('export_format', DEFAULT_EXPORT_FORMAT)
+    return {
+        'uploads': st.session_state.statement_uploads,
+        'broker_upload': st.session_state.broker_upload,
+        'stream_options': options,
+    }
 
 
 def calculate_commission_difference(row):
@@ -530,19 +816,204 @@ def calculate_commission_difference(row):
     else:
         return -float(row.get('TOTAL COMMISSION BROKER', 0) or 0)
 
-def display_results_summary(merged_df):
-    """Display summary statistics of the comparison results."""
-    total_records = len(merged_df)
-    matched = len(merged_df[merged_df['FOUND'] == 'Matched'])
-    not_in_bank = len(merged_df[merged_df['FOUND'] == 'Not Found in Bank'])
-    not_in_broker = len(merged_df[merged_df['FOUND'] == 'Not Found in Broker'])
+def summarize_results(comparison):
+    """Count the comparison results per FOUND status."""
+    merged_df = comparison[0]
+    counts = merged_df['FOUND'].value_counts() if 'FOUND' in merged_df.columns else pd.Series(dtype=int)
+    return {
+        'total': len(merged_df),
+        'matched': int(counts.get('Matched', 0)),
+        'not_in_bank': int(counts.get('Not Found in Bank', 0)),
+        'not_in_broker': int(counts.get('Not Found in Broker', 0)),
+        'stages': {
+            str(stage): int(count) for stage, count in merged_df['MATCH STAGE'].value_counts(sort=False).items()
+        } if 'MATCH STAGE' in merged_df.columns else {},
+    }
 
+def display_results_summary(summary):
+    """Display summary statistics of the comparison results."""
     st.write("Comparison Summary:")
-    st.write(f"Total Records: {total_records}")
-    st.write(f"Matched Records: {matched}")
-    st.write(f"Records Not Found in Bank: {not_in_bank}")
-    st.write(f"Records Not Found in Broker: {not_in_broker}")
+    st.write(f"Total Records: {summary['total']}")
+    st.write(f"Matched Records: {summary['matched']}")
+    st.write(f"Records Not Found in Bank: {summary['not_in_bank']}")
+    st.write(f"Records Not Found in Broker: {summary['not_in_broker']}")
+    for stage, count in summary.get('stages', {}).items():
+        st.write(f"Matched by {stage}: {count}")
+
+
+# Pipeline stages, memoized per session so Streamlit reruns only recompute
+# the stages whose inputs changed
+
+def parse_upload(upload):
+    """Parse one uploaded statement; returns (DataFrame, loaded from the parse cache)."""
+    return parse_statement(upload['path'], upload['file_type'], upload['bank'], parallel=True)
+
+def stream_broker_upload(combined_df, broker_upload, options):
+    """Compare with the saved broker upload streamed in chunks, writing the results into the workspace."""
+    return stream_comparison(combined_df, broker_upload['path'], options, workspace_path("results"))
+
+def read_broker_upload(broker_upload):
+    """Read the columns broker_data_process needs from the saved broker upload."""
+    return read_excel_columns(broker_upload['path'], BROKER_COLUMNS, BROKER_COLUMN_DTYPES)
+
+def build_stage_graph(spill_dir):
+    """Build the upload -> parse -> normalize -> combine -> compare -> summarize stage graph."""
+    graph = StageGraph(spill_dir=spill_dir)
+    graph.add_stage('parse', parse_upload, ['upload'])
+    graph.add_stage(
+        'combine',
+        lambda uploads: concat_frames(graph.run('parse', upload=upload)[0] for upload in uploads),
+        ['uploads']
+    )
+    graph.add_stage('read_broker', read_broker_upload, ['broker_upload'])
+    graph.add_stage('normalize_broker', broker_data_process, ['read_broker'])
+    graph.add_stage('compare', run_comparison, ['combine', 'normalize_broker', 'compare_options'])
+    graph.add_stage('stream_compare', stream_broker_upload, ['combine', 'broker_upload', 'stream_options'])
+    graph.add_stage('summarize', summarize_results, ['compare'])
+    graph.add_stage('export', export_bytes, ['frame', 'export_format'])
+    graph.add_stage('aggregate', insurer_aggregates, ['frame'])
+    graph.add_stage('view_options', view_options, ['frame'])
+    graph.add_stage('view_rows', view_rows, ['frame', 'view'])
+    return graph
+
+def get_stage_graph():
+    """Return this session's stage graph."""
+    if 'stage_graph' not in st.session_state:
+        st.session_state.stage_graph = build_stage_graph(os.path.join(st.session_state.workspace, "spill"))
+    return st.session_state.stage_graph
+
+
+# Jobs: statements are parsed and compared in worker processes (see
+# components/jobs.py); their results land in the session's workspace and are
+# registered in the stage graph when they are done
+
+@cache_resource
+def get_job_pool():
+    """Return the worker pool shared by all sessions of this server process."""
+    return create_job_pool()
+
+def submit_session_job(kind, label, params, job_id=None):
+    """Queue a job of this session."""
+    args = (st.session_state.session_id, kind, label, params, st.session_state.workspace)
+    try:
+        return submit_job(get_job_pool(), *args, job_id=job_id)
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a new pool
+        get_job_pool.clear()
+        return submit_job(get_job_pool(), *args, job_id=job_id)
+
+def find_pending_job(fingerprint):
+    """Return this session's job computing the stage output `fingerprint` whose result isn't collected yet, if any."""
+    for job in list_jobs(st.session_state.session_id):
+        pending = job['status'] in ('queued', 'running') or (job['status'] == 'done' and not job['collected'])
+        if pending and job['params'].get('fingerprint') == fingerprint:
+            return job
+    return None
+
+def collect_finished_jobs():
+    """
+    Register the results of this session's finished jobs in the stage graph.
 
+    Returns:
+    tuple: (the session's jobs, number of results collected)
+    """
+    jobs = list_jobs(st.session_state.session_id)
+    graph = get_stage_graph()
+    collected = 0
+    for job in jobs:
+        if job['status'] != 'done' or job['collected']:
+            continue
+        graph.restore(job['params']['fingerprint'], job_result(job))
+        if job['kind'] == 'parse':
+            add_statement_upload(Fingerprinted(job['params']['upload'], job['params']['upload_fingerprint']))
+        mark_collected(job['job_id'])
+        job['collected'] = 1
+        collected += 1
+    if collected:
+        save_session()
+    return jobs, collected
+
+def show_jobs():
+    """Show this session's jobs; the list refreshes itself while some are still running."""
+    jobs = list_jobs(st.session_state.session_id)
+    if not jobs:
+        return
+    st.subheader("Jobs")
+    if any(job['status'] in ('queued', 'running') for job in jobs):
+        if fragment is not None:
+            fragment(run_every=JOB_POLL_SECONDS)(show_job_progress)()
+            return
+        st.button("Refresh job status")
+    show_job_progress(jobs)
+
+def show_job_progress(jobs=None):
+    """Show the jobs in one table (progress, rows, timing, errors); reruns the page when jobs finish."""
+    if jobs is None:
+        # Polled: collect results as jobs finish, and rerun the whole page
+        # once they all are, so it shows their results
+        jobs, collected = collect_finished_jobs()
+        if collected or not any(job['status'] in ('queued', 'running') for job in jobs):
+            st.rerun()
+    table = job_table(jobs)
+    if hasattr(st, 'column_config'):
+        st.dataframe(
+            table,
+            column_config={'Progress': st.column_config.ProgressColumn(min_value=0.0, max_value=1.0)},
+            hide_index=True,
+        )
+    else:
+        st.dataframe(table)
+
+
+# Session snapshots: the uploads and stage outputs of a session are saved in its
+# workspace, so reloading the page resumes where the user left off
+
+def save_session():
+    """Snapshot the session's uploads and the stage outputs computed for them."""
+    graph = get_stage_graph()
+    uploads = st.session_state.statement_uploads
+    broker_upload = st.session_state.broker_upload
+
+    stages = [('parse', {'upload': upload}) for upload in uploads]
+    if uploads:
+        stages.append(('combine', {'uploads': uploads}))
+    if broker_upload is not None:
+        stages.append(('normalize_broker', {'broker_upload': broker_upload}))
+        if uploads:
+            stages.append(('compare', comparison_inputs()))
+            stages.append(('stream_compare', streamed_comparison_inputs()))
+
+    # Only outputs already computed are saved; new ones are written, known ones kept as they are
+    outputs = {}
+    for stage, inputs in stages:
+        fingerprint = graph.fingerprint(stage, **inputs)
+        if graph.is_memoized(fingerprint):
+            outputs[fingerprint] = (stage, lambda stage=stage, inputs=inputs: graph.run(stage, **inputs))
+
+    state = {
+        'statement_uploads': [upload._asdict() for upload in uploads],
+        'broker_upload': broker_upload._asdict() if broker_upload is not None else None,
+        'final_submission_done': st.session_state.final_submission_done,
+    }
+    try:
+        save_session_snapshot(os.path.join(st.session_state.workspace, "snapshot"), st.session_state.session_id, state, outputs)
+    except OSError as e:
+        print(f"Could not save the session snapshot: {e}")
+
+def restore_session():
+    """Restore the session's uploads and stage outputs; their DataFrames are memory-mapped when first used."""
+    snapshot = load_session_snapshot(os.path.join(st.session_state.workspace, "snapshot"))
+    if snapshot is None:
+        return
+    state, outputs = snapshot
+
+    graph = get_stage_graph()
+    for fingerprint, (_, value) in outputs.items():
+        graph.restore(fingerprint, value)
+    st.session_state.statement_uploads = [Fingerprinted(**upload) for upload in state['statement_uploads']]
+    if state['broker_upload'] is not None:
+        st.session_state.broker_upload = Fingerprinted(**state['broker_upload'])
+    st.session_state.final_submission_done = state['final_submission_done']
 
 
 
@@ -0,0 +1,230 @@
+"""
+Headless month-end reconciliation.
+
+Parses every insurer statement in a directory in parallel, processes the broker
+file, runs the bank/broker comparison and writes the results, without Streamlit.
+
+Example:
+    python batch_reconcile.py statements/ --broker broker.xlsx --output-dir output/
+    python batch_reconcile.py statements/ --broker broker.xlsx --bank icici_oct.xlsx=ICICI
+    python batch_reconcile.py statements/ --broker broker.xlsx --mapping banks.json
+    python batch_reconcile.py statements/ --broker broker.xlsx --chunk-rows 50000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from components.broker import broker_data_process, BROKER_COLUMNS, BROKER_COLUMN_DTYPES
+from components.broker_stream import compare_broker_file
+from components.comparison import compare_bank_and_broker
+from components.sharded_comparison import compare_sharded
+from components.compaction import concat_frames
+from components.data_processing import BANK_CONFIG
+from components.excel_reader import read_excel_columns
+from components.export import EXPORT_FORMATS, DEFAULT_EXPORT_FORMAT, export_frame, export_file_name, format_export_stats
+from components.fuzzy_matching import FUZZY_NAME_THRESHOLD, FUZZY_PREMIUM_TOLERANCE
+from components.match_cascade import MIN_AFFIX_LENGTH
+from components.ledger import open_ledger, reconcile_incremental
+from components.statements import detect_bank_from_filename, parse_statements, statement_file_type
+from components.bank_detection import DETECTION_MIN_CONFIDENCE, detect_bank
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Reconcile a directory of insurer statements against a broker file.")
+    parser.add_argument("statements_dir", help="Directory containing the insurer statements (Excel / PDF).")
+    parser.add_argument("--broker", required=True, help="Broker Excel file.")
+    parser.add_argument("--mapping", help="JSON file mapping statement file names to bank names.")
+    parser.add_argument(
+        "--bank", action="append", default=[], metavar="FILE=BANK",
+        help="Bank for one statement file (repeatable); overrides --mapping and auto-detection.",
+    )
+    parser.add_argument("--output-dir", default="./output", help="Directory for the result files.")
+    parser.add_argument(
+        "--format", choices=list(EXPORT_FORMATS), default=DEFAULT_EXPORT_FORMAT, help="Format of the result files."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Parallel parser (and --sharded comparison) processes (default: one per CPU).",
+    )
+    parser.add_argument("--no-fuzzy", action="store_true", help="Only match endorsements exactly.")
+    parser.add_argument(
+        "--fuzzy-threshold", type=float, default=FUZZY_NAME_THRESHOLD,
+        help="Minimum customer name similarity (0-1) for fuzzy endorsement matches.",
+    )
+    parser.add_argument(
+        "--premium-tolerance", type=float, default=FUZZY_PREMIUM_TOLERANCE,
+        help="Largest premium difference for fuzzy endorsement matches.",
+    )
+    parser.add_argument(
+        "--no-cascade", action="store_true",
+        help="Only match regular policies on the exact policy number (no 9-digit, prefix / suffix or name matches).",
+    )
+    parser.add_argument(
+        "--min-affix-length", type=int, default=MIN_AFFIX_LENGTH,
+        help="Shortest shared policy number prefix / suffix the match cascade accepts.",
+    )
+    parser.add_argument(
+        "--sharded", action="store_true",
+        help="Compare each insurer separately, in parallel worker processes (same results).",
+    )
+    parser.add_argument(
+        "--ledger", metavar="PATH",
+        help="Reconciliation ledger (SQLite); only rows not settled in earlier runs are reconciled and reported.",
+    )
+    parser.add_argument(
+        "--chunk-rows", type=int, metavar="ROWS",
+        help="Stream the broker file: read, compare and write the results this many broker rows at a time, "
+             "so memory stays bounded for very large broker files.",
+    )
+    return parser
+
+
+def resolve_statement_banks(statements_dir, mapping):
+    """
+    Pick the bank of every statement in a directory.
+
+    Statements listed in `mapping` use the mapped bank; the others are
+    auto-detected from their header, or failing that from their file name.
+    Files that can't be assigned are returned separately.
+
+    Returns:
+    tuple: ([(file_path, file_type, bank_name)], [skipped file names with reasons])
+    """
+    tasks, skipped = [], []
+    for name in sorted(os.listdir(statements_dir)):
+        file_path = os.path.join(statements_dir, name)
+        file_type = statement_file_type(name)
+        if not os.path.isfile(file_path) or file_type is None:
+            continue
+
+        bank_name = mapping.get(name)
+        if bank_name is None:
+            bank_name, confidence = detect_bank(file_path)
+            if confidence < DETECTION_MIN_CONFIDENCE:
+                bank_name = detect_bank_from_filename(name)
+        if bank_name is None:
+            skipped.append(f"{name}: bank could not be detected")
+        elif bank_name not in BANK_CONFIG:
+            skipped.append(f"{name}: bank '{bank_name}' is not supported")
+        else:
+            tasks.append((file_path, file_type, bank_name))
+    return tasks, skipped
+
+
+def print_summary(total_rows, found, stages, results_path):
+    """Print the comparison summary: rows per FOUND label and matched rows per MATCH STAGE."""
+    print("Comparison Summary:")
+    print(f"Total Records: {total_rows}")
+    for label, count in found.items():
+        print(f"{label}: {count}")
+    for stage, count in stages.items():
+        print(f"  matched by {stage}: {count}")
+    print(f"Results saved to {results_path}")
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.chunk_rows is not None and (args.ledger or args.sharded):
+        parser.error("--chunk-rows can't be combined with --ledger or --sharded")
+    if args.chunk_rows is not None and args.chunk_rows < 1:
+        parser.error("--chunk-rows must be at least 1")
+    if not args.premium_tolerance > 0:
+        parser.error("--premium-tolerance must be greater than 0")
+
+    mapping = {}
+    if args.mapping:
+        with open(args.mapping, "r") as f:
+            mapping.update(json.load(f))
+    for entry in args.bank:
+        file_name, _, bank_name = entry.partition("=")
+        if not bank_name:
+            print(f"Ignoring --bank {entry!r}: expected FILE=BANK")
+            continue
+        mapping[file_name] = bank_name
+
+    tasks, skipped = resolve_statement_banks(args.statements_dir, mapping)
+    for reason in skipped:
+        print(f"Skipped {reason}")
+    if not tasks:
+        print("No statements to process.")
+        return 1
+
+    # Parse all statements in parallel
+    started = time.perf_counter()
+    results = parse_statements(tasks, workers=args.workers)
+    processed_files = []
+    for result in results:
+        if result["error"]:
+            print(f"FAILED  {result['file']} ({result['bank']}): {result['error']}")
+        else:
+            source = "cache" if result["from_cache"] else f"{result['seconds']:.2f}s"
+            print(f"OK      {result['file']} ({result['bank']}): {result['rows']} rows [{source}]")
+            processed_files.append(result["data"])
+    print(f"Parsed {len(processed_files)}/{len(tasks)} statements in {time.perf_counter() - started:.2f}s")
+    if not processed_files:
+        return 1
+
+    combined_df = concat_frames(processed_files)
+    compare_options = {
+        "fuzzy_endorsements": not args.no_fuzzy,
+        "name_threshold": args.fuzzy_threshold,
+        "premium_tolerance": args.premium_tolerance,
+        "cascade": not args.no_cascade,
+        "min_affix_length": args.min_affix_length,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    combined_path = os.path.join(args.output_dir, export_file_name("final_output", args.format))
+    results_path = os.path.join(args.output_dir, export_file_name("comparison_results", args.format))
+
+    if args.chunk_rows is not None:
+        # Stream the broker file chunk by chunk, writing the results as they come
+        print(f"Wrote {combined_path}: {format_export_stats(export_frame(combined_df, args.format, combined_path))}")
+        summary = compare_broker_file(
+            combined_df, args.broker, args.format, results_path, chunk_rows=args.chunk_rows, **compare_options
+        )
+        peak = "" if summary['peak_bytes'] is None else f", peak memory +{summary['peak_bytes'] / 1024 ** 2:.1f} MiB"
+        print(f"Streamed {summary['broker_rows']} broker rows in {summary['chunks']} chunks "
+              f"({summary['held_back']} held back for the match cascade / fuzzy matching) "
+              f"in {summary['seconds']:.2f}s{peak}")
+        found = dict(sorted(summary['found'].items(), key=lambda item: -item[1]))
+        print_summary(summary['rows'], found, summary['stages'], results_path)
+        return 0
+
+    # Process the broker file
+    broker_df = broker_data_process(read_excel_columns(args.broker, BROKER_COLUMNS, BROKER_COLUMN_DTYPES))
+
+    # Reconcile and write the results
+    if args.sharded:
+        compare_options["workers"] = args.workers
+    if args.ledger:
+        conn = open_ledger(args.ledger)
+        try:
+            merged_df, summary = reconcile_incremental(
+                conn, combined_df, broker_df, sharded=args.sharded, **compare_options
+            )
+        finally:
+            conn.close()
+        print(
+            f"Ledger: {summary['settled_rows']}/{summary['broker_rows']} broker rows already settled; "
+            f"{summary['new_rows']} new, {summary['changed_rows']} changed, {summary['unchanged_rows']} unchanged"
+        )
+        if merged_df.empty:
+            print("Nothing new to reconcile.")
+            return 0
+    else:
+        compare = compare_sharded if args.sharded else compare_bank_and_broker
+        merged_df = compare(combined_df, broker_df, **compare_options)
+
+    for df, path in ((combined_df, combined_path), (merged_df, results_path)):
+        print(f"Wrote {path}: {format_export_stats(export_frame(df, args.format, path))}")
+
+    stages = merged_df["MATCH STAGE"].value_counts(sort=False) if "MATCH STAGE" in merged_df.columns else {}
+    print_summary(len(merged_df), merged_df["FOUND"].value_counts(), stages, results_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Benchmark streaming the broker file against loading it whole.
+
+Writes a synthetic broker Excel file and the matching bank data, then
+reconciles them by reading the whole broker file at once and by streaming it
+(compare_broker_file) with each requested chunk size, writing the results to
+a file. Every run happens in a fresh process, so the reported peak memory
+growth of one run isn't hidden by memory freed by another. The matched counts
+of the streamed runs are checked against the whole-file run.
+
+Run from the repository root:
+    python -m benchmarks.bench_broker_stream
+    python -m benchmarks.bench_broker_stream --size 500000 --chunk-rows 10000 50000 200000
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from benchmarks.synthetic import EXCEL_BANKS, generate_dataset
+from components.broker import broker_data_process, BROKER_COLUMNS, BROKER_COLUMN_DTYPES
+from components.broker_stream import compare_broker_file
+from components.comparison import compare_bank_and_broker
+from components.compaction import compact_frame, concat_frames
+from components.data_processing import process_bank_data
+from components.excel_reader import read_excel_columns
+from components.export import MemorySampler, export_frame
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+
+
+def whole_file(combined_path, broker_path, output_path):
+    """Reconcile with the broker file loaded at once; returns the run's stats."""
+    combined_df = pd.read_pickle(combined_path)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), MemorySampler() as memory:
+        broker_df = broker_data_process(read_excel_columns(broker_path, BROKER_COLUMNS, BROKER_COLUMN_DTYPES))
+        merged_df = compare_bank_and_broker(combined_df, broker_df)
+        export_frame(merged_df, "csv", output_path)
+    return {'seconds': time.perf_counter() - started, 'peak_bytes': memory.peak_bytes,
+            'found': {label: int(count) for label, count in merged_df['FOUND'].value_counts().items() if count}}
+
+
+def streamed(combined_path, broker_path, output_path, chunk_rows):
+    """Reconcile streaming the broker file chunk_rows rows at a time; returns the run's stats."""
+    combined_df = pd.read_pickle(combined_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = compare_broker_file(combined_df, broker_path, "csv", output_path, chunk_rows=chunk_rows)
+    return {'seconds': summary['seconds'], 'peak_bytes': summary['peak_bytes'],
+            'found': {label: count for label, count in summary['found'].items() if count}}
+
+
+def run_isolated(func, *args):
+    """Run func(*args) in a fresh process and return its result."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(func, *args).result()
+
+
+def describe(name, stats):
+    peak = "n/a" if stats['peak_bytes'] is None else f"{stats['peak_bytes'] / 1024 ** 2:8.1f} MiB"
+    print(f"  {name:20s} {stats['seconds']:8.2f}s  peak memory +{peak}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and measure streaming the broker file against loading it.")
+    parser.add_argument("--size", type=int, default=100_000, help="Broker rows.")
+    parser.add_argument("--chunk-rows", type=int, nargs="+", default=[10_000, 50_000], help="Chunk sizes.")
+    parser.add_argument("--match-rate", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    statements, raw_broker = generate_dataset(args.size, match_rate=args.match_rate, seed=args.seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        combined_df = concat_frames(
+            [compact_frame(process_bank_data(statements[bank_name], bank_name)) for bank_name in EXCEL_BANKS]
+        )
+    combined_path = os.path.join(DATA_DIR, f"stream-bank-{args.size}.pkl")
+    broker_path = os.path.join(DATA_DIR, f"stream-broker-{args.size}.xlsx")
+    output_path = os.path.join(DATA_DIR, "stream-results.csv")
+    combined_df.to_pickle(combined_path)
+    raw_broker.to_excel(broker_path, index=False)
+    print(f"Broker file: {len(raw_broker)} rows, {os.path.getsize(broker_path) / 1024 ** 2:.1f} MiB; "
+          f"bank data: {len(combined_df)} rows")
+
+    expected = run_isolated(whole_file, combined_path, broker_path, output_path)
+    describe("whole file", expected)
+    failed = False
+    for chunk_rows in args.chunk_rows:
+        stats = run_isolated(streamed, combined_path, broker_path, output_path, chunk_rows)
+        describe(f"{chunk_rows} row chunks", stats)
+        if stats['found'] != expected['found']:
+            print(f"    FOUND counts differ: {stats['found']} != {expected['found']}")
+            failed = True
+    os.remove(output_path)
+    if not failed:
+        print("  FOUND counts identical")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Benchmark the vectorized value cleaning against the original per-cell code.
+
+Each case cleans the same synthetic column(s) with the original code (a
+Python function applied per cell) and with components/value_cleaning.py,
+reports both times and checks that the results agree on the formats the
+original code handled.
+
+Run from the repository root:
+    python -m benchmarks.bench_cleaning
+    python -m benchmarks.bench_cleaning --sizes 100000 1000000
+"""
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from components.value_cleaning import parse_amounts, normalize_text, clean_text_columns
+
+
+def legacy_clean_numeric(values):
+    """The original clean_pdf_data amount cleaning, one cell at a time."""
+    def clean_numeric(value):
+        # Remove commas and whitespace, and convert to numeric
+        if isinstance(value, str):
+            value = value.replace(",", "").strip()
+        return pd.to_numeric(value, errors='coerce')
+
+    return values.apply(clean_numeric).fillna(0)
+
+
+def legacy_trim_cells(df):
+    """The original generic clean_pdf_data branch: strip every string cell, blanks to NA."""
+    df = df.map(lambda x: x.strip() if isinstance(x, str) else x) if hasattr(df, "map") else \
+        df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    return df.replace('', pd.NA)
+
+
+def legacy_upper_names(values):
+    """The original app.py name normalization."""
+    return values.astype(str).str.strip().str.upper()
+
+
+# Cells the original per-cell code parsed (or turned into 0), checked one by one
+EDGE_AMOUNTS = ["1e5", "1.5E+05", "2.5e-3", " 3E2 ", "-4.2e1", "+.5e1", "1,000.5", "-7", ".5", "7.",
+                "1e", "e5", "1.5E+", "abc", "", None]
+
+
+def synthetic_amounts(size, seed):
+    """
+    Amounts as PDF statements show them: "1,23,456.70", some blanks and stray
+    spaces, and a few numbers exported as text in exponent form ("1.234560e+05").
+    """
+    rng = np.random.default_rng(seed)
+    amounts = rng.uniform(0, 500_000, size).round(2)
+    text = pd.Series([f"{amount:,.2f}" for amount in amounts], dtype=object)
+    exponent = rng.random(size) < 0.01
+    text[exponent] = [f"{amount:e}" if i % 2 else f"{amount:E}" for i, amount in enumerate(amounts[exponent])]
+    blanks = rng.random(size) < 0.02
+    text[blanks] = ""
+    padded = rng.random(size) < 0.1
+    text[padded] = " " + text[padded] + " "
+    return text
+
+
+def synthetic_cells(size, seed):
+    """A PDF table of text cells with padding and blanks."""
+    rng = np.random.default_rng(seed)
+    names = pd.Series([f"  customer {i % 5000} " if i % 7 else "" for i in range(size)], dtype=object)
+    policies = pd.Series([f"{n:09d} " for n in rng.integers(0, 10 ** 9, size)], dtype=object)
+    return pd.DataFrame({'Insured Name': names, 'Policy': policies, 'Premium': synthetic_amounts(size, seed)})
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def report(name, legacy_seconds, seconds, same):
+    print(f"  {name:<10} legacy {legacy_seconds:8.3f}s  vectorized {seconds:8.3f}s  "
+          f"x{legacy_seconds / max(seconds, 1e-9):6.1f}  {'identical' if same else 'DIFFERENT'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare vectorized value cleaning with the per-cell original.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="Rows per column.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    edge = pd.Series(EDGE_AMOUNTS, dtype=object)
+    expected, result = legacy_clean_numeric(edge), parse_amounts(edge).fillna(0)
+    mismatched = [value for value, want, got in zip(EDGE_AMOUNTS, expected, result) if not np.isclose(want, got)]
+    print(f"Edge cases: {'identical' if not mismatched else f'DIFFERENT for {mismatched}'}")
+    failed = bool(mismatched)
+    for size in args.sizes:
+        print(f"Size {size}:")
+        amounts = synthetic_amounts(size, args.seed)
+        expected, legacy_seconds = timed(lambda: legacy_clean_numeric(amounts))
+        result, seconds = timed(lambda: parse_amounts(amounts).fillna(0))
+        same = np.allclose(expected.to_numpy(dtype=float), result.to_numpy(dtype=float))
+        report("amounts", legacy_seconds, seconds, same)
+        failed |= not same
+
+        cells = synthetic_cells(size, args.seed)
+        expected, legacy_seconds = timed(lambda: legacy_trim_cells(cells))
+        result, seconds = timed(lambda: clean_text_columns(cells))
+        same = expected.isna().equals(result.isna()) and expected.fillna("").astype(str).equals(
+            result.fillna("").astype(str))
+        report("trim", legacy_seconds, seconds, same)
+        failed |= not same
+
+        names = cells['Insured Name']
+        expected, legacy_seconds = timed(lambda: legacy_upper_names(names))
+        result, seconds = timed(lambda: normalize_text(names))
+        # The original turned blanks into "" (and missing values into "NAN"); they are NA now
+        same = expected.where(expected != "").isna().equals(result.isna()) and (
+            expected[result.notna()].tolist() == result[result.notna()].tolist())
+        report("names", legacy_seconds, seconds, same)
+        failed |= not same
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
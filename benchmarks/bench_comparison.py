@@ -0,0 +1,117 @@
+"""
+Benchmark the bank/broker comparison against the original implementation.
+
+Both implementations run on the same synthetic (Excel-bank) data at each size;
+the script reports their times and peak memory and checks that they produce
+the same result.
+
+Run from the repository root:
+    python -m benchmarks.bench_comparison
+    python -m benchmarks.bench_comparison --sizes 10000 100000
+"""
+import sys
+import time
+import argparse
+import tracemalloc
+import contextlib
+import io
+import pandas as pd
+from benchmarks.synthetic import EXCEL_BANKS, generate_dataset
+from components.broker import broker_data_process
+from components.comparison import compare_bank_and_broker, map_bank_names
+from components.data_processing import process_bank_data
+
+
+def legacy_compare_bank_and_broker(combined_df, broker_df):
+    """The original merge / row-wise apply implementation, kept as the reference."""
+    combined_df = combined_df.copy()
+    broker_df = broker_df.copy()
+
+    combined_df.columns = combined_df.columns.str.strip().str.upper()
+    broker_df.columns = broker_df.columns.str.strip().str.upper()
+
+    combined_df['SOURCE_MAPPED'] = combined_df['SOURCE'].apply(map_bank_names)
+    relevant_banks = combined_df['SOURCE_MAPPED'].unique()
+    filtered_broker_df = broker_df[broker_df['BANK NAME'].isin(relevant_banks)]
+
+    endorsement_broker = filtered_broker_df[filtered_broker_df['INSURANCE NATURE'] == 'Endorsment']
+    regular_broker = filtered_broker_df[filtered_broker_df['INSURANCE NATURE'] != 'Endorsment']
+
+    merged_regular = pd.merge(
+        regular_broker, combined_df,
+        left_on='PARSED_POLICY_REFERENCE', right_on='PARSED_POLICY_NUMBER_BANK',
+        how='left', suffixes=('_BROKER', '_BANK'), indicator=True
+    )
+    merged_endorsement = pd.merge(
+        endorsement_broker, combined_df,
+        left_on=['CUSTOMER NAME', 'TOTAL PREMIUM'], right_on=['CUSTOMER NAME', 'PREMIUM BANK'],
+        how='left', suffixes=('_BROKER', '_BANK'), indicator=True
+    )
+    merged_df = pd.concat([merged_regular, merged_endorsement], ignore_index=True)
+
+    merged_df['FOUND'] = merged_df['_merge'].map({
+        'both': 'Matched',
+        'left_only': 'Not Found in Bank',
+        'right_only': 'Not Found in Broker'
+    })
+    merged_df['DIFFERENCE'] = merged_df.apply(
+        lambda row: (
+            row['TOTAL COMMISSION BROKER'] - row['TOTAL COMMISSION']
+            if pd.notna(row['TOTAL COMMISSION BROKER']) and pd.notna(row['TOTAL COMMISSION'])
+            else 0
+        ),
+        axis=1
+    )
+    merged_df.drop(columns=['_merge', 'SOURCE_MAPPED'], inplace=True)
+    return merged_df
+
+
+def measure(func):
+    """Run func, returning (result, seconds, peak bytes)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the reconciliation engine with the original implementation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Broker row counts.")
+    parser.add_argument("--match-rate", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the current implementation.")
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        statements, raw_broker = generate_dataset(size, match_rate=args.match_rate, seed=args.seed)
+        combined_df = pd.concat(
+            [process_bank_data(statements[bank_name], bank_name) for bank_name in EXCEL_BANKS], ignore_index=True
+        )
+        broker_df = broker_data_process(raw_broker)
+
+        merged_df, seconds, peak = measure(lambda: compare_bank_and_broker(combined_df, broker_df))
+        stages = merged_df['MATCH STAGE'].value_counts(sort=False)
+        print(f"Size {size}: {len(merged_df)} rows; matched by stage: "
+              + ", ".join(f"{stage} {count}" for stage, count in stages.items()))
+        print(f"  current  {seconds:8.3f}s  peak {peak / 1024 ** 2:8.1f} MiB")
+        if args.skip_legacy:
+            continue
+
+        expected, seconds, peak = measure(lambda: legacy_compare_bank_and_broker(combined_df, broker_df))
+        print(f"  legacy   {seconds:8.3f}s  peak {peak / 1024 ** 2:8.1f} MiB")
+        # The original had no match cascade or fuzzy endorsement matching
+        exact_df, _, _ = measure(
+            lambda: compare_bank_and_broker(combined_df, broker_df, fuzzy_endorsements=False, cascade=False)
+        )
+        pd.testing.assert_frame_equal(exact_df.drop(columns=['MATCH STAGE', 'MATCH CONFIDENCE']), expected,
+                                      check_dtype=False, check_categorical=False)
+        print("  results identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
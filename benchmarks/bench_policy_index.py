@@ -0,0 +1,105 @@
+"""
+Benchmark the policy key index on truncated and extended policy numbers.
+
+Builds a PolicyKeyIndex over synthetic policy numbers of several insurers,
+looks up keys cut short or given an endorsement suffix, and reports build and
+lookup times. A sample of the lookups is checked against a brute-force scan
+of the keys.
+
+Run from the repository root:
+    python -m benchmarks.bench_policy_index
+    python -m benchmarks.bench_policy_index --sizes 100000 1000000 5000000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from components.policy_index import PolicyKeyIndex
+
+INSURERS = 15
+
+
+def synthetic_keys(size, seed):
+    """Random policy numbers of several insurers, with the formats the statements use."""
+    rng = np.random.default_rng(seed)
+    numbers = pd.Series(rng.integers(0, 10 ** 10, size)).astype(str).str.zfill(10)
+    prefixes = rng.choice(["PL", "P", "D", "OG", ""], size)
+    insurers = pd.Series(rng.integers(0, INSURERS, size)).map(lambda i: f"INSURER {i}")
+    return prefixes + numbers, insurers
+
+
+def synthetic_queries(keys, seed):
+    """Keys as another file would write them: a third cut short, a third with a suffix, a third unchanged."""
+    rng = np.random.default_rng(seed + 1)
+    kind = rng.integers(0, 3, len(keys))
+    queries = keys.copy()
+    queries[kind == 0] = keys[kind == 0].str[:-2]
+    queries[kind == 1] = keys[kind == 1] + "01"
+    return queries
+
+
+def brute_force_affix(keys, query):
+    """The longest prefix or suffix `query` shares with any of `keys`, and the keys sharing it."""
+    best, best_keys = 0, set()
+    for key in keys:
+        shared = max(len(os.path.commonprefix([key, query])), len(os.path.commonprefix([key[::-1], query[::-1]])))
+        if shared > best:
+            best, best_keys = shared, {key}
+        elif shared == best:
+            best_keys.add(key)
+    return best, best_keys
+
+
+def check_sample(keys, insurers, queries, rows, shared, sample):
+    """Compare a sample of the index lookups with a brute-force scan of the insurer's keys; returns the mismatches."""
+    mismatches = 0
+    for i in sample:
+        best, best_keys = brute_force_affix(keys[insurers == insurers[i]].tolist(), queries[i])
+        found = keys[rows[i]] if rows[i] >= 0 else None
+        # A key found must share the longest affix; only a unique one (or the shared affix itself) may be found
+        if shared[i] != best or (found is not None and found not in best_keys):
+            mismatches += 1
+        elif found is None and len(best_keys) == 1 and best >= 1:
+            mismatches += 1
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the policy key index on truncated and extended keys.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="Indexed keys.")
+    parser.add_argument("--min-length", type=int, default=6)
+    parser.add_argument("--check", type=int, default=50, help="Lookups checked by brute force.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for size in args.sizes:
+        keys, insurers = synthetic_keys(size, args.seed)
+        queries = synthetic_queries(keys, args.seed)
+
+        started = time.perf_counter()
+        index = PolicyKeyIndex(keys, insurers)
+        build_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        rows, shared = index.longest_affix(queries, insurers, args.min_length)
+        lookup_seconds = time.perf_counter() - started
+
+        found = (rows >= 0).mean()
+        same_key = (keys.to_numpy()[np.maximum(rows, 0)] == keys.to_numpy())[rows >= 0].mean() if found else 0.0
+        print(f"Size {size}: build {build_seconds:7.3f}s  lookup {lookup_seconds:7.3f}s  "
+              f"({size / max(lookup_seconds, 1e-9):,.0f} lookups/s); "
+              f"{found:.1%} found, {same_key:.1%} of them the original key")
+
+        sample = np.random.default_rng(args.seed).choice(size, min(args.check, size), replace=False)
+        unfiltered_rows, _ = index.longest_affix(queries, insurers)
+        mismatches = check_sample(keys.to_numpy(dtype=object), insurers.to_numpy(dtype=object),
+                                  queries.to_numpy(dtype=object), unfiltered_rows, shared, sample)
+        print(f"  brute-force check: {len(sample) - mismatches} / {len(sample)} lookups agree")
+        failed |= mismatches > 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
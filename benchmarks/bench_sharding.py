@@ -0,0 +1,68 @@
+"""
+Benchmark the sharded (one insurer per worker process) comparison.
+
+Compares the synthetic data of every Excel bank at once and sharded by
+insurer with each requested worker count, reports the times and the time of
+every shard, and checks that the sharded results equal the single-process
+ones.
+
+Run from the repository root:
+    python -m benchmarks.bench_sharding
+    python -m benchmarks.bench_sharding --sizes 100000 1000000 --workers 2 4
+"""
+import sys
+import time
+import argparse
+import contextlib
+import io
+import pandas as pd
+from benchmarks.synthetic import EXCEL_BANKS, generate_dataset
+from components.broker import broker_data_process
+from components.comparison import compare_bank_and_broker
+from components.compaction import compact_frame, concat_frames
+from components.data_processing import process_bank_data
+from components.sharded_comparison import compare_sharded
+
+
+def timed(func):
+    """Run func with its logging silenced, returning (result, seconds)."""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    return result, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the sharded comparison against the single-process one.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Broker row counts.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker process counts.")
+    parser.add_argument("--match-rate", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        statements, raw_broker = generate_dataset(size, match_rate=args.match_rate, seed=args.seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            combined_df = concat_frames(
+                [compact_frame(process_bank_data(statements[bank_name], bank_name)) for bank_name in EXCEL_BANKS]
+            )
+            broker_df = broker_data_process(raw_broker)
+
+        expected, seconds = timed(lambda: compare_bank_and_broker(combined_df, broker_df))
+        print(f"Size {size}: {len(expected)} rows")
+        print(f"  single         {seconds:8.3f}s")
+        for workers in args.workers:
+            timings = []
+            merged_df, seconds = timed(lambda: compare_sharded(combined_df, broker_df, workers=workers,
+                                                               timings=timings))
+            slowest = max(timings, key=lambda shard: shard['seconds']) if timings else None
+            print(f"  {workers} worker(s)    {seconds:8.3f}s  {len(timings)} shards"
+                  + (f", slowest {slowest['seconds']:.3f}s ({slowest['insurer']}, {slowest['broker_rows']} rows)"
+                     if slowest else ""))
+            pd.testing.assert_frame_equal(merged_df, expected)
+        print("  results identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
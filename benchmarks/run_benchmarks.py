@@ -0,0 +1,177 @@
+"""
+Benchmark the reconciliation pipeline on synthetic data.
+
+Each stage (read, clean, normalize, merge, export) is timed separately, with its
+peak Python memory (tracemalloc), at each requested broker size. Results are
+written as JSON so runs can be compared across commits.
+
+Run from the repository root:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --sizes 10000 100000 --match-rate 0.8
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+import io
+import pandas as pd
+from benchmarks.synthetic import PDF_BANKS, generate_dataset, write_dataset
+from components.broker import broker_data_process, BROKER_COLUMNS, BROKER_COLUMN_DTYPES
+from components.comparison import compare_bank_and_broker
+from components.compaction import concat_frames
+from components.data_cleaning import clean_pdf_data
+from components.data_processing import process_bank_data, read_bank_excel
+from components.excel_reader import read_excel_columns
+from components.export import export_frame
+from components.pdf_processing import build_table_frame, extract_pdf_tables
+from components.policy_normalization import normalize_policy_numbers
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCHMARK_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+
+def git_commit():
+    """Return the current git commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=BENCHMARK_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stage(results, size, stage, func):
+    """
+    Run one stage, recording its time and peak memory.
+
+    Pipeline logging is silenced while the stage runs. A failing stage is
+    recorded with its error instead of aborting the run.
+
+    Returns:
+    The stage's return value, or None if it failed.
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    value, error = None, None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            value = func()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results.append({"size": size, "stage": stage, "seconds": seconds, "peak_bytes": peak, "error": error})
+    status = f"ERROR {error}" if error else f"{seconds:8.3f}s  peak {peak / 1024 ** 2:8.1f} MiB"
+    print(f"  {stage:<10} {status}")
+    return value
+
+
+def read_pdf_rows(path, bank_name):
+    """Extract a PDF statement into the raw DataFrame process_pdf_bank_data cleans."""
+    all_tables, _ = extract_pdf_tables(path, bank_name)
+    return build_table_frame(all_tables)
+
+
+def benchmark_size(size, args, results):
+    """Run every stage once on a dataset of `size` broker rows."""
+    key = f"n{size}-m{args.match_rate}-e{args.endorsement_share}-d{args.duplicate_rate}-p{args.pdf_max_rows}-s{args.seed}"
+    data_dir = os.path.join(DATA_DIR, key)
+    print(f"Size {size}:")
+
+    if not os.path.exists(os.path.join(data_dir, "broker.xlsx")):
+        print(f"  generating synthetic files in {data_dir} ...")
+        statements, broker = generate_dataset(
+            size, match_rate=args.match_rate, endorsement_share=args.endorsement_share,
+            duplicate_rate=args.duplicate_rate, pdf_max_rows=args.pdf_max_rows, seed=args.seed,
+        )
+        write_dataset(data_dir, statements, broker)
+
+    paths = {
+        name[:-len(ext)].replace("_", " "): os.path.join(data_dir, name)
+        for name in os.listdir(data_dir)
+        for ext in (".xlsx", ".pdf")
+        if name.endswith(ext) and name != "broker.xlsx" and ext[1:].replace("xlsx", "excel") in args.formats
+    }
+    broker_path = os.path.join(data_dir, "broker.xlsx")
+
+    def read():
+        raw = {}
+        for bank_name, path in paths.items():
+            raw[bank_name] = read_pdf_rows(path, bank_name) if bank_name in PDF_BANKS else read_bank_excel(path, bank_name)
+        return raw, read_excel_columns(broker_path, BROKER_COLUMNS, BROKER_COLUMN_DTYPES)
+
+    raw = run_stage(results, size, "read", read)
+    if raw is None:
+        return
+    raw_statements, raw_broker = raw
+
+    def clean():
+        processed = [
+            clean_pdf_data(df, bank_name) if bank_name in PDF_BANKS else process_bank_data(df, bank_name)
+            for bank_name, df in raw_statements.items()
+        ]
+        return concat_frames(processed), broker_data_process(raw_broker)
+
+    cleaned = run_stage(results, size, "clean", clean)
+
+    # broker_data_process already normalizes; this measures the engine on its own
+    run_stage(results, size, "normalize", lambda: normalize_policy_numbers(
+        raw_broker["PolicyNumber"].astype(str).str.strip(), raw_broker["p_insurerName"]
+    ))
+    if cleaned is None:
+        return
+    combined_df, broker_df = cleaned
+
+    merged_df = run_stage(results, size, "merge", lambda: compare_bank_and_broker(combined_df, broker_df))
+    if merged_df is None:
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run_stage(results, size, "export", lambda: export_frame(merged_df, "xlsx", os.path.join(tmp, "comparison_results.xlsx")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the reconciliation pipeline on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Broker row counts.")
+    parser.add_argument("--match-rate", type=float, default=0.9, help="Share of broker rows with a bank record.")
+    parser.add_argument("--endorsement-share", type=float, default=0.05, help="Share of endorsement rows.")
+    parser.add_argument("--duplicate-rate", type=float, default=0.01, help="Share of duplicated broker rows.")
+    parser.add_argument("--formats", nargs="+", choices=["excel", "pdf"], default=["excel", "pdf"],
+                        help="Statement formats to include.")
+    parser.add_argument("--pdf-max-rows", type=int, default=2000, help="Row cap per PDF statement.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>.json).")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        benchmark_size(size, args, results)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
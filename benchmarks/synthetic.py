@@ -0,0 +1,207 @@
+"""
+Synthetic insurer statements and broker files for the benchmarks.
+
+Every bank in BANK_CONFIG gets a statement in its own format: an Excel sheet with
+the configured column names (plus unrelated columns, as real exports have) or,
+for the PDF banks, a ruled table PDF laid out like the real statements. The broker
+file references the same policies, in the formats the broker extract uses.
+"""
+import os
+import numpy as np
+import pandas as pd
+from components.comparison import BANK_NAME_MAP
+from components.data_processing import BANK_CONFIG
+
+try:
+    import pymupdf
+except ImportError:
+    import fitz as pymupdf
+
+PDF_BANKS = ["The New India Pdf", "United Pdf"]
+
+# Insurer names used by the broker extract for the PDF banks
+PDF_BROKER_NAMES = {
+    "The New India Pdf": "THE NEW INDIA ASSURANCE COMPANY LIMITED",
+    "United Pdf": "UNITED INDIA INSURANCE COMPANY LIMITED",
+}
+
+# Header rows of the PDF statements, as clean_pdf_data expects them
+PDF_HEADERS = {
+    "The New India Pdf": [["Policy Number", "Insured Name", "Premium", "Brokerage"]],
+    "United Pdf": [
+        ["UNITED INDIA INSURANCE COMPANY LIMITED", "", "", "", ""],
+        ["Brokerage statement", "", "", "", ""],
+        ["Policy/ Endt number", "Insured Name", "ELG Premium Amount", "Commission Amount", "Remarks"],
+    ],
+}
+
+# Unrelated columns added to every Excel statement
+FILLER_COLUMNS = 12
+
+EXCEL_BANKS = [bank for bank in BANK_CONFIG if bank not in PDF_BANKS]
+
+
+def broker_insurer_name(bank_name):
+    """Insurer name the broker extract uses for a bank_config bank."""
+    return PDF_BROKER_NAMES.get(bank_name) or BANK_NAME_MAP.get(bank_name.upper(), bank_name)
+
+
+def _policy_numbers(bank_name, ids):
+    """
+    Build (bank statement, broker extract) policy numbers for a bank.
+
+    The two sides differ the way the real files do, so the parsing rules
+    have to bring them back together.
+    """
+    ids = pd.Series(ids).astype(str).str.zfill(9)
+    if bank_name == "GO-DIGIT":
+        return "D" + ids, "D" + ids + "/01"
+    if bank_name == "TATA AIG":
+        # Broker side has a leading zero and a 2-character suffix
+        return "T" + ids, "0T" + ids + "99"
+    if bank_name == "The New India Pdf":
+        prefix = ids.str[-5:]
+        return prefix + "00000000" + "007", prefix + "00000000" + "123"
+    if bank_name == "United Pdf":
+        return ids.str[-8:] + "/1", ids.str[-8:]
+    return "PL-" + ids, "PL" + ids
+
+
+def generate_dataset(n_rows, match_rate=0.9, endorsement_share=0.05, duplicate_rate=0.01,
+                     pdf_max_rows=2000, seed=0):
+    """
+    Generate raw insurer statements and a matching raw broker extract.
+
+    Parameters:
+    n_rows (int): Number of broker rows (before duplicates).
+    match_rate (float): Share of broker rows that have a bank record.
+    endorsement_share (float): Share of broker rows that are endorsements.
+    duplicate_rate (float): Share of broker rows duplicated in the extract.
+    pdf_max_rows (int): Cap on the rows of each PDF statement.
+    seed (int): Random seed.
+
+    Returns:
+    tuple: (dict of bank name -> raw statement DataFrame, raw broker DataFrame)
+    """
+    rng = np.random.default_rng(seed)
+    banks = list(BANK_CONFIG)
+    ids = np.arange(n_rows)
+    bank_of_row = rng.integers(0, len(banks), n_rows)
+
+    # PDF statements are capped, so their broker rows are too
+    for position, bank_name in enumerate(banks):
+        if bank_name in PDF_BANKS:
+            rows = np.flatnonzero(bank_of_row == position)
+            bank_of_row[rows[pdf_max_rows:]] = rng.choice(
+                [i for i, b in enumerate(banks) if b not in PDF_BANKS], len(rows[pdf_max_rows:])
+            )
+
+    names = pd.Series(ids).map(lambda i: f"CUSTOMER {i % (n_rows // 3 + 1)}")
+    premiums = np.round(rng.uniform(1000, 100000, n_rows), 2)
+    commissions = np.round(premiums * rng.uniform(0.02, 0.2, n_rows), 2)
+    matched = rng.random(n_rows) < match_rate
+    endorsement = rng.random(n_rows) < endorsement_share
+
+    statements, broker_parts = {}, []
+    for position, bank_name in enumerate(banks):
+        rows = np.flatnonzero(bank_of_row == position)
+        bank_policy, broker_policy = _policy_numbers(bank_name, ids[rows])
+        in_bank = matched[rows]
+
+        # Bank rows: the matched broker policies plus 10% bank-only policies
+        extra = max(1, len(rows) // 10)
+        extra_policy, _ = _policy_numbers(bank_name, n_rows + position * n_rows + np.arange(extra))
+        statement = pd.DataFrame({
+            "reference": pd.concat([bank_policy[in_bank], extra_policy], ignore_index=True),
+            "customer_name": pd.concat([names.iloc[rows][in_bank], pd.Series([f"BANK ONLY {i}" for i in range(extra)])],
+                                       ignore_index=True),
+            "commission": np.concatenate([commissions[rows][in_bank], rng.uniform(100, 1000, extra).round(2)]),
+            "premium": np.concatenate([premiums[rows][in_bank], rng.uniform(1000, 9000, extra).round(2)]),
+        })
+        statements[bank_name] = _format_statement(bank_name, statement, rng)
+
+        broker_parts.append(pd.DataFrame({
+            "PolicyNumber": broker_policy.to_numpy(),
+            "p_insurerName": broker_insurer_name(bank_name),
+            "cName": names.iloc[rows].to_numpy(),
+            "odPremium": premiums[rows] * 0.7,
+            "TpPremium": premiums[rows] * 0.3,
+            "commisionRate": np.round(commissions[rows] / premiums[rows] * 100, 2),
+            # Broker commissions are exported as negative amounts; 20% differ from the bank
+            "NetCommision": -(commissions[rows] + np.where(rng.random(len(rows)) < 0.2, 10.0, 0.0)),
+            "insNature": np.where(endorsement[rows], "Endorsment", "New"),
+            "TotalPremium": premiums[rows],
+        }))
+
+    broker = pd.concat(broker_parts, ignore_index=True)
+    duplicates = broker.sample(frac=duplicate_rate, random_state=seed)
+    broker = pd.concat([broker, duplicates], ignore_index=True)
+    broker = broker.sample(frac=1, random_state=seed).reset_index(drop=True)
+    return statements, broker
+
+
+def _format_statement(bank_name, statement, rng):
+    """Rename the standard statement columns to the bank's own format."""
+    if bank_name in PDF_BANKS:
+        return statement
+
+    columns = BANK_CONFIG[bank_name]["columns"]
+    raw = pd.DataFrame({
+        configured: statement[role]
+        for configured, role in zip(columns, ["reference", "customer_name", "commission", "premium"])
+    })
+    for i in range(FILLER_COLUMNS):
+        raw[f"EXTRA_{i}"] = rng.integers(0, 1000, len(raw))
+    return raw
+
+
+def write_pdf_statement(path, bank_name, statement, rows_per_page=30):
+    """Write a statement as a ruled-table PDF in the bank's layout."""
+    if bank_name == "The New India Pdf":
+        body = [[ref, name, f"{premium:,.2f}", f"{commission:.2f}"]
+                for ref, name, commission, premium in statement.itertuples(index=False)]
+    else:
+        body = [[ref, name, f"{premium:,.2f}", f"{commission:,.2f}", ""]
+                for ref, name, commission, premium in statement.itertuples(index=False)]
+
+    header = PDF_HEADERS[bank_name]
+    widths = [150, 220, 130, 130, 100][:len(header[-1])]
+    xs = np.concatenate([[30], 30 + np.cumsum(widths)]).tolist()
+    doc = pymupdf.open()
+    for start in range(0, max(len(body), 1), rows_per_page):
+        page = doc.new_page(width=842, height=595)
+        # The header rows are only on the first page
+        rows = (header if start == 0 else []) + body[start:start + rows_per_page]
+        top, height = 40, 16
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                page.insert_text((xs[c] + 3, top + r * height + 11), str(value), fontsize=7)
+        for r in range(len(rows) + 1):
+            page.draw_line((xs[0], top + r * height), (xs[-1], top + r * height))
+        for x in xs:
+            page.draw_line((x, top), (x, top + len(rows) * height))
+    doc.save(path)
+    doc.close()
+
+
+def write_dataset(directory, statements, broker):
+    """
+    Write statements (Excel / PDF) and the broker extract to a directory.
+
+    Returns:
+    tuple: (dict of bank name -> statement path, broker file path)
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for bank_name, statement in statements.items():
+        if bank_name in PDF_BANKS:
+            path = os.path.join(directory, f"{bank_name.replace(' ', '_')}.pdf")
+            write_pdf_statement(path, bank_name, statement)
+        else:
+            path = os.path.join(directory, f"{bank_name.replace(' ', '_')}.xlsx")
+            statement.to_excel(path, index=False)
+        paths[bank_name] = path
+
+    broker_path = os.path.join(directory, "broker.xlsx")
+    broker.to_excel(broker_path, index=False)
+    return paths, broker_path
@@ -0,0 +1,145 @@
+import io
+import os
+from collections import Counter
+import pandas as pd
+import pdfplumber
+from components.data_processing import BANK_CONFIG
+from components.data_cleaning import PDF_BANK_COLUMNS
+from components.excel_reader import excel_engine
+from components.pdf_extractors import pymupdf
+from components.statements import statement_file_type
+
+# Only this many leading rows of a sheet are read when looking for the header
+SNIFF_ROWS = 10
+
+# Detections below this confidence are not used to pick a bank automatically
+DETECTION_MIN_CONFIDENCE = 0.75
+
+
+def _signature_key(name):
+    """Normalize a column name for matching: lowercase alphanumerics only."""
+    return "".join(ch for ch in str(name).casefold() if ch.isalnum())
+
+
+def build_signature_index():
+    """
+    Build the header signatures of the known banks.
+
+    Excel banks are identified by their BANK_CONFIG columns, PDF banks by the
+    columns clean_pdf_data selects.
+
+    Returns:
+    tuple: ({bank: (file type, set of column keys)}, {column key: [banks]})
+    """
+    signatures = {}
+    for bank, config in BANK_CONFIG.items():
+        if bank not in PDF_BANK_COLUMNS:
+            signatures[bank] = ("Excel", {_signature_key(col) for col in config["columns"]})
+    for bank, columns in PDF_BANK_COLUMNS.items():
+        signatures[bank] = ("PDF", {_signature_key(col) for col in columns})
+
+    index = {}
+    for bank, (_, keys) in signatures.items():
+        for key in keys:
+            index.setdefault(key, []).append(bank)
+    return signatures, index
+
+
+SIGNATURES, SIGNATURE_INDEX = build_signature_index()
+
+
+def score_banks(keys, file_type, bank_names=None):
+    """
+    Score the banks of a file type against the column keys found in a header.
+
+    Returns:
+    tuple: (bank, confidence) of the best match, or (None, 0.0). The confidence
+        is the share of the bank's signature columns found, divided among
+        banks matching equally well.
+    """
+    matched = Counter(bank for key in keys for bank in SIGNATURE_INDEX.get(key, ()))
+    scores = {}
+    for bank, count in matched.items():
+        bank_type, signature = SIGNATURES[bank]
+        if bank_type != file_type or (bank_names is not None and bank not in bank_names):
+            continue
+        # Best coverage first; among equal coverage, the bank matching more columns
+        scores[bank] = (count / len(signature), count)
+    if not scores:
+        return None, 0.0
+
+    best = max(scores.values())
+    tied = sorted(bank for bank, score in scores.items() if score == best)
+    return tied[0], best[0] / len(tied)
+
+
+def _read_bytes(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def sniff_excel_rows(source, file_name=None, rows=SNIFF_ROWS):
+    """Read the first rows of the first sheet (as lists of cell values), without a header."""
+    engine = excel_engine(file_name or source)
+    if not isinstance(source, (str, os.PathLike)):
+        source = io.BytesIO(_read_bytes(source))
+    preview = pd.read_excel(source, header=None, nrows=rows, engine=engine)
+    return [[value for value in row if pd.notna(value)] for row in preview.itertuples(index=False)]
+
+
+def sniff_pdf_text(source):
+    """Return the text of the first page of a PDF."""
+    if pymupdf is None:
+        if not isinstance(source, (str, os.PathLike)):
+            source = io.BytesIO(_read_bytes(source))
+        with pdfplumber.open(source) as pdf:
+            return (pdf.pages[0].extract_text() or "") if pdf.pages else ""
+    if isinstance(source, (str, os.PathLike)):
+        document = pymupdf.open(source)
+    else:
+        document = pymupdf.open(stream=_read_bytes(source), filetype="pdf")
+    try:
+        return document[0].get_text() if document.page_count else ""
+    finally:
+        document.close()
+
+
+def detect_bank(source, file_name=None, bank_names=None):
+    """
+    Detect the bank of a statement from its header.
+
+    Only the first SNIFF_ROWS rows of an Excel sheet (the header may be below
+    a title block) or the first page of a PDF are read, so detection takes
+    milliseconds however large the file is.
+
+    Parameters:
+    source: Path of the statement, or its contents (bytes or an uploaded file).
+    file_name (str): File name, for the file type; defaults to `source` when it is a path.
+    bank_names (list): Banks to choose from (default: every known bank).
+
+    Returns:
+    tuple: (bank name, confidence between 0 and 1), or (None, 0.0) if no bank matches
+        or the file can't be read.
+    """
+    file_name = file_name or str(source)
+    file_type = statement_file_type(file_name)
+    try:
+        if file_type == "Excel":
+            best = (None, 0.0)
+            for row in sniff_excel_rows(source, file_name):
+                bank, confidence = score_banks({_signature_key(value) for value in row}, "Excel", bank_names)
+                if confidence > best[1]:
+                    best = (bank, confidence)
+            return best
+        if file_type == "PDF":
+            # Table cells may wrap, so column names are looked for in the page text
+            text = _signature_key(sniff_pdf_text(source))
+            keys = {key for key in SIGNATURE_INDEX if key in text}
+            return score_banks(keys, "PDF", bank_names)
+    except Exception as e:
+        print(f"Could not read the header of {os.path.basename(file_name)}: {e}")
+    return None, 0.0
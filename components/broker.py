@@ -1,21 +1,40 @@
-import re
+from components.policy_normalization import normalize_policy_numbers, NON_ALPHANUMERIC
+from components.compaction import compact_frame
+from components.value_cleaning import parse_amounts
+
+# Broker export columns used by broker_data_process, with the dtypes to read them as
+BROKER_COLUMNS = [
+    'PolicyNumber', 'p_insurerName', 'cName', 'odPremium', 'TpPremium', 'commisionRate', 'NetCommision',
+    'insNature', 'TotalPremium'
+]
+BROKER_COLUMN_DTYPES = {
+    'PolicyNumber': object,
+    'p_insurerName': str,
+    'cName': str,
+    'odPremium': 'float64',
+    'TpPremium': 'float64',
+    'commisionRate': 'float64',
+    'NetCommision': 'float64',
+    'insNature': str,
+    'TotalPremium': 'float64',
+}
 
 def broker_data_process(df):
     # Filtering the DataFrame based on the conditions
     filtered_df = df
 
     # Selecting specific columns and renaming to match the structure of the concatenated insurance file
-    selected_columns = filtered_df[['PolicyNumber', 'p_insurerName', 'cName', 'odPremium', 'TpPremium', 'commisionRate', 'NetCommision', 'insNature', 'TotalPremium']].copy()
+    selected_columns = filtered_df[BROKER_COLUMNS].copy()
     selected_columns.columns = [
         'POLICY_REFERENCE', 'Bank Name', 'CUSTOMER NAME', 'OD PREMIUM', 'TP PREMIUM',
         'COMMISSION RATE', 'TOTAL COMMISSION BROKER', 'INSURANCE NATURE', 'TOTAL PREMIUM'
     ]
 
-    # Convert 'TOTAL COMMISSION BROKER' and premiums to positive values
-    selected_columns['TOTAL COMMISSION BROKER'] = selected_columns['TOTAL COMMISSION BROKER'].abs()
-    selected_columns['OD PREMIUM'] = selected_columns['OD PREMIUM'].abs()
-    selected_columns['TP PREMIUM'] = selected_columns['TP PREMIUM'].abs()
-    selected_columns['TOTAL PREMIUM'] = selected_columns['TOTAL PREMIUM'].abs()
+    # Convert 'TOTAL COMMISSION BROKER' and premiums to positive values (amounts
+    # read as text, e.g. when the typed read fell back to inferred types, are parsed first)
+    for col in ('TOTAL COMMISSION BROKER', 'OD PREMIUM', 'TP PREMIUM', 'TOTAL PREMIUM'):
+        selected_columns[col] = parse_amounts(selected_columns[col]).abs()
+    selected_columns['COMMISSION RATE'] = parse_amounts(selected_columns['COMMISSION RATE'])
 
     # Adding a new column with a default value
     selected_columns.loc[:, 'Source'] = 'BROKER'
@@ -23,35 +42,14 @@ def broker_data_process(df):
     # Ensure POLICY_REFERENCE is treated as a string and strip leading/trailing spaces
     selected_columns['POLICY_REFERENCE'] = selected_columns['POLICY_REFERENCE'].astype(str).str.strip()
 
-    # Parsing POLICY_REFERENCE: Special conditions for specific banks
-    def parse_policy_reference(row):
-        policy_number = row['POLICY_REFERENCE']
-        bank_name = row['Bank Name']
-
-        if bank_name == 'GO DIGIT GENERAL INSURANCE LIMITED':
-            # Remove everything after '/'
-            return policy_number.split('/')[0].strip()
-
-        elif bank_name == 'TATA AIG GENERAL INSURANCE COMPANY LIMITED':
-            # Remove the first 0 if the policy number starts with it
-            if policy_number.startswith('0'):
-                policy_number = policy_number[1:]
-            # Keep only the first 10 characters
-            return policy_number[:10] if len(policy_number) > 10 else policy_number
-
-        elif bank_name == 'THE NEW INDIA ASSURANCE COMPANY LIMITED':
-            # Remove the last 3 digits if policy number ends with 8 zeros + 3 digits
-            if re.search(r'0{8}\d{3}$', policy_number):
-                return policy_number[:-3]  # Remove last 3 digits
-            return policy_number  # Keep as is if condition isn't met
-
-        else:
-            return policy_number  # Default case
-
-    # Apply the parsing function
-    selected_columns.loc[:, 'Parsed_POLICY_REFERENCE'] = selected_columns.apply(parse_policy_reference, axis=1)
+    # Parsing POLICY_REFERENCE: Special conditions for specific banks are registered
+    # in POLICY_RULES and applied to each bank's rows as a group
+    selected_columns.loc[:, 'Parsed_POLICY_REFERENCE'] = normalize_policy_numbers(
+        selected_columns['POLICY_REFERENCE'], selected_columns['Bank Name']
+    )
 
     # Clean up Parsed_POLICY_REFERENCE to retain only alphanumeric characters for all banks
-    selected_columns['Parsed_POLICY_REFERENCE'] = selected_columns['Parsed_POLICY_REFERENCE'].astype(str).str.replace(r'[^a-zA-Z0-9]', '', regex=True)
+    selected_columns['Parsed_POLICY_REFERENCE'] = selected_columns['Parsed_POLICY_REFERENCE'].astype(str).str.replace(NON_ALPHANUMERIC, '', regex=True)
 
-    return selected_columns
+    # Store labels, amounts and policy numbers in compact dtypes
+    return compact_frame(selected_columns)
@@ -0,0 +1,98 @@
+import time
+from components.broker import broker_data_process, BROKER_COLUMNS, BROKER_COLUMN_DTYPES
+from components.comparison import BankIndex
+from components.compaction import concat_frames
+from components.excel_reader import iter_excel_chunks
+from components.export import ExportWriter, MemorySampler
+from components.results_view import insurer_aggregates, combine_aggregates
+
+# Broker rows read, normalized and compared per step when streaming a broker file
+BROKER_CHUNK_ROWS = 50_000
+
+
+def iter_broker_chunks(file_path, chunk_rows=BROKER_CHUNK_ROWS):
+    """Yield the broker file as broker_data_process output, chunk_rows rows at a time."""
+    for chunk in iter_excel_chunks(file_path, BROKER_COLUMNS, BROKER_COLUMN_DTYPES, chunk_rows):
+        yield broker_data_process(chunk)
+
+
+def compare_broker_file(combined_df, broker_path, export_format, target, chunk_rows=BROKER_CHUNK_ROWS,
+                        **compare_kwargs):
+    """
+    Reconcile a broker file against the bank data without loading the file at once.
+
+    The bank data (much smaller than the broker file) is indexed once as a
+    BankIndex. The broker file is then read, normalized and compared one
+    chunk of rows at a time, and each chunk's results are appended to the
+    output, so peak memory follows the chunk size rather than the file size.
+
+    Regular policies missing the exact policy number join and endorsements
+    missing the exact name and premium join are held back and run through
+    the match cascade / fuzzy endorsement matching together once the whole
+    file has been read: only then is every bank row matched exactly known, so
+    these offer the same bank rows as when the whole file is compared at once.
+    The results are those of compare_bank_and_broker, in another order (the
+    rows of each chunk, then those of the held-back policies); memory grows
+    with the held-back policies, usually a small share of the file.
+
+    Parameters:
+    combined_df (pd.DataFrame): Combined output of the processed bank statements.
+    broker_path (str): Broker Excel file (.xlsx / .xlsm / .xlsb stream; .xls is read at once).
+    export_format (str): One of EXPORT_FORMATS.
+    target (str or file-like): Output path or binary buffer.
+    chunk_rows (int): Broker rows per chunk.
+    **compare_kwargs: Options of compare_bank_and_broker.
+
+    Returns:
+    dict: broker_rows, rows written, found (rows per FOUND label), stages (matched
+        rows per MATCH STAGE), aggregates (the insurer_aggregates of the results,
+        summed over the chunks), chunks, held_back (broker rows held back for
+        the cascade and fuzzy endorsement matching), seconds and peak_bytes (peak growth of the process
+        memory; None where it can't be measured).
+
+    Raises:
+    ValueError: If combined_df or the broker file is empty.
+    MissingColumnsError: If a broker column is not in the file's header row.
+    """
+    started = time.perf_counter()
+    summary = {'broker_rows': 0, 'rows': 0, 'found': {}, 'stages': {}, 'chunks': 0, 'held_back': 0}
+    aggregates = []
+
+    def write(writer, merged_df):
+        writer.write(merged_df)
+        summary['rows'] += len(merged_df)
+        aggregates.append(insurer_aggregates(merged_df))
+        for key, col in (('found', 'FOUND'), ('stages', 'MATCH STAGE')):
+            if col in merged_df.columns:
+                for label, count in merged_df[col].value_counts(sort=False).items():
+                    summary[key][label] = summary[key].get(label, 0) + int(count)
+
+    with MemorySampler() as memory:
+        bank_index = BankIndex(combined_df)
+        held_back = []
+        with ExportWriter(export_format, target) as writer:
+            for broker_df in iter_broker_chunks(broker_path, chunk_rows):
+                summary['broker_rows'] += len(broker_df)
+                summary['chunks'] += 1
+                fallbacks = {key: compare_kwargs.get(key, True) for key in ('cascade', 'fuzzy_endorsements')}
+                if any(fallbacks.values()):
+                    missed = bank_index.exact_misses(broker_df, **fallbacks)
+                    held_back.append(broker_df[missed])
+                    broker_df = broker_df[~missed]
+                merged_df = bank_index.compare(broker_df, **compare_kwargs)
+                write(writer, merged_df)
+                print(f"Broker chunk {summary['chunks']}: {len(broker_df)} rows -> {len(merged_df)} results")
+            if summary['chunks'] == 0:
+                raise ValueError("One or both datasets are empty. Cannot proceed with comparison.")
+
+            if held_back:
+                broker_df = concat_frames(held_back)
+                summary['held_back'] = len(broker_df)
+                merged_df = bank_index.compare(broker_df, **compare_kwargs)
+                write(writer, merged_df)
+                print(f"Held-back policies: {len(broker_df)} rows -> {len(merged_df)} results")
+
+    summary['aggregates'] = combine_aggregates(aggregates)
+    summary['seconds'] = time.perf_counter() - started
+    summary['peak_bytes'] = memory.peak_bytes
+    return summary
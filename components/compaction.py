@@ -0,0 +1,265 @@
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas.api.types import union_categoricals
+
+# Low-cardinality label columns, stored as categoricals (names compared stripped and upper-cased)
+CATEGORY_COLUMNS = {'SOURCE', 'BANK NAME', 'INSURANCE NATURE'}
+
+# Amount columns, stored as float64 when every value is numeric
+AMOUNT_COLUMNS = {
+    'PREMIUM BANK', 'TOTAL COMMISSION', 'TOTAL COMMISSION BROKER', 'OD PREMIUM', 'TP PREMIUM',
+    'TOTAL PREMIUM', 'COMMISSION RATE'
+}
+
+# Policy numbers and their parsed keys, stored as Arrow-backed strings
+POLICY_KEY_COLUMNS = {
+    'POLICY REFERENCE', 'POLICY_REFERENCE', 'PARSED_POLICY_REFERENCE', 'PARSED_POLICY_NUMBER_BANK'
+}
+
+# Spilled frames are written here as uncompressed Feather (Arrow IPC) files,
+# which can be memory-mapped back without reading them into memory
+SPILL_DIR = "./cache/spill"
+
+try:
+    # Missing values stay NaN, like the default string columns of pandas 3
+    ARROW_STRING_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+except TypeError:
+    ARROW_STRING_DTYPE = pd.StringDtype("pyarrow")
+
+
+def _column_key(name):
+    return str(name).strip().upper()
+
+
+def _compact_amounts(col):
+    """Return col as float64, or unchanged if some values aren't numbers."""
+    if pd.api.types.is_float_dtype(col) and col.dtype.itemsize == 8:
+        return col
+    amounts = pd.to_numeric(col, errors='coerce')
+    if amounts.isna().sum() != col.isna().sum():
+        return col
+    return amounts.astype('float64')
+
+
+def _compact_policy_keys(col):
+    """Return col as Arrow-backed strings, or unchanged if it also holds numbers."""
+    if col.dtype == ARROW_STRING_DTYPE:
+        return col
+    if col.dtype == object and not col.dropna().map(lambda value: isinstance(value, str)).all():
+        # Policy numbers read as numbers are written back as numbers on export
+        return col
+    return col.astype(ARROW_STRING_DTYPE)
+
+
+def compact_frame(df):
+    """
+    Store a processed DataFrame in compact dtypes.
+
+    Source / Bank Name / Insurance Nature become categoricals, amounts float64
+    and policy numbers Arrow-backed strings. Columns whose values don't fit the
+    compact dtype (e.g. amounts left as text) are kept as they are, so the
+    values themselves never change.
+
+    Parameters:
+    df (pd.DataFrame): Output of process_specific_bank, clean_pdf_data or broker_data_process.
+
+    Returns:
+    pd.DataFrame: The compacted DataFrame (attrs are kept).
+    """
+    columns = {}
+    for col in df.columns:
+        key = _column_key(col)
+        if key in CATEGORY_COLUMNS and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            columns[col] = df[col].astype('category')
+        elif key in AMOUNT_COLUMNS:
+            columns[col] = _compact_amounts(df[col])
+        elif key in POLICY_KEY_COLUMNS:
+            columns[col] = _compact_policy_keys(df[col])
+    if not columns:
+        return df
+
+    # Shallow copy: the columns left as they are aren't copied
+    compacted = df.copy(deep=False)
+    for col, values in columns.items():
+        compacted[col] = values
+    compacted.attrs = dict(df.attrs)
+    return compacted
+
+
+def concat_frames(frames):
+    """
+    Concatenate compacted frames, keeping their categorical columns categorical.
+
+    pd.concat falls back to object dtype when categoricals have different
+    categories (e.g. the Source of each statement), so the categories are
+    unioned first.
+    """
+    frames = list(frames)
+    categorical = {
+        col for frame in frames for col in frame.columns if isinstance(frame[col].dtype, pd.CategoricalDtype)
+    }
+    for col in categorical:
+        parts = [frame[col] for frame in frames if col in frame.columns]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            categories = union_categoricals(parts, ignore_order=True).categories
+            frames = [
+                frame.assign(**{col: frame[col].cat.set_categories(categories)}) if col in frame.columns else frame
+                for frame in frames
+            ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def frame_memory(df):
+    """Memory held by a DataFrame in bytes, counting the contents of strings."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# Type tags of the values in object columns mixing numbers and text or holding
+# None, which are stored as text next to a tag column so they are read back as
+# they were (Arrow reads its nulls back as NaN, so None is tagged too)
+MIXED_KIND_SUFFIX = "\0kind"
+MIXED_KINDS = {int: 1, float: 2, bool: 3, type(None): 4}
+
+# Columns a non-default index is stored in, one per level
+INDEX_COLUMN_PREFIX = "\0index"
+
+# Values write_frame_file stores unchanged in object columns
+FRAME_FILE_TYPES = (str, bool, int, float, np.bool_, np.integer, np.floating)
+
+
+def _value_kind(value):
+    if value is None:
+        return MIXED_KINDS[type(None)]
+    if isinstance(value, (bool, np.bool_)):
+        return MIXED_KINDS[bool]
+    if isinstance(value, (int, np.integer)):
+        return MIXED_KINDS[int]
+    if isinstance(value, (float, np.floating)):
+        return MIXED_KINDS[float]
+    return 0
+
+
+def _needs_kinds(column):
+    values = column.to_numpy(dtype=object)
+    return any(value is None for value in values) or column.dropna().map(type).nunique() > 1
+
+
+def write_frame_file(df, path):
+    """
+    Write df as an uncompressed Feather (Arrow IPC) file that can be memory-mapped.
+
+    An index other than the default RangeIndex is stored in extra columns.
+
+    Returns:
+    dict: The metadata map_frame_file needs to read the frame back (JSON-serializable
+        as long as df.attrs and the index names are).
+    """
+    table_df = df.reset_index(drop=True)
+    index = None
+    if not (isinstance(df.index, pd.RangeIndex) and df.index.equals(pd.RangeIndex(len(df)))):
+        levels = [f"{INDEX_COLUMN_PREFIX}{level}" for level in range(df.index.nlevels)]
+        table_df = table_df.assign(**{
+            name: pd.Series(df.index.get_level_values(level), index=table_df.index)
+            for level, name in enumerate(levels)
+        })
+        index = {"columns": levels, "names": list(df.index.names)}
+    object_columns = [col for col in table_df.columns if table_df[col].dtype == object]
+    mixed = [col for col in object_columns if _needs_kinds(table_df[col])]
+    if mixed:
+        table_df = table_df.copy(deep=False)
+        for col in mixed:
+            kinds = table_df[col].map(_value_kind).to_numpy(dtype=np.int8)
+            table_df[col] = table_df[col].astype(str).where(table_df[col].notna())
+            table_df[f"{col}{MIXED_KIND_SUFFIX}"] = kinds
+    feather.write_feather(table_df, path, compression="uncompressed")
+    return {"columns": list(df.columns), "object_columns": object_columns, "mixed_columns": mixed,
+            "index": index, "attrs": dict(df.attrs)}
+
+
+def frame_file_exact(df):
+    """Whether df comes back unchanged from write_frame_file (string column names, plain values)."""
+    if not all(isinstance(col, str) for col in df.columns) or df.columns.has_duplicates:
+        return False
+    frame = df.reset_index(drop=True)
+    for level in range(df.index.nlevels):
+        frame[f"{INDEX_COLUMN_PREFIX}{level}"] = pd.Series(df.index.get_level_values(level), index=frame.index)
+    for col in frame.columns:
+        if frame[col].dtype == object:
+            values = frame[col].to_numpy(dtype=object)
+            # NaT and pd.NA would come back as NaN; only None and NaN are kept as nulls
+            if not all(value is None or isinstance(value, FRAME_FILE_TYPES) for value in values):
+                return False
+    return True
+
+
+def _from_kinds(values, kinds):
+    for value_type, kind in MIXED_KINDS.items():
+        rows = np.flatnonzero(kinds == kind)
+        if value_type is type(None):
+            values[rows] = None
+        elif value_type is bool:
+            values[rows] = [value == "True" for value in values[rows]]
+        elif value_type is float:
+            values[rows] = [float(value) if isinstance(value, str) else np.nan for value in values[rows]]
+        else:
+            values[rows] = [value_type(value) for value in values[rows]]
+    return values
+
+
+def map_frame_file(path, meta):
+    """Read a frame written by write_frame_file, memory-mapping the file."""
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    df = table.to_pandas(split_blocks=True)
+    # Object columns come back as object, not as the Arrow type inferred for them
+    df = df.astype({col: object for col in meta["object_columns"]})
+    for col in meta["mixed_columns"]:
+        kind_col = f"{col}{MIXED_KIND_SUFFIX}"
+        values = _from_kinds(df[col].to_numpy(dtype=object, copy=True), df[kind_col].to_numpy())
+        # Assigning the bare array would infer the str dtype for a column of text and None
+        df[col] = pd.Series(values, index=df.index, dtype=object)
+        df = df.drop(columns=kind_col)
+    index = meta.get("index")
+    if index:
+        df = df.set_index(index["columns"])
+        df.index.names = index["names"]
+    df = df[meta["columns"]]
+    df.attrs = dict(meta["attrs"])
+    return df
+
+
+class SpilledFrame:
+    """
+    A DataFrame stored in an uncompressed Feather file.
+
+    load() memory-maps the file, so the data is paged in from disk as it is
+    read and the pages can be dropped again under memory pressure instead of
+    holding a private copy.
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.nbytes = os.path.getsize(path)
+
+    @classmethod
+    def write(cls, df, directory=SPILL_DIR, name=None):
+        """Write df to `directory` (as `name`, or a random file name)."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name or f"{uuid.uuid4().hex}.feather")
+        return cls(path, write_frame_file(df, path))
+
+    def load(self):
+        """Return the DataFrame, memory-mapped from disk."""
+        return map_frame_file(self.path, self.meta)
+
+    def remove(self):
+        """Delete the file."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,445 @@
+import numpy as np
+import pandas as pd
+from components.fuzzy_matching import match_endorsements, FUZZY_NAME_THRESHOLD, FUZZY_PREMIUM_TOLERANCE
+from components.value_cleaning import parse_amounts
+from components.match_cascade import CASCADE_STAGES, EXACT_STAGE, MIN_AFFIX_LENGTH, match_keys, cascade_match
+
+# Short bank names (the Source of processed statements) mapped to the insurer names used in broker files
+BANK_NAME_MAP = {
+    "BAJAJ": "BAJAJ ALLIANZ GENERAL INSURANCE COMPANY LIMITED",
+    "CARE": "CARE HEALTH INSURANCE LIMITED",
+    "CHOLAMANDALAM": "CHOLAMANDALAM MS GENERAL INSURANCE COMPANY LIMITED",
+    "FUTURE": "FUTURE GENERALI INDIA INSURANCE COMPANY LIMITED",
+    "IFFCO": "IFFCO TOKIO GENERAL INSURANCE COMPANY LIMITED",
+    "LIBERTY": "LIBERTY GENERAL INSURANCE LIMITED",
+    "GO-DIGIT": "GO DIGIT GENERAL INSURANCE LIMITED",
+    "HDFC": "HDFC ERGO GENERAL INSURANCE COMPANY LIMITED",
+    "ICICI": "ICICI LOMBARD GENERAL INSURANCE COMPANY LIMITED",
+    "MANIPAL SIGNA": "MANIPALCIGNA HEALTH INSURANCE COMPANY LIMITED",
+    "NATIONAL NEHRU": "NATIONAL INSURANCE COMPANY LIMITED",
+    "RELIANCE": "RELIANCE GENERAL INSURANCE COMPANY LIMITED",
+    "SBI": "SBI GENERAL INSURANCE COMPANY LIMITED",
+    "TATA AIG": "TATA AIG GENERAL INSURANCE COMPANY LIMITED",
+    "UNITED PDF": "UNITED INDIA INSURANCE COMPANY LIMITED"
+}
+
+
+def map_bank_names(bank_name):
+    """Map short bank names to full names"""
+    return BANK_NAME_MAP.get(bank_name.upper(), bank_name)
+
+
+# FOUND labels, in the category order the pandas merge indicator produced
+FOUND_LABELS = ['Not Found in Bank', 'Not Found in Broker', 'Matched']
+
+# Join keys (broker columns, bank columns)
+REGULAR_KEYS = (['PARSED_POLICY_REFERENCE'], ['PARSED_POLICY_NUMBER_BANK'])
+ENDORSEMENT_KEYS = (['CUSTOMER NAME', 'TOTAL PREMIUM'], ['CUSTOMER NAME', 'PREMIUM BANK'])
+
+SUFFIXES = ('_BROKER', '_BANK')
+
+# MATCH STAGE labels: the regular policy cascade, then the endorsement matches
+ENDORSEMENT_STAGE = "Endorsement name and premium"
+FUZZY_ENDORSEMENT_STAGE = "Fuzzy endorsement"
+MATCH_STAGES = CASCADE_STAGES + [ENDORSEMENT_STAGE, FUZZY_ENDORSEMENT_STAGE]
+
+
+def _normalize_column(name):
+    """Strip whitespace and upper-case a column name."""
+    return str(name).strip().upper()
+
+
+class _KeyIndex:
+    """
+    Hash index of rows by one or more key columns, for left joins.
+
+    Each key column is factorized once into codes over its distinct values,
+    and the rows are kept sorted by their combined code, so a lookup is a
+    hash lookup per column plus a binary search. Missing values match each
+    other, the way pandas merge keys do.
+    """
+
+    def __init__(self, keys):
+        codes = np.zeros(len(keys), dtype=np.int64)
+        self.values = []
+        for position in range(keys.shape[1]):
+            column_codes, uniques = pd.factorize(keys.iloc[:, position], use_na_sentinel=False)
+            self.values.append(pd.Index(uniques))
+            codes = codes * len(uniques) + column_codes
+        self.order = np.argsort(codes, kind='stable')
+        self.codes = codes[self.order]
+
+    def _codes(self, keys):
+        """Combined codes of the keys; -1 where some value isn't indexed."""
+        codes = np.zeros(len(keys), dtype=np.int64)
+        found = np.ones(len(keys), dtype=bool)
+        for position, values in enumerate(self.values):
+            column_codes = values.get_indexer(keys.iloc[:, position])
+            found &= column_codes >= 0
+            codes = codes * len(values) + column_codes
+        return np.where(found, codes, -1)
+
+    def join(self, keys):
+        """
+        Left-join key rows to the indexed rows.
+
+        Returns:
+        tuple: (key positions, indexed positions with -1 where nothing matched),
+            in key order and, for several matches, indexed order, like a left pd.merge.
+        """
+        codes = self._codes(keys)
+        first = np.searchsorted(self.codes, codes, side='left')
+        counts = np.where(codes >= 0, np.searchsorted(self.codes, codes, side='right') - first, 0)
+        repeats = np.maximum(counts, 1)
+        left = np.repeat(np.arange(len(keys)), repeats)
+        # Position of each output row among the matches of its key row
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        matches = np.minimum(np.repeat(first, repeats) + offsets, len(self.order) - 1)
+        right = np.where(np.repeat(counts, repeats) > 0, self.order[matches], -1)
+        return left, right
+
+
+def _assemble(broker, bank, broker_positions, bank_positions):
+    """
+    Build merged rows from matched positions, laid out like a left pd.merge.
+
+    Columns present on both sides get the _BROKER / _BANK suffixes; bank
+    columns are missing (NaN) where bank_positions is -1.
+    """
+    overlap = set(broker.columns) & set(bank.columns)
+    broker_part = broker.take(broker_positions).reset_index(drop=True).rename(
+        columns={col: f"{col}{SUFFIXES[0]}" for col in overlap}
+    )
+    bank_part = bank.reset_index(drop=True).reindex(bank_positions).reset_index(drop=True).rename(
+        columns={col: f"{col}{SUFFIXES[1]}" for col in overlap}
+    )
+    return pd.concat([broker_part, bank_part], axis=1)
+
+
+def _split_records(combined_df, broker_df):
+    """
+    Index the bank rows and pick the broker rows to reconcile.
+
+    Returns:
+    tuple: (BankIndex, broker (columns normalized), regular broker rows,
+        endorsement broker rows); the rows are positions in broker order.
+
+    Raises:
+    ValueError: If a dataset is empty or the parsed bank policy number is missing.
+    """
+    if combined_df.empty or broker_df.empty:
+        raise ValueError("One or both datasets are empty. Cannot proceed with comparison.")
+    bank_index = BankIndex(combined_df)
+    broker = broker_df.rename(columns=_normalize_column)
+    return (bank_index, broker, *bank_index.broker_rows(broker))
+
+
+def _crosses_insurers(bank_index, broker, broker_rows, keys):
+    """Whether a join key of some broker row is also the key of a bank row of another insurer."""
+    left, right = bank_index.join(broker, broker_rows, keys)
+    matched = right >= 0
+    broker_insurers = broker['BANK NAME'].take(broker_rows[left[matched]]).to_numpy(dtype=object)
+    bank_insurers = bank_index.insurers.take(right[matched]).to_numpy(dtype=object)
+    return bool((broker_insurers != bank_insurers).any())
+
+
+def _insurer_positions(insurers, rows):
+    """Group row positions by insurer; returns {insurer: rows}, each in the order of `rows`."""
+    groups = pd.Series(rows).groupby(insurers.take(rows).to_numpy(), sort=False)
+    return {insurer: group.to_numpy() for insurer, group in groups}
+
+
+def insurer_shards(combined_df, broker_df):
+    """
+    Split a reconciliation into independent shards, one per insurer.
+
+    Bank rows belong to the insurer their Source maps to, broker rows to their
+    BANK NAME. The match cascade and fuzzy endorsement matches never cross
+    insurers, but the exact joins match keys against every bank row, so the
+    split is only valid when no broker key is also a key of another insurer's
+    bank rows; compare_bank_and_broker on each shard then matches exactly what
+    it matches on the whole data.
+
+    Returns:
+    list: (insurer, bank rows, regular broker rows, endorsement broker rows)
+        per insurer with broker rows to reconcile, the rows as positions in
+        the input frames; None when some exact key crosses insurers.
+
+    Raises:
+    ValueError: Like compare_bank_and_broker.
+    """
+    bank_index, broker, regular_rows, endorsement_rows = _split_records(combined_df, broker_df)
+    if (_crosses_insurers(bank_index, broker, regular_rows, REGULAR_KEYS)
+            or _crosses_insurers(bank_index, broker, endorsement_rows, ENDORSEMENT_KEYS)):
+        return None
+
+    bank_groups = _insurer_positions(bank_index.insurers, np.arange(len(bank_index)))
+    regular_groups = _insurer_positions(broker['BANK NAME'], regular_rows)
+    endorsement_groups = _insurer_positions(broker['BANK NAME'], endorsement_rows)
+    empty = np.array([], dtype=np.int64)
+    return [
+        (insurer, bank_groups[insurer], regular_groups.get(insurer, empty), endorsement_groups.get(insurer, empty))
+        for insurer in dict.fromkeys([*regular_groups, *endorsement_groups])
+    ]
+
+
+class BankIndex:
+    """
+    The bank side of a reconciliation, indexed once to be probed with broker rows.
+
+    Holds the bank rows (column names normalized), the insurer of each row
+    and hash indexes of the exact join keys; the match cascade keys of a bank
+    row are built the first time the cascade offers it. compare() reconciles
+    a broker frame against it, and can be called with successive chunks of a
+    broker file too large to load at once: bank rows matched to regular
+    policies or fuzzy-matched endorsements are remembered, so the cascade
+    and the fuzzy endorsement pass don't offer them to later chunks again
+    (nor, to the fuzzy pass, the rows the exact endorsement join matched).
+    Holding back the exact_misses() of every chunk for a last compare() call
+    gives the cascade and the fuzzy pass the candidates they would have had
+    with the whole file (see compare_broker_file).
+    """
+
+    def __init__(self, combined_df, reserved_bank_rows=None):
+        """
+        Parameters:
+        combined_df (pd.DataFrame): Combined output of the processed bank statements.
+        reserved_bank_rows (np.ndarray): Boolean mask of the bank rows the fallback stages may not match
+            (see compare_bank_and_broker).
+
+        Raises:
+        ValueError: If combined_df is empty or the parsed bank policy number is missing.
+        """
+        if combined_df.empty:
+            raise ValueError("One or both datasets are empty. Cannot proceed with comparison.")
+
+        # Normalize column names for consistency
+        self.bank = combined_df.rename(columns=_normalize_column)
+
+        # Ensure PARSED_POLICY_NUMBER_BANK exists
+        if 'PARSED_POLICY_NUMBER_BANK' not in self.bank.columns:
+            raise ValueError("PARSED_POLICY_NUMBER_BANK column is missing in Combined DataFrame.")
+
+        # Only broker rows of banks present in the (mapped) bank sources are reconciled
+        sources = self.bank['SOURCE'].unique()
+        self.relevant_banks = [map_bank_names(source) for source in sources]
+        print("Relevant Banks after Mapping:", self.relevant_banks)
+        self.insurers = self.bank['SOURCE'].map(dict(zip(sources, self.relevant_banks)))
+
+        self.regular_index = _KeyIndex(self.bank[REGULAR_KEYS[1]])
+        self.endorsement_index = _KeyIndex(self.bank[ENDORSEMENT_KEYS[1]])
+        self._match_keys = None
+        self._has_match_keys = np.zeros(len(self.bank), dtype=bool)
+        # Bank rows matched to regular policies or fuzzy-matched endorsements by earlier compare() calls
+        self.matched = np.zeros(len(self.bank), dtype=bool)
+        if reserved_bank_rows is not None:
+            self.matched |= np.asarray(reserved_bank_rows, dtype=bool)
+        # Bank rows matched by the exact endorsement join in earlier compare() calls
+        self.endorsed = np.zeros(len(self.bank), dtype=bool)
+
+    def __len__(self):
+        return len(self.bank)
+
+    def broker_rows(self, broker):
+        """
+        Pick the broker rows to reconcile (broker columns normalized).
+
+        Returns:
+        tuple: (regular policy rows, endorsement rows) as positions, in broker order.
+        """
+        relevant = broker['BANK NAME'].isin(self.relevant_banks).to_numpy()
+        endorsement = (broker['INSURANCE NATURE'] == 'Endorsment').fillna(False).to_numpy(dtype=bool)
+        return np.flatnonzero(relevant & ~endorsement), np.flatnonzero(relevant & endorsement)
+
+    def join(self, broker, broker_rows, keys):
+        """Left-join broker rows to the bank rows on REGULAR_KEYS or ENDORSEMENT_KEYS; see _KeyIndex.join."""
+        index = self.regular_index if keys is REGULAR_KEYS else self.endorsement_index
+        return index.join(broker[keys[0]].take(broker_rows))
+
+    def exact_misses(self, broker_df, cascade=True, fuzzy_endorsements=True):
+        """
+        Boolean mask of the broker_df rows (to reconcile) the exact joins miss:
+        regular policies with cascade, endorsements with fuzzy_endorsements.
+        """
+        broker = broker_df.rename(columns=_normalize_column)
+        missed = np.zeros(len(broker), dtype=bool)
+        for rows, keys, fallback in zip(self.broker_rows(broker), (REGULAR_KEYS, ENDORSEMENT_KEYS),
+                                        (cascade, fuzzy_endorsements)):
+            if fallback:
+                left, right = self.join(broker, rows, keys)
+                missed[rows[left[right < 0]]] = True
+        return missed
+
+    def _cascade_keys(self, rows):
+        """match_keys of the given bank rows, built once per row and kept (indexed by bank position)."""
+        missing = rows[~self._has_match_keys[rows]]
+        if len(missing):
+            keys = match_keys(
+                self.bank['PARSED_POLICY_NUMBER_BANK'].take(missing),
+                self.insurers.take(missing),
+                self.bank['CUSTOMER NAME'].take(missing),
+                self.bank['PREMIUM BANK'].take(missing)
+            ).set_axis(missing)
+            self._match_keys = keys if self._match_keys is None else pd.concat([self._match_keys, keys])
+            self._has_match_keys[missing] = True
+        return self._match_keys.loc[rows].reset_index(drop=True)
+
+    def compare(self, broker_df, fuzzy_endorsements=True,
+                name_threshold=FUZZY_NAME_THRESHOLD, premium_tolerance=FUZZY_PREMIUM_TOLERANCE,
+                cascade=True, min_affix_length=MIN_AFFIX_LENGTH, progress=None):
+        """
+        Reconcile broker rows against the indexed bank rows.
+
+        Parameters and result are those of compare_bank_and_broker (without
+        combined_df). An empty broker_df gives an empty result.
+        """
+        bank = self.bank
+        broker = broker_df.rename(columns=_normalize_column)
+        regular_rows, endorsement_rows = self.broker_rows(broker)
+
+        # Match regular policies on policy number, endorsements on customer name and premium
+        total_rows = len(regular_rows) + len(endorsement_rows)
+        regular_left, regular_right = self.join(broker, regular_rows, REGULAR_KEYS)
+        regular_stage = np.where(regular_right >= 0, MATCH_STAGES.index(EXACT_STAGE), -1)
+        regular_confidence = np.where(regular_right >= 0, 1.0, np.nan)
+
+        # Run the regular policies the exact join missed through the rest of the cascade
+        unmatched = np.flatnonzero(regular_right < 0)
+        if cascade and len(unmatched):
+            rows = regular_rows[regular_left[unmatched]]
+            # Only bank rows not matched yet, of the insurers still to match, are candidates
+            candidates = self.insurers.isin(broker['BANK NAME'].take(rows).unique()).to_numpy(copy=True)
+            candidates[regular_right[regular_right >= 0]] = False
+            candidates = np.flatnonzero(candidates & ~self.matched)
+            found, stage, confidence = cascade_match(
+                match_keys(
+                    broker['PARSED_POLICY_REFERENCE'].take(rows),
+                    broker['BANK NAME'].take(rows),
+                    broker['CUSTOMER NAME'].take(rows),
+                    broker['TOTAL PREMIUM'].take(rows)
+                ),
+                self._cascade_keys(candidates),
+                min_affix_length=min_affix_length
+            )
+            matched = found >= 0
+            regular_right[unmatched[matched]] = candidates[found[matched]]
+            regular_stage[unmatched[matched]] = stage[matched]
+            regular_confidence[unmatched[matched]] = confidence[matched]
+        self.matched[regular_right[regular_right >= 0]] = True
+        if progress:
+            progress(len(regular_rows), total_rows, "rows")
+        endorsement_left, endorsement_right = self.join(broker, endorsement_rows, ENDORSEMENT_KEYS)
+        self.endorsed[endorsement_right[endorsement_right >= 0]] = True
+
+        # Fuzzy-match the endorsements the exact join missed, within the same insurer
+        endorsement_confidence = np.where(endorsement_right >= 0, 1.0, np.nan)
+        endorsement_fuzzy = np.zeros(len(endorsement_right), dtype=bool)
+        unmatched = np.flatnonzero(endorsement_right < 0)
+        if fuzzy_endorsements and len(unmatched):
+            rows = endorsement_rows[endorsement_left[unmatched]]
+            # Only bank rows no broker row matched (here or in earlier calls) are candidates
+            candidates = np.flatnonzero(~(self.matched | self.endorsed))
+            found, bank_rows, confidence = match_endorsements(
+                broker['BANK NAME'].take(rows),
+                broker['CUSTOMER NAME'].take(rows),
+                broker['TOTAL PREMIUM'].take(rows),
+                self.insurers.take(candidates),
+                bank['CUSTOMER NAME'].take(candidates),
+                bank['PREMIUM BANK'].take(candidates),
+                name_threshold=name_threshold,
+                premium_tolerance=premium_tolerance
+            )
+            endorsement_right[unmatched[found]] = candidates[bank_rows]
+            endorsement_confidence[unmatched[found]] = confidence
+            endorsement_fuzzy[unmatched[found]] = True
+            self.matched[candidates[bank_rows]] = True
+        fuzzy = np.concatenate([np.zeros(len(regular_right), dtype=bool), endorsement_fuzzy])
+        if progress:
+            progress(total_rows, total_rows, "rows")
+
+        bank_positions = np.concatenate([regular_right, endorsement_right])
+        merged_df = _assemble(
+            broker,
+            bank,
+            np.concatenate([regular_rows[regular_left], endorsement_rows[endorsement_left]]),
+            bank_positions
+        )
+
+        # Endorsement key columns shared by both sides are kept once, unsuffixed
+        # (fuzzy matches also keep the bank's value)
+        is_endorsement = np.arange(len(merged_df)) >= len(regular_left)
+        for col in set(ENDORSEMENT_KEYS[0]) & set(ENDORSEMENT_KEYS[1]):
+            merged_df[col] = merged_df[f"{col}{SUFFIXES[0]}"].where(is_endorsement)
+            merged_df[f"{col}{SUFFIXES[0]}"] = merged_df[f"{col}{SUFFIXES[0]}"].where(~is_endorsement)
+            merged_df[f"{col}{SUFFIXES[1]}"] = merged_df[f"{col}{SUFFIXES[1]}"].where(~is_endorsement | fuzzy)
+
+        # Add FOUND column: every broker row is kept, so nothing is "Not Found in Broker"
+        merged_df['FOUND'] = pd.Categorical.from_codes(
+            np.where(bank_positions >= 0, FOUND_LABELS.index('Matched'), FOUND_LABELS.index('Not Found in Bank')),
+            categories=FOUND_LABELS
+        )
+
+        # Calculate the DIFF column (difference in commissions, 0 unless both are present)
+        broker_commission = parse_amounts(merged_df['TOTAL COMMISSION BROKER'])
+        bank_commission = parse_amounts(merged_df['TOTAL COMMISSION'])
+        merged_df['DIFFERENCE'] = (broker_commission - bank_commission).fillna(0)
+
+        endorsement_stage = np.where(
+            endorsement_fuzzy, MATCH_STAGES.index(FUZZY_ENDORSEMENT_STAGE),
+            np.where(endorsement_right >= 0, MATCH_STAGES.index(ENDORSEMENT_STAGE), -1)
+        )
+        merged_df['MATCH STAGE'] = pd.Categorical.from_codes(
+            np.concatenate([regular_stage, endorsement_stage]), categories=MATCH_STAGES
+        )
+        merged_df['MATCH CONFIDENCE'] = np.concatenate([regular_confidence, endorsement_confidence])
+
+        return merged_df
+
+
+def compare_bank_and_broker(combined_df, broker_df, fuzzy_endorsements=True,
+                            name_threshold=FUZZY_NAME_THRESHOLD, premium_tolerance=FUZZY_PREMIUM_TOLERANCE,
+                            cascade=True, min_affix_length=MIN_AFFIX_LENGTH, progress=None, reserved_bank_rows=None):
+    """
+    Reconcile the combined bank statements against the processed broker data.
+
+    Regular policies are matched on the parsed policy number, endorsements on
+    customer name and premium. The bank join keys are hash-indexed once (see
+    BankIndex) and probed with the broker keys; the output rows are then
+    gathered from both frames in a single pass, without copying the inputs. Regular policies
+    without an exact match can go through the match cascade (9-digit key,
+    prefix / suffix, name and premium; see cascade_match), endorsements without
+    one can be fuzzy-matched (see match_endorsements).
+
+    Parameters:
+    combined_df (pd.DataFrame): Combined output of the processed bank statements.
+    broker_df (pd.DataFrame): Output of broker_data_process.
+    fuzzy_endorsements (bool): Fuzzy-match endorsements left without an exact match.
+    name_threshold (float): Minimum customer name similarity for a fuzzy match.
+    premium_tolerance (float): Largest premium difference for a fuzzy match.
+    cascade (bool): Run regular policies left without an exact match through the match cascade.
+    min_affix_length (int): Shortest shared policy number prefix / suffix the cascade matches.
+    progress (callable): Called as progress(broker rows matched, broker rows to match, "rows")
+        after the regular policies and after the endorsements.
+    reserved_bank_rows (np.ndarray): Boolean mask over combined_df of bank rows the match cascade and
+        fuzzy endorsement matching may not match, e.g. rows settled to other broker rows in the ledger
+        (the exact joins still match them).
+
+    Returns:
+    pd.DataFrame: One row per broker record (regular policies first, then
+        endorsements) with the matched bank columns, FOUND (Matched / Not Found
+        in Bank), DIFFERENCE (broker - bank commission, 0 when unmatched),
+        MATCH STAGE (the MATCH_STAGES label of the stage that matched the row,
+        empty when unmatched) and MATCH CONFIDENCE (1 for exact key matches,
+        below 1 for the fallback stages of the cascade (see STAGE_CONFIDENCE),
+        the name similarity for fuzzy endorsement matches, empty when unmatched).
+        Fuzzy-matched rows keep the bank's spelling in CUSTOMER NAME_BANK.
+
+    Raises:
+    ValueError: If a dataset is empty or the parsed bank policy number is missing.
+    """
+    if combined_df.empty or broker_df.empty:
+        raise ValueError("One or both datasets are empty. Cannot proceed with comparison.")
+    return BankIndex(combined_df, reserved_bank_rows).compare(
+        broker_df, fuzzy_endorsements=fuzzy_endorsements, name_threshold=name_threshold,
+        premium_tolerance=premium_tolerance, cascade=cascade, min_affix_length=min_affix_length, progress=progress
+    )
@@ -1,5 +1,29 @@
-import pandas as pd
-import re
+from components.policy_normalization import normalize_policy_numbers
+from components.compaction import compact_frame
+from components.value_cleaning import parse_amounts, clean_text_columns
+
+# Statement columns -> standard columns, per PDF bank
+NEW_INDIA_COLUMNS = {
+    'Policy Number': 'Policy Reference',
+    'Insured Name': 'Customer Name',
+    'Premium': 'Premium Bank',
+    'Brokerage': 'Total Commission'
+}
+
+# Alternative column names to check for 'Insured Name'
+NEW_INDIA_NAME_ALTERNATIVES = ['Insured Name', 'INSURED NAME', 'Insured name', 'Customer Name']
+
+UNITED_COLUMNS = {
+    'Policy/ Endt number': 'Policy Reference',
+    'Insured Name': 'Customer Name',
+    'ELG Premium Amount': 'Premium Bank',
+    'Commission Amount': 'Total Commission'
+}
+
+PDF_BANK_COLUMNS = {
+    "The New India Pdf": NEW_INDIA_COLUMNS,
+    "United Pdf": UNITED_COLUMNS,
+}
 
 def clean_pdf_data(df, bank_name):
     """
@@ -25,18 +49,10 @@ def clean_pdf_data(df, bank_name):
             df = df[~df['Policy Number'].astype(str).str.fullmatch(r'0+')]
 
             # Select required columns dynamically
-            required_columns = {
-                'Policy Number': 'Policy Reference',
-                'Insured Name': 'Customer Name',
-                'Premium': 'Premium Bank',
-                'Brokerage': 'Total Commission'
-            }
-
-            # Alternative column names to check for 'Insured Name'
-            insured_name_alternatives = ['Insured Name', 'INSURED NAME', 'Insured name', 'Customer Name']
+            required_columns = dict(NEW_INDIA_COLUMNS)
 
             # Find the correct column for 'Insured Name'
-            for alt_name in insured_name_alternatives:
+            for alt_name in NEW_INDIA_NAME_ALTERNATIVES:
                 if alt_name in df.columns:
                     required_columns[alt_name] = 'Customer Name'
                     break  # Stop searching once a match is found
@@ -48,18 +64,16 @@ def clean_pdf_data(df, bank_name):
             # Rename columns to new names
             df = df.rename(columns=available_columns)
 
+            # Parse the amounts ("1,23,456.70", "(1,200.00)", "500 Dr", ...)
+            for col in ('Premium Bank', 'Total Commission'):
+                if col in df.columns:
+                    df[col] = parse_amounts(df[col])
+
             # Add Source column with the bank name
             df['Source'] = "New India"
 
-            # Parse Policy Reference
-            def parse_policy_reference(policy):
-                # Remove everything except numbers
-                policy_str = ''.join(filter(str.isdigit, str(policy)))
-                # Remove digits after the last set of five zeros
-                parsed_policy = re.sub(r'0{5}\d{1,3}$', '00000', policy_str)
-                return parsed_policy
-
-            df['PARSED_POLICY_REFERENCE'] = df['Policy Reference'].apply(parse_policy_reference)
+            # Parse Policy Reference: keep only numbers and remove digits after the last set of five zeros
+            df['PARSED_POLICY_REFERENCE'] = normalize_policy_numbers(df['Policy Reference'], bank_name)
 
             # Drop rows where the parsed policy reference is empty
             df = df[df['PARSED_POLICY_REFERENCE'].str.strip() != ""]
@@ -67,7 +81,7 @@ def clean_pdf_data(df, bank_name):
             print("Cleaned DataFrame (First 5 Rows):")
             print(df.head())
 
-            return df
+            return compact_frame(df)
 
 
         elif bank_name == "United Pdf":
@@ -92,12 +106,7 @@ def clean_pdf_data(df, bank_name):
             df.columns = unique_headers
 
             # Extract required columns
-            required_columns = {
-                'Policy/ Endt number': 'Policy Reference',
-                'Insured Name': 'Customer Name',
-                'ELG Premium Amount': 'Premium Bank',
-                'Commission Amount': 'Total Commission'
-            }
+            required_columns = UNITED_COLUMNS
             df = df[list(required_columns.keys())]
 
             # Rename columns to new names
@@ -106,29 +115,15 @@ def clean_pdf_data(df, bank_name):
             # Add Source column with the bank name
             df['Source'] = "United"
 
-            # Parse Policy Reference
-            def parse_policy_reference(policy):
-                # Remove everything after '/' including the slash
-                parsed_policy = re.sub(r"/.*", "", str(policy))
-                # Ensure it's alphanumeric
-                if re.match(r'^[a-zA-Z0-9]+$', parsed_policy):
-                    return parsed_policy
-                return None  # Invalid policy number
-
-            df['PARSED_POLICY_REFERENCE'] = df['Policy Reference'].apply(parse_policy_reference)
+            # Parse Policy Reference: remove everything after '/' and keep only alphanumeric references
+            df['PARSED_POLICY_REFERENCE'] = normalize_policy_numbers(df['Policy Reference'], bank_name)
 
             # Remove rows with invalid or missing Parsed Policy Reference
             df = df.dropna(subset=['PARSED_POLICY_REFERENCE'])
 
-            # Clean numeric columns
-            def clean_numeric(value):
-                # Remove commas and whitespace, and convert to numeric
-                if isinstance(value, str):
-                    value = value.replace(",", "").strip()
-                return pd.to_numeric(value, errors='coerce')
-
-            df['Premium Bank'] = df['Premium Bank'].apply(clean_numeric).fillna(0)
-            df['Total Commission'] = df['Total Commission'].apply(clean_numeric).fillna(0)
+            # Clean numeric columns (commas, whitespace, Cr/Dr, parentheses)
+            df['Premium Bank'] = parse_amounts(df['Premium Bank']).fillna(0)
+            df['Total Commission'] = parse_amounts(df['Total Commission']).fillna(0)
 
             print("Data After Cleaning Numeric Columns (First 5 Rows):")
             print(df[['Premium Bank', 'Total Commission']].head())
@@ -153,18 +148,17 @@ def clean_pdf_data(df, bank_name):
             print("Cleaned DataFrame (First 5 Rows):")
             print(df.head())
 
-            return df
+            return compact_frame(df)
 
 
         else:
             print(f"No specific cleaning rules defined for bank: {bank_name}")
 
-        # General cleaning: Trim whitespace and handle empty cells
-        df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)  # Trim strings
-        df = df.replace('', pd.NA)  # Replace empty strings with NaN for consistency
+        # General cleaning: Trim whitespace and turn empty cells into NA
+        df = clean_text_columns(df)
         df = df.dropna(how='all')  # Drop rows where all elements are NaN
 
-        return df
+        return compact_frame(df)
 
     except Exception as e:
         raise RuntimeError(f"Error cleaning data for {bank_name}: {e}")
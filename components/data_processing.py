@@ -1,49 +1,80 @@
 import pandas as pd
-import streamlit as st
+from components.excel_reader import read_excel_columns, MissingColumnsError
+from components.compaction import compact_frame
+from components.value_cleaning import parse_amounts
+
+# Define standard column names
+STANDARD_COLUMNS = {
+    "reference": "Policy Reference",
+    "customer_name": "Customer Name",
+    "commission": "Total Commission",
+    "premium": "Premium Bank"  # New column for Premium Amount
+}
+
+# Bank-specific configurations
+BANK_CONFIG = {
+    "Bajaj": {"columns": ['POLICY_REFERENCE', 'CUSTOMER NAME ', 'TOTAL COMMISSION', 'NET PREMIUM'], "source": "Bajaj"},
+    "CARE": {"columns": ['Policy No', 'Customer Name', 'Total Amount', 'Premium'], "source": "CARE"},
+    "Cholamandalam": {"columns": ['POLICY_NO', 'INSURED_NAME', 'Total Payout', 'NET_PREMIUM'], "source": "Cholamandalam"},
+    "FUTURE": {"columns": ['POLICY_NO', 'COMBINE_CLIENT_NAME', 'Com+Payout', 'GWP'], "source": "FUTURE"},
+    "LIBERTY": {"columns": ['POLICY/ENDORSEMENT NO.', 'INSURED NAME', 'TOTAL COMMISSION', 'GWP'], "source": "LIBERTY"},
+    "GO-DIGIT": {"columns": ['policy number', 'policy holder', 'IRDA_AMT', 'net premium'], "source": "GO-DIGIT"},
+    "HDFC": {"columns": ['Certificate_Num', 'Customer_Name', 'TOTAL_COMM', 'GWP'], "source": "HDFC"},
+    "ICICI": {"columns": ['POL_NUM_TXT', 'INSURED_CUSTOMER_NAME', 'ACTUAL_COMMISSION', 'PREMIUM_FOR_PAYOUTS'], "source": "ICICI"},
+    "MANIPAL SIGNA": {"columns": ['Policy Number', 'Proposer Name', 'Commission', 'Base Premium'], "source": "MANIPAL SIGNA"},
+    "NATIONAL NEHRU": {"columns": ['Policy No', 'Insured Name', 'Commission Amount', 'Premium Amount'], "source": "NATIONAL NEHRU"},
+    "RELIANCE": {"columns": ['PolicyNumber', 'InsuredName', 'FinalIRDAComm', 'PremiumAmount'], "source": "RELIANCE"},
+    "SBI": {"columns": ['Policy No', 'Insured Name', 'Total Commission', 'Gross Written Premium'], "source": "SBI"},
+    "TATA AIG": {"columns": ['policy_no', 'clientname', 'Commission ', 'premiumamount'], "source": "TATA AIG"},
+    "The New India Pdf": {"columns": ['Policy Number', 'Brokerage'], "source": "The New India Pdf"},
+    "United Pdf": {"columns": ['Policy/ Endt number', 'Insured Name', 'Commission Amount'], "source": "United Pdf"}
+}
+
+# Explicit dtypes for the configured columns, in the same order as STANDARD_COLUMNS
+# (reference, customer name, commission, premium). Policy references keep their
+# Excel types so parsed keys match the full-workbook read.
+BANK_COLUMN_DTYPES = [object, str, "float64", "float64"]
+
+
+def read_bank_excel(file_path, bank_name):
+    """
+    Read only the columns a bank's configuration uses from an Excel statement.
+
+    The header row is sniffed first and the configured columns are resolved
+    against it, so the rest of the workbook's columns are never materialized.
+    If required columns are missing, an empty DataFrame with the sniffed header
+    is returned so validate_columns can report them.
+    """
+    if bank_name not in BANK_CONFIG:
+        # process_bank_data reports unsupported banks
+        return pd.DataFrame()
+
+    columns = BANK_CONFIG[bank_name]["columns"]
+    dtypes = dict(zip(columns, BANK_COLUMN_DTYPES)) if len(columns) == len(BANK_COLUMN_DTYPES) else None
+    try:
+        return read_excel_columns(file_path, columns, dtypes)
+    except MissingColumnsError as e:
+        return pd.DataFrame(columns=e.header)
+
 
 def process_bank_data(df, bank_name):
-    """Process data based on the selected bank's specific logic."""
-    # Define standard column names
-    standard_columns = {
-        "reference": "Policy Reference",
-        "customer_name": "Customer Name",
-        "commission": "Total Commission",
-        "premium": "Premium Bank"  # New column for Premium Amount
-    }
-
-    # Bank-specific configurations
-    bank_config = {
-        "Bajaj": {"columns": ['POLICY_REFERENCE', 'CUSTOMER NAME ', 'TOTAL COMMISSION', 'NET PREMIUM'], "source": "Bajaj"},
-        "CARE": {"columns": ['Policy No', 'Customer Name', 'Total Amount', 'Premium'], "source": "CARE"},
-        "Cholamandalam": {"columns": ['POLICY_NO', 'INSURED_NAME', 'Total Payout', 'NET_PREMIUM'], "source": "Cholamandalam"},
-        "FUTURE": {"columns": ['POLICY_NO', 'COMBINE_CLIENT_NAME', 'Com+Payout', 'GWP'], "source": "FUTURE"},
-        "LIBERTY": {"columns": ['POLICY/ENDORSEMENT NO.', 'INSURED NAME', 'TOTAL COMMISSION', 'GWP'], "source": "LIBERTY"},
-        "GO-DIGIT": {"columns": ['policy number', 'policy holder', 'IRDA_AMT', 'net premium'], "source": "GO-DIGIT"},
-        "HDFC": {"columns": ['Certificate_Num', 'Customer_Name', 'TOTAL_COMM', 'GWP'], "source": "HDFC"},
-        "ICICI": {"columns": ['POL_NUM_TXT', 'INSURED_CUSTOMER_NAME', 'ACTUAL_COMMISSION', 'PREMIUM_FOR_PAYOUTS'], "source": "ICICI"},
-        "MANIPAL SIGNA": {"columns": ['Policy Number', 'Proposer Name', 'Commission', 'Base Premium'], "source": "MANIPAL SIGNA"},
-        "NATIONAL NEHRU": {"columns": ['Policy No', 'Insured Name', 'Commission Amount', 'Premium Amount'], "source": "NATIONAL NEHRU"},
-        "RELIANCE": {"columns": ['PolicyNumber', 'InsuredName', 'FinalIRDAComm', 'PremiumAmount'], "source": "RELIANCE"},
-        "SBI": {"columns": ['Policy No', 'Insured Name', 'Total Commission', 'Gross Written Premium'], "source": "SBI"},
-        "TATA AIG": {"columns": ['policy_no', 'clientname', 'Commission ', 'premiumamount'], "source": "TATA AIG"},
-        "The New India Pdf": {"columns": ['Policy Number', 'Brokerage'], "source": "The New India Pdf"},
-        "United Pdf": {"columns": ['Policy/ Endt number', 'Insured Name', 'Commission Amount'], "source": "United Pdf"}
-    }
+    """
+    Process data based on the selected bank's specific logic.
+
+    Raises ValueError if the bank is not supported or required columns are missing.
+    """
+    standard_columns = STANDARD_COLUMNS
+    bank_config = BANK_CONFIG
 
     # Validate if bank is supported
     if bank_name not in bank_config:
-        st.warning(f"Bank '{bank_name}' is not supported.")
-        return pd.DataFrame()
+        raise ValueError(f"Bank '{bank_name}' is not supported.")
 
     # Get the configuration for the selected bank
     config = bank_config[bank_name]
 
-    # Validate required columns
-    try:
-        validate_columns(df, config['columns'])
-    except ValueError as e:
-        st.error(str(e))
-        return pd.DataFrame()
+    # Validate required columns (raises ValueError listing the missing ones)
+    validate_columns(df, config['columns'])
 
     # Process the data
     return process_specific_bank(df, config, standard_columns)
@@ -75,9 +106,10 @@ def process_specific_bank(df, config, standard_columns):
             standard_columns["commission"]
         ]
 
-    # Convert all premium amounts to positive
+    # Amounts read as text (e.g. "1,23,456.70") are parsed; premiums are made positive
+    selected_columns[standard_columns["commission"]] = parse_amounts(selected_columns[standard_columns["commission"]])
     if "Premium Bank" in selected_columns.columns:
-        selected_columns["Premium Bank"] = selected_columns["Premium Bank"].abs()
+        selected_columns["Premium Bank"] = parse_amounts(selected_columns["Premium Bank"]).abs()
 
     # Add metadata and clean policy references
     selected_columns.loc[:, 'Source'] = config['source']
@@ -90,4 +122,5 @@ def process_specific_bank(df, config, standard_columns):
     # Keep only the first occurrence of each Parsed_POLICY_NUMBER_BANK
     selected_columns = selected_columns.drop_duplicates(subset=['Parsed_POLICY_NUMBER_BANK'], keep='first')
 
-    return selected_columns
+    # Store labels, amounts and policy numbers in compact dtypes
+    return compact_frame(selected_columns)
@@ -0,0 +1,196 @@
+import os
+import openpyxl
+import pandas as pd
+from pyxlsb import open_workbook as open_xlsb_workbook
+
+# Streaming, read-only reader engine per file extension
+EXCEL_ENGINES = {
+    ".xlsx": "openpyxl",
+    ".xlsm": "openpyxl",
+    ".xlsb": "pyxlsb",
+    ".xls": "xlrd",
+}
+
+# Rows per DataFrame yielded by iter_excel_chunks
+EXCEL_CHUNK_ROWS = 50_000
+
+
+class MissingColumnsError(ValueError):
+    """Raised when configured columns are not in a sheet's header row."""
+
+    def __init__(self, missing, header):
+        super().__init__(f"Missing required columns: {missing}")
+        self.missing = missing
+        self.header = header
+
+
+def excel_engine(file_path):
+    """Pick the pandas Excel engine from the file extension."""
+    return EXCEL_ENGINES.get(os.path.splitext(str(file_path))[1].lower())
+
+
+def sniff_header(file_path, engine=None):
+    """Read only the header row of the first sheet."""
+    engine = engine or excel_engine(file_path)
+    return pd.read_excel(file_path, nrows=0, engine=engine).columns.tolist()
+
+
+def _header_key(name):
+    return str(name).strip().casefold()
+
+
+def resolve_columns(header, columns):
+    """
+    Map configured column names to the names in a sheet's header row.
+
+    Exact matches win; otherwise names are matched ignoring surrounding
+    whitespace and case (exports often differ only in a trailing space).
+
+    Returns:
+    dict: configured name -> header name, in configured order.
+
+    Raises:
+    MissingColumnsError: If a configured column is not in the header.
+    """
+    by_key = {}
+    for name in header:
+        by_key.setdefault(_header_key(name), name)
+
+    resolved, missing = {}, []
+    for col in columns:
+        if col in header:
+            resolved[col] = col
+        elif _header_key(col) in by_key:
+            resolved[col] = by_key[_header_key(col)]
+        else:
+            missing.append(col)
+
+    if missing:
+        raise MissingColumnsError(missing, header)
+    return resolved
+
+
+def read_excel_columns(file_path, columns, dtypes=None):
+    """
+    Read only the given columns of an Excel file.
+
+    The header row is sniffed first, then only the resolved columns are read
+    with the engine matching the file extension (openpyxl read-only for
+    .xlsx, pyxlsb for .xlsb, xlrd for .xls).
+
+    Parameters:
+    file_path (str): Path to the Excel file.
+    columns (list): Column names to read, as configured.
+    dtypes (dict): Optional dtype per configured column name.
+
+    Returns:
+    pd.DataFrame: The configured columns, named and ordered as configured.
+    """
+    engine = excel_engine(file_path)
+    resolved = resolve_columns(sniff_header(file_path, engine), columns)
+    usecols = list(dict.fromkeys(resolved.values()))
+    dtype = {resolved[col]: dt for col, dt in (dtypes or {}).items() if col in resolved}
+
+    try:
+        df = pd.read_excel(file_path, engine=engine, usecols=usecols, dtype=dtype or None)
+    except (ValueError, TypeError) as e:
+        # Text in a numeric column (e.g. "1,234.00"): keep the inferred types
+        print(f"Explicit dtypes not applicable ({e}); reading with inferred types.")
+        df = pd.read_excel(file_path, engine=engine, usecols=usecols)
+
+    return pd.DataFrame({col: df[resolved[col]] for col in columns})
+
+
+def _convert_cell(value):
+    """Integral floats as ints, as pandas reads Excel cells."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _sheet_rows(file_path, engine):
+    """Yield the rows of the first sheet as lists of cell values, streaming them from the file."""
+    if engine == "pyxlsb":
+        with open_xlsb_workbook(file_path) as workbook:
+            with workbook.get_sheet(1) as sheet:
+                for row in sheet.rows():
+                    yield [cell.v for cell in row]
+        return
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # The stored sheet size can be wrong; read every row there is
+        sheet.reset_dimensions()
+        for row in sheet.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def _chunk_frame(rows, positions, columns, dtypes, start):
+    """Build a DataFrame of the configured columns from rows of cell values."""
+    data = {}
+    for col, position in zip(columns, positions):
+        values = [_convert_cell(row[position]) if position < len(row) else None for row in rows]
+        dtype = dtypes.get(col)
+        if dtype is str or dtype is object:
+            data[col] = pd.Series(values, dtype=object).astype(dtype)
+            continue
+        data[col] = pd.Series(values)
+        if dtype is not None:
+            try:
+                data[col] = data[col].astype(dtype)
+            except (ValueError, TypeError):
+                # Text in a numeric column: keep the inferred type, as read_excel_columns does
+                pass
+    return pd.DataFrame(data).set_axis(pd.RangeIndex(start, start + len(rows)))
+
+
+def iter_excel_chunks(file_path, columns, dtypes=None, chunk_rows=EXCEL_CHUNK_ROWS):
+    """
+    Read the given columns of an Excel file in chunks of rows.
+
+    .xlsx / .xlsm (openpyxl read-only) and .xlsb (pyxlsb) sheets are streamed
+    row by row, so memory is bounded by the chunk size, not the file size.
+    .xls files (xlrd loads the whole workbook, at most 65,536 rows) are read
+    at once and sliced. Blank rows are skipped, as read_excel does.
+
+    Parameters:
+    file_path (str): Path to the Excel file.
+    columns (list): Column names to read, as configured.
+    dtypes (dict): Optional dtype per configured column name; numeric columns
+        holding text keep the inferred type.
+    chunk_rows (int): Rows per chunk.
+
+    Yields:
+    pd.DataFrame: The configured columns of up to chunk_rows rows, named and
+        ordered as configured, indexed by row number in the sheet's data.
+
+    Raises:
+    MissingColumnsError: If a configured column is not in the header row.
+    """
+    engine = excel_engine(file_path)
+    if engine not in ("openpyxl", "pyxlsb"):
+        df = read_excel_columns(file_path, columns, dtypes)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    rows = _sheet_rows(file_path, engine)
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+    resolved = resolve_columns(header, columns)
+    positions = [header.index(resolved[col]) for col in columns]
+
+    chunk, start = [], 0
+    for row in rows:
+        if any(value is not None for value in row):
+            chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield _chunk_frame(chunk, positions, columns, dtypes or {}, start)
+            chunk, start = [], start + len(chunk)
+    if chunk:
+        yield _chunk_frame(chunk, positions, columns, dtypes or {}, start)
@@ -0,0 +1,457 @@
+import io
+import os
+import re
+import time
+import zipfile
+import threading
+from xml.sax.saxutils import escape
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Output formats offered for results, with file extension and MIME type
+EXPORT_FORMATS = {
+    "xlsx": {"extension": ".xlsx", "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "csv": {"extension": ".csv", "mime": "text/csv"},
+    "parquet": {"extension": ".parquet", "mime": "application/vnd.apache.parquet"},
+}
+DEFAULT_EXPORT_FORMAT = "xlsx"
+
+# Rows converted and written per step; bounds the memory used on top of the DataFrame
+EXPORT_CHUNK_ROWS = 10_000
+
+# Control characters not allowed in XML 1.0 (openpyxl rejects them as well)
+ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Day 0 of Excel's date serial numbers
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Rows of an Excel sheet, the header row included; longer tables continue on
+# further sheets, each with the header row again
+XLSX_MAX_ROWS = 1_048_576
+
+# Fixed parts of a workbook; style 1 is the date format used for datetime cells.
+# The parts listing the sheets are built when the workbook is closed (see _xlsx_sheet_parts).
+XLSX_PARTS = {
+    "_rels/.rels": XML_DECLARATION + (
+        f'<Relationships xmlns="{PACKAGE_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/styles.xml": XML_DECLARATION + (
+        f'<styleSheet xmlns="{MAIN_NS}">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+SHEET_HEADER = XML_DECLARATION + f'<worksheet xmlns="{MAIN_NS}"><sheetData>'
+SHEET_FOOTER = '</sheetData></worksheet>'
+
+
+def _xlsx_sheet_name(sheet_name, number):
+    """Name of the `number`th sheet (from 1): sheet_name, then "sheet_name (2)" etc., at most 31 characters."""
+    suffix = "" if number == 1 else f" ({number})"
+    return str(sheet_name)[:31 - len(suffix)] + suffix
+
+
+def _xlsx_sheet_parts(sheet_names):
+    """The workbook parts listing the sheets: {part name: content}."""
+    numbers = range(1, len(sheet_names) + 1)
+    names = [escape(name, {'"': "&quot;"}) for name in sheet_names]
+    sheet_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+    return {
+        "[Content_Types].xml": XML_DECLARATION + (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + "".join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="{sheet_type}"/>' for n in numbers)
+            + '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            '</Types>'
+        ),
+        "xl/workbook.xml": XML_DECLARATION + (
+            f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>'
+            + "".join(
+                f'<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>' for n, name in zip(numbers, names)
+            )
+            + '</sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": XML_DECLARATION + (
+            f'<Relationships xmlns="{PACKAGE_REL_NS}">'
+            + "".join(
+                f'<Relationship Id="rId{n}" Type="{REL_NS}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                for n in numbers
+            )
+            + f'<Relationship Id="rId{len(sheet_names) + 1}" Type="{REL_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ),
+    }
+
+
+def _row_chunks(df):
+    """Yield successive row slices of at most EXPORT_CHUNK_ROWS rows."""
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+
+def _xml_escape(text):
+    """Escape text for an XML text node, dropping characters XML can't hold."""
+    return (
+        text.str.replace(ILLEGAL_XML_CHARS.pattern, "", regex=True)
+        .str.replace("&", "&amp;", regex=False)
+        .str.replace("<", "&lt;", regex=False)
+        .str.replace(">", "&gt;", regex=False)
+    )
+
+
+def _xlsx_cells(col):
+    """Build the <c> elements of one column slice (missing values become empty cells)."""
+    missing = col.isna().to_numpy(copy=True)
+    if pd.api.types.is_bool_dtype(col):
+        cells = ('<c t="b"><v>' + col.fillna(False).astype(int).astype(str) + '</v></c>').to_numpy(dtype=object)
+    elif pd.api.types.is_datetime64_any_dtype(col):
+        if col.dt.tz is not None:
+            col = col.dt.tz_localize(None)
+        serial = (col - EXCEL_EPOCH) / pd.Timedelta(days=1)
+        cells = ('<c s="1"><v>' + serial.astype(str) + '</v></c>').to_numpy(dtype=object)
+    elif pd.api.types.is_numeric_dtype(col):
+        missing |= ~np.isfinite(col.to_numpy(dtype=float, na_value=np.nan))
+        cells = ('<c><v>' + col.astype(str) + '</v></c>').to_numpy(dtype=object)
+    else:
+        # Text columns; numbers inside object columns stay numbers, like to_excel writes them
+        text = col.astype(str)
+        numeric = col.map(
+            lambda v: isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool),
+            na_action="ignore",
+        ).fillna(False).to_numpy(dtype=bool)
+        cells = np.where(
+            numeric,
+            ('<c><v>' + text + '</v></c>').to_numpy(dtype=object),
+            ('<c t="inlineStr"><is><t xml:space="preserve">' + _xml_escape(text) + '</t></is></c>').to_numpy(dtype=object),
+        )
+        if numeric.any():
+            missing |= numeric & ~np.isfinite(pd.to_numeric(col.where(numeric), errors="coerce").to_numpy(dtype=float))
+    cells[missing] = "<c/>"
+    return cells
+
+
+def _parquet_frame(df):
+    """df with object columns mixing numbers and text (common in policy numbers) stored as text."""
+    mixed = [col for col in df.columns[df.dtypes == object] if df[col].dropna().map(type).nunique() > 1]
+    if mixed:
+        df = df.assign(**{col: df[col].astype(str).where(df[col].notna()) for col in mixed})
+    return df
+
+
+def _is_text_type(arrow_type):
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def _parquet_table(df, schema):
+    """
+    Convert a part to `schema`.
+
+    Values of text columns that don't convert as they are (e.g. numbers in a
+    part whose column was text in the first part) are stored as text.
+
+    Raises:
+    ValueError: If a column of another type doesn't convert (e.g. text in a numeric column).
+    """
+    try:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass
+    arrays = []
+    for field, col in zip(schema, df.columns):
+        values = df[col]
+        try:
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            if not _is_text_type(field.type):
+                raise ValueError(f"Column '{col}' doesn't fit its Parquet type {field.type}: {e}") from e
+            text = values.astype(object).where(values.notna(), None).map(str, na_action='ignore')
+            arrays.append(pa.array(text, type=pa.large_string(), from_pandas=True).cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class ExportWriter:
+    """
+    Write a table to a path or binary file object in parts, in one of EXPORT_FORMATS.
+
+    The first part written sets the columns (and, for Parquet, the schema,
+    with all-missing columns stored as text); later parts must have the same
+    columns. Each part is converted and written EXPORT_CHUNK_ROWS rows at a
+    time, so results can be written as they are produced without ever
+    holding all of them. Workbooks continue on another sheet (with the
+    header row again) when a sheet reaches Excel's XLSX_MAX_ROWS rows.
+
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, export_format, target, sheet_name="Sheet1", schema=None):
+        """
+        Parameters:
+        export_format (str): One of EXPORT_FORMATS.
+        target (str or file-like): Output path or binary buffer.
+        sheet_name (str): Sheet name (xlsx).
+        schema (pa.Schema): Parquet schema, instead of the one of the first part.
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format '{export_format}'.")
+        self.export_format = export_format
+        self.target = target
+        self.sheet_name = sheet_name
+        self.schema = schema
+        # Parts are normalized like the first one when the schema comes from it
+        self._normalize = schema is None
+        self.rows = 0
+        self.columns = None
+        self._file = None
+        self._archive = None
+        self._sheet = None
+        self._sheet_names = []
+        self._sheet_rows = 0
+        self._header = None
+        self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _open(self, df):
+        """Start the output with the columns of the first part."""
+        self.columns = list(df.columns)
+        own_file = isinstance(self.target, (str, os.PathLike))
+        self._file = open(self.target, "wb") if own_file else self.target
+        self._own_file = own_file
+
+        if self.export_format == "xlsx":
+            self._archive = zipfile.ZipFile(self._file, "w", zipfile.ZIP_DEFLATED)
+            for name, content in XLSX_PARTS.items():
+                self._archive.writestr(name, content)
+            header = _xlsx_cells(pd.Series([str(col) for col in df.columns], dtype=object))
+            self._header = ("<row>" + "".join(header) + "</row>").encode("utf-8")
+            self._next_sheet()
+        elif self.export_format == "csv":
+            self._file.write(df.iloc[:0].to_csv(index=False).encode("utf-8"))
+        else:
+            if self.schema is None:
+                schema = pa.Schema.from_pandas(_parquet_frame(df), preserve_index=False)
+                self.schema = pa.schema([
+                    field.with_type(pa.large_string()) if pa.types.is_null(field.type) else field for field in schema
+                ])
+            self._parquet = pq.ParquetWriter(self._file, self.schema)
+
+    def _next_sheet(self):
+        """Finish the current sheet, if any, and start the next one with the header row."""
+        self._close_sheet()
+        self._sheet_names.append(_xlsx_sheet_name(self.sheet_name, len(self._sheet_names) + 1))
+        self._sheet = self._archive.open(f"xl/worksheets/sheet{len(self._sheet_names)}.xml", "w", force_zip64=True)
+        self._sheet.write(SHEET_HEADER.encode("utf-8") + self._header)
+        self._sheet_rows = 1
+
+    def _close_sheet(self):
+        if self._sheet is not None:
+            self._sheet.write(SHEET_FOOTER.encode("utf-8"))
+            self._sheet.close()
+            self._sheet = None
+
+    def _write_xlsx(self, chunk):
+        """Append rows to the sheets, starting another sheet whenever one is full."""
+        start = 0
+        while start < len(chunk):
+            if self._sheet_rows >= XLSX_MAX_ROWS:
+                self._next_sheet()
+            part = chunk.iloc[start:start + XLSX_MAX_ROWS - self._sheet_rows]
+            rows = np.full(len(part), "<row>", dtype=object)
+            for position in range(part.shape[1]):
+                rows = rows + _xlsx_cells(part.iloc[:, position])
+            self._sheet.write(("</row>".join(rows) + "</row>").encode("utf-8"))
+            self._sheet_rows += len(part)
+            start += len(part)
+
+    def write(self, df):
+        """Append the rows of df."""
+        if self.columns is None:
+            self._open(df)
+        elif list(df.columns) != self.columns:
+            raise ValueError("The columns of a part differ from those of the first part written.")
+        for chunk in _row_chunks(df):
+            if self.export_format == "xlsx":
+                self._write_xlsx(chunk)
+            elif self.export_format == "csv":
+                self._file.write(chunk.to_csv(index=False, header=False).encode("utf-8"))
+            else:
+                self._parquet.write_table(_parquet_table(_parquet_frame(chunk) if self._normalize else chunk, self.schema))
+        self.rows += len(df)
+
+    def close(self):
+        """Finish the output (an empty table if nothing was written)."""
+        if self.columns is None:
+            self._open(pd.DataFrame())
+        if self._archive is not None:
+            self._close_sheet()
+            for name, content in _xlsx_sheet_parts(self._sheet_names).items():
+                self._archive.writestr(name, content)
+            self._archive.close()
+            self._archive = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        if self._file is not None:
+            if self._own_file:
+                self._file.close()
+            else:
+                self._file.flush()
+            self._file = None
+
+
+def write_xlsx(df, target, sheet_name="Sheet1"):
+    """
+    Write df as an .xlsx workbook, streaming the sheet XML.
+
+    Tables longer than a sheet (XLSX_MAX_ROWS rows with the header) continue
+    on further sheets named "sheet_name (2)" etc.
+
+    Cells are rendered column by column for one chunk of rows at a time and
+    written straight into the zip archive, so memory stays flat however many
+    rows are written (openpyxl builds every cell as a Python object, which is
+    what made to_excel slow and memory-hungry on large results).
+    """
+    with ExportWriter("xlsx", target, sheet_name=sheet_name) as writer:
+        writer.write(df)
+
+
+def write_csv(df, target):
+    """Write df as UTF-8 CSV, chunk by chunk."""
+    with ExportWriter("csv", target) as writer:
+        writer.write(df)
+
+
+def write_parquet(df, target):
+    """Write df as Parquet, one row group per chunk."""
+    df = _parquet_frame(df)
+    with ExportWriter("parquet", target, schema=pa.Schema.from_pandas(df, preserve_index=False)) as writer:
+        writer.write(df)
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def resident_memory():
+    """Resident memory of this process in bytes (Linux), or None where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class MemorySampler:
+    """
+    Track the peak resident memory of the process while a block runs.
+
+    Sampling in a background thread (every `interval` seconds) keeps the
+    overhead negligible, unlike tracemalloc, which slows allocation-heavy
+    writers down several times. `peak_bytes` is the growth over the memory
+    in use when the block started (None where resident memory can't be read).
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_bytes = None
+        self._stop = threading.Event()
+
+    def _sample(self, baseline):
+        peak = baseline
+        while True:
+            peak = max(peak, resident_memory() or baseline)
+            self.peak_bytes = peak - baseline
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self):
+        baseline = resident_memory()
+        if baseline is not None:
+            self._thread = threading.Thread(target=self._sample, args=(baseline,), daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if hasattr(self, "_thread"):
+            self._thread.join()
+        return False
+
+
+def export_frame(df, export_format, target):
+    """
+    Write df to a path or binary file object in the given format.
+
+    Parameters:
+    df (pd.DataFrame): Data to export.
+    export_format (str): One of EXPORT_FORMATS.
+    target (str or file-like): Output path or binary buffer.
+
+    Returns:
+    dict: format, rows, bytes written, seconds and peak_bytes (peak growth of
+        the process memory while writing; None where it can't be measured).
+    """
+    if export_format not in WRITERS:
+        raise ValueError(f"Unsupported export format '{export_format}'.")
+
+    started = time.perf_counter()
+    with MemorySampler() as memory:
+        WRITERS[export_format](df, target)
+    seconds = time.perf_counter() - started
+
+    size = os.path.getsize(target) if isinstance(target, (str, os.PathLike)) else target.tell()
+    return {"format": export_format, "rows": len(df), "bytes": size, "seconds": seconds, "peak_bytes": memory.peak_bytes}
+
+
+def export_bytes(df, export_format):
+    """
+    Export df into memory, e.g. for a download button.
+
+    Returns:
+    tuple: (file contents as bytes, stats dict from export_frame)
+    """
+    buffer = io.BytesIO()
+    stats = export_frame(df, export_format, buffer)
+    return buffer.getvalue(), stats
+
+
+def export_file_name(base_name, export_format):
+    """Return base_name with the extension of the export format."""
+    return f"{base_name}{EXPORT_FORMATS[export_format]['extension']}"
+
+
+def format_export_stats(stats):
+    """One-line description of an export: size, time and peak memory."""
+    text = (
+        f"{stats['format']}: {stats['rows']} rows, {stats['bytes'] / 1024 ** 2:.1f} MiB "
+        f"written in {stats['seconds']:.2f}s"
+    )
+    if stats['peak_bytes'] is not None:
+        text += f" (peak memory +{stats['peak_bytes'] / 1024 ** 2:.1f} MiB)"
+    return text
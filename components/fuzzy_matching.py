@@ -0,0 +1,160 @@
+import re
+import difflib
+import numpy as np
+import pandas as pd
+from components.value_cleaning import parse_amounts
+
+# Minimum name similarity (difflib ratio, 0-1) for a fuzzy endorsement match
+FUZZY_NAME_THRESHOLD = 0.85
+
+# Largest premium difference (in rupees) still treated as the same endorsement
+FUZZY_PREMIUM_TOLERANCE = 1.0
+
+# Name blocking: candidates must share at least MIN_SHARED_NGRAMS character n-grams
+NGRAM_SIZE = 3
+MIN_SHARED_NGRAMS = 2
+
+NON_LETTERS = re.compile(r"[^A-Z ]")
+SPACES = re.compile(r"\s+")
+
+
+def normalize_names(names):
+    """Upper-case names and keep only letters and single spaces."""
+    return (
+        names.astype("string")
+        .str.upper()
+        .str.replace(NON_LETTERS.pattern, " ", regex=True)
+        .str.replace(SPACES.pattern, " ", regex=True)
+        .str.strip()
+        .fillna("")
+    )
+
+
+def name_ngrams(name):
+    """Return the distinct character n-grams of a normalized name."""
+    compact = name.replace(" ", "")
+    if len(compact) <= NGRAM_SIZE:
+        return [compact] if compact else []
+    return list({compact[i:i + NGRAM_SIZE] for i in range(len(compact) - NGRAM_SIZE + 1)})
+
+
+def _blocking_keys(insurers, names, premiums, tolerance, neighbours):
+    """
+    Build the blocking index of one side: one row per (row, insurer, premium bucket, n-gram).
+
+    Premiums are bucketed by `tolerance`; `neighbours` are the bucket offsets each
+    row is indexed under, so a premium near a bucket edge still meets its match.
+    """
+    keys = pd.DataFrame({
+        'row': np.arange(len(names)),
+        'insurer': insurers.to_numpy(),
+        'bucket': np.floor(premiums.to_numpy(dtype=float) / tolerance),
+        'ngram': names.map(name_ngrams).to_numpy(),
+    })
+    keys = keys[~np.isnan(keys['bucket'])]
+    keys = keys.explode('ngram').dropna(subset=['ngram'])
+    if len(neighbours) > 1:
+        keys = pd.concat([keys.assign(bucket=keys['bucket'] + offset) for offset in neighbours], ignore_index=True)
+    return keys
+
+
+def match_endorsements(broker_insurers, broker_names, broker_premiums, bank_insurers, bank_names, bank_premiums,
+                       name_threshold=FUZZY_NAME_THRESHOLD, premium_tolerance=FUZZY_PREMIUM_TOLERANCE):
+    """
+    Fuzzy-match broker endorsements to bank records.
+
+    Candidates are only generated within blocks of the same insurer, premium
+    bucket (within `premium_tolerance`) and shared name n-grams, so the cost
+    grows with the block sizes instead of broker rows x bank rows. Candidates
+    are scored by name similarity and paired one-to-one, best first (highest
+    similarity, then smallest premium gap): each broker row and each bank row
+    is matched at most once.
+
+    Parameters:
+    broker_insurers, broker_names, broker_premiums (pd.Series): Broker endorsement rows.
+    bank_insurers, bank_names, bank_premiums (pd.Series): Bank rows.
+    name_threshold (float): Minimum name similarity (0-1).
+    premium_tolerance (float): Largest premium difference allowed (> 0; it is also the premium bucket width).
+
+    Returns:
+    tuple: (broker positions, bank positions, confidence) as numpy arrays, one
+        entry per matched broker row.
+
+    Raises:
+    ValueError: If premium_tolerance is not greater than 0.
+    """
+    if not premium_tolerance > 0:
+        raise ValueError(f"premium_tolerance must be greater than 0, got {premium_tolerance}.")
+    empty = (np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=float))
+    if len(broker_names) == 0 or len(bank_names) == 0:
+        return empty
+
+    broker_premiums = parse_amounts(broker_premiums)
+    bank_premiums = parse_amounts(bank_premiums)
+
+    # Only bank rows sharing an (insurer, premium bucket) block with a broker row can match
+    broker_blocks = pd.MultiIndex.from_arrays([
+        np.tile(broker_insurers.to_numpy(), 3),
+        np.concatenate([np.floor(broker_premiums.to_numpy(dtype=float) / premium_tolerance) + offset
+                        for offset in (-1, 0, 1)]),
+    ])
+    bank_blocks = pd.MultiIndex.from_arrays([
+        bank_insurers.to_numpy(), np.floor(bank_premiums.to_numpy(dtype=float) / premium_tolerance)
+    ])
+    candidate_bank_rows = np.flatnonzero(bank_blocks.isin(broker_blocks))
+    if len(candidate_bank_rows) == 0:
+        return empty
+
+    broker_names = normalize_names(broker_names)
+    bank_names = normalize_names(bank_names.take(candidate_bank_rows))
+    bank_premiums = bank_premiums.take(candidate_bank_rows)
+
+    left = _blocking_keys(broker_insurers, broker_names, broker_premiums, premium_tolerance, (-1, 0, 1))
+    right = _blocking_keys(bank_insurers.take(candidate_bank_rows), bank_names, bank_premiums, premium_tolerance, (0,))
+    pairs = left.merge(right, on=['insurer', 'bucket', 'ngram'], suffixes=('_broker', '_bank'))
+    if pairs.empty:
+        return empty
+
+    # Keep pairs sharing enough n-grams (all of them for very short names)
+    shared = pairs.groupby(['row_broker', 'row_bank'], sort=False).size().reset_index(name='shared')
+    ngram_counts = broker_names.map(lambda name: len(name_ngrams(name))).to_numpy()
+    shared = shared[shared['shared'] >= np.minimum(MIN_SHARED_NGRAMS, ngram_counts[shared['row_broker']])]
+
+    broker_rows = shared['row_broker'].to_numpy()
+    bank_rows = shared['row_bank'].to_numpy()
+    premium_gap = np.abs(broker_premiums.to_numpy(dtype=float)[broker_rows] - bank_premiums.to_numpy(dtype=float)[bank_rows])
+    within = premium_gap <= premium_tolerance
+    broker_rows, bank_rows, premium_gap = broker_rows[within], bank_rows[within], premium_gap[within]
+
+    # Score only the candidates left in the blocks
+    left_names = broker_names.to_numpy(dtype=object)
+    right_names = bank_names.to_numpy(dtype=object)
+    scores = np.array([
+        difflib.SequenceMatcher(None, left_names[i], right_names[j]).ratio()
+        for i, j in zip(broker_rows, bank_rows)
+    ], dtype=float)
+
+    candidates = pd.DataFrame({'broker': broker_rows, 'bank': bank_rows, 'score': scores, 'gap': premium_gap})
+    candidates = candidates[candidates['score'] >= name_threshold]
+    best = _one_to_one(candidates.sort_values(['score', 'gap', 'broker', 'bank'], ascending=[False, True, True, True]))
+    return best['broker'].to_numpy(), candidate_bank_rows[best['bank'].to_numpy()], best['score'].round(4).to_numpy()
+
+
+def _one_to_one(candidates):
+    """
+    Pair broker and bank rows greedily, best candidate first.
+
+    Each broker row and each bank row is used at most once: a candidate is
+    kept only if neither of its rows was taken by a better one.
+
+    Returns:
+    pd.DataFrame: The kept candidates, ordered by broker row.
+    """
+    broker_taken, bank_taken = set(), set()
+    keep = np.zeros(len(candidates), dtype=bool)
+    for i, (broker_row, bank_row) in enumerate(zip(candidates['broker'].to_numpy(), candidates['bank'].to_numpy())):
+        if broker_row not in broker_taken and bank_row not in bank_taken:
+            broker_taken.add(broker_row)
+            bank_taken.add(bank_row)
+            keep[i] = True
+    return candidates[keep].sort_values('broker')
@@ -0,0 +1,369 @@
+import os
+import json
+import time
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from components.session_store import WORKSPACES_DIR, SESSION_TTL_SECONDS, open_database
+from components.session_snapshot import encode_output, decode_output
+from components.stage_graph import restore_value
+from components.statements import parse_statement
+from components.comparison import compare_bank_and_broker
+from components.broker_stream import compare_broker_file
+from components.export import export_file_name
+from components.sharded_comparison import SHARD_WORKERS, compare_sharded
+from components.ledger import open_ledger, reconcile_incremental
+
+# Jobs of every session and server process share one table, so a job's status
+# survives page reloads
+JOB_DB_PATH = os.path.join(WORKSPACES_DIR, "jobs.sqlite3")
+
+# Parsing and comparison jobs run in this many worker processes
+JOB_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+# Worker processes a job may start itself (PDF pages, insurer shards): the CPUs
+# are split between the job workers, so running jobs together start about one
+# process per CPU rather than one per CPU each
+JOB_INNER_WORKERS = max(1, (os.cpu_count() or 1) // JOB_WORKERS)
+
+# Workers record progress at most this often (and always when a job finishes)
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    label TEXT NOT NULL,
+    params TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    server_pid INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    progress_done INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER,
+    progress_unit TEXT,
+    result TEXT,
+    result_rows INTEGER,
+    error TEXT,
+    collected INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session_id, created_at);
+"""
+
+JOB_COLUMNS = (
+    'job_id', 'session_id', 'kind', 'label', 'params', 'directory', 'server_pid', 'status', 'progress_done',
+    'progress_total', 'progress_unit', 'result', 'result_rows', 'error', 'collected', 'created_at', 'started_at',
+    'finished_at'
+)
+
+
+def open_job_store(path=JOB_DB_PATH):
+    """Return this thread's connection to the job table."""
+    return open_database(path, JOB_SCHEMA)
+
+
+def run_comparison(combined_df, broker_df, options, progress=None, workers=SHARD_WORKERS):
+    """
+    Reconcile bank and broker data.
+
+    Parameters:
+    options (dict): Options of compare_bank_and_broker, plus use_ledger and sharded.
+    workers (int): Worker processes of sharded runs.
+
+    Returns:
+    tuple: (results, ledger summary or None, per-shard timings of compare_sharded or None)
+    """
+    options = dict(options)
+    use_ledger = options.pop('use_ledger', False)
+    sharded = options.pop('sharded', False)
+    timings = [] if sharded else None
+    if sharded:
+        options.update(workers=workers, timings=timings)
+    if use_ledger:
+        conn = open_ledger()
+        try:
+            merged_df, summary = reconcile_incremental(
+                conn, combined_df, broker_df, sharded=sharded, progress=progress, **options
+            )
+        finally:
+            conn.close()
+        return merged_df, summary, timings
+    compare = compare_sharded if sharded else compare_bank_and_broker
+    return compare(combined_df, broker_df, progress=progress, **options), None, timings
+
+
+def stream_comparison(combined_df, broker_path, options, directory):
+    """
+    Reconcile a broker file streamed in chunks (see compare_broker_file), writing the results into `directory`.
+
+    Parameters:
+    options (dict): export_format and options of compare_bank_and_broker.
+
+    Returns:
+    tuple: (compare_broker_file summary, without the aggregates; the per-insurer aggregates of the results;
+        results file path)
+    """
+    options = dict(options)
+    export_format = options.pop('export_format')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, export_file_name("comparison_results", export_format))
+    summary = compare_broker_file(combined_df, broker_path, export_format, path, **options)
+    aggregates = summary.pop('aggregates')
+    return summary, aggregates, path
+
+
+def parse_job(params, directory, progress):
+    """Parse a statement; returns (DataFrame, loaded from the parse cache)."""
+    upload = params['upload']
+    return parse_statement(
+        upload['path'], upload['file_type'], upload['bank'], parallel=JOB_INNER_WORKERS > 1,
+        workers=JOB_INNER_WORKERS, progress=progress
+    )
+
+
+def compare_job(params, directory, progress):
+    """Compare the combined statements with the broker data written next to the job."""
+    combined_df, broker_df = restore_value(decode_output(params['inputs'], directory))
+    return run_comparison(combined_df, broker_df, params['options'], progress=progress, workers=JOB_INNER_WORKERS)
+
+
+def stream_compare_job(params, directory, progress):
+    """Compare the combined statements written next to the job with a broker file streamed from the workspace."""
+    combined_df = restore_value(decode_output(params['inputs'], directory))
+    return stream_comparison(combined_df, params['broker_path'], params['options'], directory)
+
+
+# kind -> function(params, job directory, progress callback) returning a stage output
+JOB_KINDS = {
+    'parse': parse_job,
+    'compare': compare_job,
+    'stream_compare': stream_compare_job,
+}
+
+
+def create_job_pool(workers=JOB_WORKERS):
+    """
+    Start the worker processes jobs run in.
+
+    Workers are spawned rather than forked, so they don't inherit the threads
+    (and locks) of the web server.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def job_directory(workspace, job_id):
+    """Return (and create) the directory a job reads its inputs from and writes its result to."""
+    path = os.path.join(workspace, "jobs", job_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def submit_job(pool, session_id, kind, label, params, workspace, job_id=None, db_path=JOB_DB_PATH):
+    """
+    Queue a job and hand it to the worker pool.
+
+    Parameters:
+    pool (ProcessPoolExecutor): Pool from create_job_pool.
+    session_id (str): The session the job belongs to.
+    kind (str): A JOB_KINDS key.
+    label (str): Shown in the job list (e.g. the file name).
+    params (dict): JSON-serializable job parameters.
+    workspace (str): The session's workspace; the job's files go to its jobs/<job_id> directory.
+    job_id (str): Id from new_job_id, when inputs were written to the job directory beforehand.
+
+    Returns:
+    str: The job id.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind '{kind}'.")
+    job_id = job_id or new_job_id()
+    directory = job_directory(workspace, job_id)
+    conn = open_job_store(db_path)
+    with conn:
+        # Replacing keeps resubmitting a job id (e.g. after the pool broke) possible
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, session_id, kind, label, params, directory, server_pid, status, "
+            "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+            (job_id, session_id, kind, label, json.dumps(params, default=str), directory, os.getpid(), time.time())
+        )
+    future = pool.submit(run_job, job_id, db_path)
+    future.add_done_callback(lambda future: _fail_crashed_job(future, job_id, db_path))
+    return job_id
+
+
+def _fail_crashed_job(future, job_id, db_path):
+    """Mark a job failed if its worker died before recording an outcome."""
+    error = future.exception()
+    if error is not None:
+        _finish_job(open_job_store(db_path), job_id, error=f"Worker stopped: {error!r}")
+
+
+def _finish_job(conn, job_id, result=None, error=None, rows=None):
+    """Record a job's outcome (unless it was already recorded)."""
+    with conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, result_rows = ?, error = ?, finished_at = ?, "
+            "progress_done = COALESCE(progress_total, progress_done) "
+            "WHERE job_id = ? AND status IN ('queued', 'running')",
+            ('failed' if error is not None else 'done', result, rows, error, time.time(), job_id)
+        )
+
+
+def _result_rows(value):
+    """Rows of a stage output's (first) DataFrame, or None."""
+    frame = value[0] if isinstance(value, (list, tuple)) and value else value
+    return len(frame) if isinstance(frame, pd.DataFrame) else None
+
+
+def run_job(job_id, db_path=JOB_DB_PATH):
+    """Run a queued job in a worker process, recording its progress and outcome in the job table."""
+    conn = open_job_store(db_path)
+    row = conn.execute("SELECT kind, params, directory FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return
+    kind, params, directory = row
+    with conn:
+        conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?", (time.time(), job_id))
+
+    last_update = [0.0]
+
+    def progress(done, total, unit):
+        now = time.time()
+        if done < total and now - last_update[0] < PROGRESS_INTERVAL_SECONDS:
+            return
+        last_update[0] = now
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET progress_done = ?, progress_total = ?, progress_unit = ? WHERE job_id = ?",
+                (int(done), int(total), unit, job_id)
+            )
+
+    try:
+        value = JOB_KINDS[kind](json.loads(params), directory, progress)
+        result = json.dumps(encode_output(value, directory, "result"), default=str)
+    except Exception as e:
+        print(f"Job {job_id} ({kind}) failed: {e}")
+        _finish_job(conn, job_id, error=str(e))
+    else:
+        _finish_job(conn, job_id, result=result, rows=_result_rows(value))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def list_jobs(session_id, db_path=JOB_DB_PATH):
+    """
+    Return a session's jobs, oldest first.
+
+    Jobs left unfinished by a server process that is gone (e.g. restarted)
+    are marked failed first.
+
+    Returns:
+    list: Job dicts (the JOB_COLUMNS; params decoded).
+    """
+    conn = open_job_store(db_path)
+    rows = conn.execute(
+        f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE session_id = ? ORDER BY created_at", (session_id,)
+    ).fetchall()
+    jobs = []
+    for row in rows:
+        job = dict(zip(JOB_COLUMNS, row))
+        if job['status'] in ('queued', 'running') and not _process_alive(job['server_pid']):
+            _finish_job(conn, job['job_id'], error="Interrupted: the server was restarted.")
+            job.update(status='failed', error="Interrupted: the server was restarted.")
+        job['params'] = json.loads(job['params'])
+        jobs.append(job)
+    return jobs
+
+
+def job_result(job):
+    """Return a finished job's stage output, with its DataFrames as (not yet loaded) SpilledFrames."""
+    return decode_output(json.loads(job['result']), job['directory'])
+
+
+def mark_collected(job_id, db_path=JOB_DB_PATH):
+    """Record that a job's result was taken into its session."""
+    conn = open_job_store(db_path)
+    with conn:
+        conn.execute("UPDATE jobs SET collected = 1 WHERE job_id = ?", (job_id,))
+
+
+def delete_session_jobs(session_id, db_path=JOB_DB_PATH):
+    """Forget a session's jobs (their files go with the session's workspace)."""
+    conn = open_job_store(db_path)
+    with conn:
+        conn.execute("DELETE FROM jobs WHERE session_id = ?", (session_id,))
+
+
+def delete_expired_jobs(ttl=SESSION_TTL_SECONDS, db_path=JOB_DB_PATH):
+    """Forget jobs older than a session lives."""
+    conn = open_job_store(db_path)
+    with conn:
+        conn.execute("DELETE FROM jobs WHERE created_at <= ?", (time.time() - ttl,))
+
+
+def format_job_progress(job):
+    """Describe a job's status for the job list, e.g. 'running: 12 / 40 pages'."""
+    if job['status'] == 'failed':
+        return f"failed: {job['error']}"
+    if job['status'] == 'done':
+        seconds = (job['finished_at'] or 0) - (job['started_at'] or job['created_at'])
+        return f"done in {seconds:.1f}s"
+    if job['status'] == 'running' and job['progress_total']:
+        return f"running: {job['progress_done']} / {job['progress_total']} {job['progress_unit']}"
+    return job['status']
+
+
+def job_seconds(job):
+    """Seconds a job has been running (or ran), None while queued."""
+    if job['started_at'] is None:
+        return None
+    return (job['finished_at'] or time.time()) - job['started_at']
+
+
+def job_table(jobs):
+    """
+    Summarize jobs in one table: one row per job with its file, bank, status,
+    progress (0-1), rows, seconds and error.
+    """
+    rows = []
+    for job in jobs:
+        upload = job['params'].get('upload', {})
+        seconds = job_seconds(job)
+        rows.append({
+            'Job': upload.get('name', job['label']),
+            'Bank': upload.get('bank', ''),
+            'Status': job['status'],
+            'Progress': job_fraction(job),
+            'Detail': format_job_progress(job) if job['status'] != 'failed' else '',
+            'Rows': job['result_rows'],
+            'Seconds': None if seconds is None else round(seconds, 2),
+            'Error': job['error'] or '',
+        })
+    return pd.DataFrame(rows, columns=['Job', 'Bank', 'Status', 'Progress', 'Detail', 'Rows', 'Seconds', 'Error'])
+
+
+def job_fraction(job):
+    """Return a job's progress between 0 and 1."""
+    if job['status'] in ('done', 'failed'):
+        return 1.0
+    if not job['progress_total']:
+        return 0.0
+    return min(1.0, job['progress_done'] / job['progress_total'])
@@ -0,0 +1,236 @@
+import os
+import uuid
+import sqlite3
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from components.comparison import compare_bank_and_broker
+from components.sharded_comparison import compare_sharded
+
+# Persistent record of reconciled broker rows (kept across runs, unlike ./cache)
+LEDGER_PATH = "./ledger/reconciliation.sqlite3"
+
+# Hash columns added to the inputs so each output row can be traced back to them
+BROKER_HASH = 'LEDGER_BROKER_HASH'
+BANK_HASH = 'LEDGER_BANK_HASH'
+POLICY_KEY = 'LEDGER_POLICY_KEY'
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    broker_hash INTEGER PRIMARY KEY,
+    policy_key TEXT,
+    bank_policy TEXT,
+    bank_hash INTEGER,
+    insurer TEXT,
+    found TEXT NOT NULL,
+    commission_broker REAL,
+    commission_bank REAL,
+    difference REAL,
+    run_id TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_policy_key ON ledger (policy_key);
+CREATE INDEX IF NOT EXISTS ledger_found ON ledger (found, broker_hash);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    broker_rows INTEGER,
+    settled_rows INTEGER,
+    processed_rows INTEGER,
+    new_rows INTEGER,
+    changed_rows INTEGER,
+    unchanged_rows INTEGER
+);
+"""
+
+
+def open_ledger(path=LEDGER_PATH):
+    """Open (and create if needed) the reconciliation ledger."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(LEDGER_SCHEMA)
+    return conn
+
+
+def row_hashes(df):
+    """
+    Hash every row of a DataFrame (column order and index are ignored).
+
+    Returns:
+    np.ndarray: One signed 64-bit hash per row, as stored in SQLite.
+    """
+    columns = sorted(col for col in df.columns if col not in (BROKER_HASH, BANK_HASH, POLICY_KEY))
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashes.view(np.int64)
+
+
+def _normalized(df):
+    """Return df with stripped, upper-cased column names (as compare_bank_and_broker uses)."""
+    return df.rename(columns=lambda col: str(col).strip().upper())
+
+
+def _lookup(conn, query, hashes):
+    """Run `query` against the ledger joined with a temporary table of broker hashes."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS run_hashes (broker_hash INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM run_hashes")
+    conn.executemany(
+        "INSERT OR IGNORE INTO run_hashes (broker_hash) VALUES (?)", ((int(h),) for h in np.unique(hashes))
+    )
+    return pd.read_sql_query(query, conn)
+
+
+def split_settled(conn, combined_df, broker_df):
+    """
+    Separate broker rows already settled in the ledger from those to reconcile.
+
+    A broker row is settled when the identical row was matched in an earlier
+    run and the bank record it matched hasn't changed since (or isn't in the
+    current statements at all).
+
+    Returns:
+    tuple: (combined_df, broker_df) with hash columns added, a boolean numpy
+        array marking the settled broker rows and one marking the bank rows
+        those settled matches hold.
+    """
+    # Nullable, so the hash survives unmatched (missing) bank columns in the output
+    combined_df = combined_df.assign(**{BANK_HASH: pd.array(row_hashes(combined_df), dtype='Int64')})
+    # The broker policy key under a name the comparison never suffixes
+    broker_df = broker_df.assign(**{
+        BROKER_HASH: row_hashes(broker_df),
+        POLICY_KEY: _normalized(broker_df)['PARSED_POLICY_REFERENCE'].astype(str),
+    })
+
+    settled = _lookup(conn, """
+        SELECT l.broker_hash, l.bank_policy, l.bank_hash
+        FROM run_hashes r JOIN ledger l ON l.broker_hash = r.broker_hash
+        WHERE l.found = 'Matched'
+    """, broker_df[BROKER_HASH].to_numpy())
+
+    # A settled match is reopened when its bank policy now comes with different data
+    # (the bank hash covers the policy number, so an unchanged hash means an unchanged record)
+    bank = _normalized(combined_df)
+    current_policies = pd.Index(bank['PARSED_POLICY_NUMBER_BANK'].astype(str).to_numpy(dtype=object), dtype=object)
+    present = pd.Index(settled['bank_policy'].to_numpy(dtype=object), dtype=object).isin(current_policies)
+    unchanged = settled['bank_hash'].isin(bank[BANK_HASH].to_numpy(dtype=np.int64)).to_numpy()
+    kept = settled[~present | unchanged]
+
+    is_settled = broker_df[BROKER_HASH].isin(kept['broker_hash']).to_numpy()
+    holds_settled = bank[BANK_HASH].isin(kept['bank_hash'].dropna().astype(np.int64)).to_numpy(dtype=bool)
+    return combined_df, broker_df, is_settled, holds_settled
+
+
+def ledger_delta(conn, merged_df):
+    """
+    Compare reconciled rows with their last ledger outcome.
+
+    Adds LEDGER STATUS (New / Changed / Unchanged), PREVIOUS FOUND and
+    PREVIOUS DIFFERENCE. A row is looked up by its exact broker row first and
+    by its policy key otherwise (the broker row was edited since).
+    """
+    previous = _lookup(conn, """
+        SELECT l.broker_hash, l.policy_key, l.found, l.difference, l.updated_at
+        FROM run_hashes r JOIN ledger l ON l.broker_hash = r.broker_hash
+    """, merged_df[BROKER_HASH].to_numpy())
+
+    by_hash = previous.set_index('broker_hash')
+    found = merged_df[BROKER_HASH].map(by_hash['found'])
+    difference = merged_df[BROKER_HASH].map(by_hash['difference'])
+
+    # Edited broker rows: fall back to the latest outcome of the same policy key
+    missing = found.isna()
+    if missing.any():
+        keys = merged_df.loc[missing, POLICY_KEY].unique().tolist()
+        by_key = []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            by_key.append(pd.read_sql_query(
+                f"SELECT policy_key, found, difference, updated_at FROM ledger "
+                f"WHERE policy_key IN ({','.join('?' * len(chunk))})",
+                conn, params=chunk
+            ))
+        by_key = pd.concat(by_key, ignore_index=True).sort_values('updated_at').drop_duplicates('policy_key', keep='last')
+        by_key = by_key.set_index('policy_key')
+        policy_keys = merged_df.loc[missing, POLICY_KEY]
+        found[missing] = policy_keys.map(by_key['found'])
+        difference[missing] = policy_keys.map(by_key['difference'])
+
+    same = (found == merged_df['FOUND'].astype(str)) & np.isclose(
+        difference.astype(float), merged_df['DIFFERENCE'].astype(float)
+    )
+    merged_df['LEDGER STATUS'] = np.where(found.isna(), 'New', np.where(same & ~missing, 'Unchanged', 'Changed'))
+    merged_df['PREVIOUS FOUND'] = found
+    merged_df['PREVIOUS DIFFERENCE'] = difference
+    return merged_df
+
+
+def record_results(conn, merged_df, run_id):
+    """Store the outcome of every reconciled row in the ledger."""
+    now = datetime.now().isoformat(timespec='seconds')
+    bank_hash = merged_df[BANK_HASH].astype('Int64')
+    rows = zip(
+        merged_df[BROKER_HASH].astype('int64').tolist(),
+        merged_df[POLICY_KEY].tolist(),
+        merged_df['PARSED_POLICY_NUMBER_BANK'].astype(str).where(merged_df['PARSED_POLICY_NUMBER_BANK'].notna()).tolist(),
+        [None if pd.isna(h) else int(h) for h in bank_hash],
+        merged_df['BANK NAME'].tolist(),
+        merged_df['FOUND'].astype(str).tolist(),
+        pd.to_numeric(merged_df['TOTAL COMMISSION BROKER'], errors='coerce').tolist(),
+        pd.to_numeric(merged_df['TOTAL COMMISSION'], errors='coerce').tolist(),
+        merged_df['DIFFERENCE'].astype(float).tolist(),
+    )
+    with conn:
+        conn.executemany(
+            """INSERT OR REPLACE INTO ledger (broker_hash, policy_key, bank_policy, bank_hash, insurer, found,
+                   commission_broker, commission_bank, difference, run_id, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            ((*row, run_id, now) for row in rows)
+        )
+
+
+def reconcile_incremental(conn, combined_df, broker_df, sharded=False, **compare_kwargs):
+    """
+    Reconcile only the broker rows not already settled in the ledger.
+
+    Settled rows are skipped; the other rows go through compare_bank_and_broker
+    (or compare_sharded if `sharded`, with `compare_kwargs`), are compared with their previous ledger outcome and
+    recorded. The bank rows of settled matches stay out of the match cascade
+    and fuzzy endorsement matching, as in a full run, where their broker rows
+    would have matched them first.
+
+    Returns:
+    tuple: (DataFrame of reconciled rows with the ledger delta columns, summary dict)
+    """
+    run_id = uuid.uuid4().hex
+    started_at = datetime.now().isoformat(timespec='seconds')
+    combined_df, broker_df, is_settled, holds_settled = split_settled(conn, combined_df, broker_df)
+    pending_df = broker_df[~is_settled]
+
+    summary = {'run_id': run_id, 'broker_rows': len(broker_df), 'settled_rows': int(is_settled.sum())}
+    if pending_df.empty:
+        merged_df = pd.DataFrame()
+        summary.update(processed_rows=0, new_rows=0, changed_rows=0, unchanged_rows=0)
+    else:
+        compare = compare_sharded if sharded else compare_bank_and_broker
+        merged_df = compare(combined_df, pending_df, reserved_bank_rows=holds_settled, **compare_kwargs)
+        merged_df = ledger_delta(conn, merged_df)
+        record_results(conn, merged_df, run_id)
+        status = merged_df['LEDGER STATUS'].value_counts()
+        summary.update(
+            processed_rows=len(merged_df),
+            new_rows=int(status.get('New', 0)),
+            changed_rows=int(status.get('Changed', 0)),
+            unchanged_rows=int(status.get('Unchanged', 0)),
+        )
+        merged_df = merged_df.drop(columns=[BROKER_HASH, BANK_HASH, POLICY_KEY])
+
+    with conn:
+        conn.execute(
+            """INSERT INTO runs (run_id, started_at, broker_rows, settled_rows, processed_rows,
+                   new_rows, changed_rows, unchanged_rows) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (run_id, started_at, summary['broker_rows'], summary['settled_rows'], summary['processed_rows'],
+             summary['new_rows'], summary['changed_rows'], summary['unchanged_rows'])
+        )
+    return merged_df, summary
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+from components.policy_normalization import normalize_policy_numbers, NINE_DIGIT, NON_ALPHANUMERIC
+from components.fuzzy_matching import normalize_names
+from components.value_cleaning import normalize_text, parse_amounts
+from components.policy_index import PolicyKeyIndex
+
+# Stages of the regular policy cascade, in the order they run. The exact stage is
+# compare_bank_and_broker's policy number join; every later stage only sees the
+# broker rows the stages before it left unmatched and the bank rows not matched yet.
+EXACT_STAGE = "Policy number"
+NINE_DIGIT_STAGE = "9-digit policy number"
+AFFIX_STAGE = "Policy prefix / suffix"
+NAME_PREMIUM_STAGE = "Name and premium"
+CASCADE_STAGES = [EXACT_STAGE, NINE_DIGIT_STAGE, AFFIX_STAGE, NAME_PREMIUM_STAGE]
+
+# Shortest policy number prefix / suffix that matches on its own
+MIN_AFFIX_LENGTH = 6
+
+# Fewest significant digits (leading zeros don't count) a policy key needs for
+# a 9-digit key; shorter numbers zero-padded to 9 digits match far too easily
+MIN_NINE_DIGIT_DIGITS = 6
+
+# Confidence of the fallback stages' matches, kept below the exact stage's 1
+# so they can't be mistaken for exact matches (prefix / suffix matches scale
+# it by the shared share of the longer key)
+STAGE_CONFIDENCE = {NINE_DIGIT_STAGE: 0.9, AFFIX_STAGE: 0.9, NAME_PREMIUM_STAGE: 0.8}
+
+
+def _policy_keys(policies):
+    """Policy numbers as upper-case letters and digits only; NaN if nothing is left."""
+    keys = normalize_text(policies).str.replace(NON_ALPHANUMERIC.pattern, "", regex=True)
+    return keys.mask(keys == "")
+
+
+def _nine_digit_keys(keys):
+    """The 9-digit numeric key (see NINE_DIGIT) of policy keys; NaN for keys with too few significant digits."""
+    significant = keys.str.replace(r"\D", "", regex=True).str.lstrip("0").str.len()
+    has_digits = (significant >= MIN_NINE_DIGIT_DIGITS).fillna(False).astype(bool)
+    return normalize_policy_numbers(keys, NINE_DIGIT).where(has_digits)
+
+
+def _name_keys(names):
+    """Customer names as normalize_names returns them; NaN for blank names."""
+    names = normalize_names(names)
+    return names.mask(names == "")
+
+
+def match_keys(policies, insurers, names, premiums):
+    """
+    Build the keys the cascade stages match on, once per side.
+
+    Parameters:
+    policies, insurers, names, premiums (pd.Series): Policy numbers, insurer
+        names (as the broker file writes them), customer names and premiums.
+
+    Returns:
+    pd.DataFrame: One row per input row with the insurer, policy, nine_digit,
+        name and premium keys (NaN where a key can't be built).
+    """
+    keys = pd.DataFrame({
+        'insurer': insurers.to_numpy(),
+        'policy': _policy_keys(policies).to_numpy(),
+        'name': _name_keys(names).to_numpy(),
+        # Premiums are compared in paise, so float noise doesn't break equality
+        'premium': parse_amounts(premiums).abs().round(2).to_numpy(),
+    })
+    keys['nine_digit'] = _nine_digit_keys(keys['policy']).to_numpy()
+    return keys
+
+
+def _unique_match(broker, bank, columns):
+    """
+    Hash-match rows on equal `columns`.
+
+    Returns:
+    np.ndarray: For each broker row, the position of the only bank row with
+        the same values (-1 if there is none, several bank rows have them, or
+        a value is missing).
+    """
+    found = np.full(len(broker), -1, dtype=np.int64)
+    bank_rows = np.flatnonzero(bank[columns].notna().all(axis=1).to_numpy())
+    broker_rows = np.flatnonzero(broker[columns].notna().all(axis=1).to_numpy())
+    if len(bank_rows) == 0 or len(broker_rows) == 0:
+        return found
+
+    index = pd.MultiIndex.from_frame(bank[columns].iloc[bank_rows])
+    # Keys held by several bank rows are ambiguous, so they don't match at all
+    unique = ~index.duplicated(keep=False)
+    if not unique.any():
+        return found
+    positions = index[unique].get_indexer(pd.MultiIndex.from_frame(broker[columns].iloc[broker_rows]))
+    found[broker_rows] = np.where(positions >= 0, bank_rows[unique][positions], -1)
+    return found
+
+
+def _key_stage(stage, columns):
+    """Build a stage matching on equal `columns`, with the stage's STAGE_CONFIDENCE."""
+    def _match(broker, bank, min_affix_length):
+        found = _unique_match(broker, bank, columns)
+        return found, np.where(found >= 0, STAGE_CONFIDENCE[stage], np.nan)
+    return _match
+
+
+def _affix_stage(broker, bank, min_affix_length):
+    """
+    Match policy keys truncated or extended at one end.
+
+    Each broker row takes the bank key of its insurer sharing the longest
+    prefix or suffix with it (see PolicyKeyIndex), if that key is the only one,
+    held by a single bank row, and the shared part is the whole shorter key
+    (the index keeps only the first row of a key). Keys that merely share a
+    long prefix, like consecutive policy numbers, don't match. The confidence
+    is the stage's STAGE_CONFIDENCE times the shared length over the longer key.
+    """
+    found, shared = PolicyKeyIndex(bank['policy'], bank['insurer']).longest_affix(
+        broker['policy'], broker['insurer'], min_affix_length
+    )
+    broker_lengths = broker['policy'].str.len().to_numpy(dtype=float)
+    bank_lengths = bank['policy'].str.len().to_numpy(dtype=float)[np.maximum(found, 0)]
+    found[shared < np.minimum(broker_lengths, bank_lengths)] = -1
+    # Keys held by several bank rows are ambiguous, as in _unique_match
+    held_by_several = pd.MultiIndex.from_arrays([bank['insurer'], bank['policy']]).duplicated(keep=False)
+    found[(found >= 0) & held_by_several[np.maximum(found, 0)]] = -1
+    share = shared / np.maximum(broker_lengths, bank_lengths)
+    return found, np.where(found >= 0, (STAGE_CONFIDENCE[AFFIX_STAGE] * share).round(4), np.nan)
+
+
+# Stage -> function(broker keys, bank keys, min affix length) returning
+# (bank position or -1, confidence) per broker row
+STAGE_MATCHERS = {
+    NINE_DIGIT_STAGE: _key_stage(NINE_DIGIT_STAGE, ['insurer', 'nine_digit']),
+    AFFIX_STAGE: _affix_stage,
+    NAME_PREMIUM_STAGE: _key_stage(NAME_PREMIUM_STAGE, ['insurer', 'name', 'premium']),
+}
+
+
+def cascade_match(broker_keys, bank_keys, available=None, stages=CASCADE_STAGES[1:],
+                  min_affix_length=MIN_AFFIX_LENGTH):
+    """
+    Match broker policies through the fallback stages of the cascade.
+
+    Each stage builds one index over the bank rows still unmatched (hashed,
+    or sorted for prefixes / suffixes) and probes it with the broker rows
+    still unmatched, so running every stage costs about as much as a few
+    joins. Matches stay within an insurer, and a key shared by several bank
+    rows matches none of them. A bank row is matched at most once: when a
+    stage gives it to several broker rows, only the first keeps it (the
+    others go on to the next stage), and it isn't offered to later stages.
+
+    Parameters:
+    broker_keys (pd.DataFrame): match_keys of the broker rows to match.
+    bank_keys (pd.DataFrame): match_keys of the bank rows.
+    available (np.ndarray): Boolean mask of the bank rows that may still be
+        matched (default: all).
+    stages (list): The CASCADE_STAGES to run (after the exact one), in order.
+    min_affix_length (int): Shortest shared prefix / suffix for AFFIX_STAGE.
+
+    Returns:
+    tuple: (bank positions with -1 where nothing matched, stage numbers (index
+        into CASCADE_STAGES, -1 where nothing matched), confidence) numpy
+        arrays, one entry per broker row.
+    """
+    positions = np.full(len(broker_keys), -1, dtype=np.int64)
+    stage_numbers = np.full(len(broker_keys), -1, dtype=np.int64)
+    confidence = np.full(len(broker_keys), np.nan)
+    remaining = np.ones(len(bank_keys), dtype=bool) if available is None else available.copy()
+    pending = np.arange(len(broker_keys))
+
+    for stage in stages:
+        bank_rows = np.flatnonzero(remaining)
+        if len(pending) == 0 or len(bank_rows) == 0:
+            break
+        found, stage_confidence = STAGE_MATCHERS[stage](
+            broker_keys.iloc[pending].reset_index(drop=True),
+            bank_keys.iloc[bank_rows].reset_index(drop=True),
+            min_affix_length
+        )
+        # Only the first broker row a stage gives a bank row keeps it
+        first = np.zeros(len(found), dtype=bool)
+        first[np.unique(found, return_index=True)[1]] = True
+        matched = (found >= 0) & first
+        rows = pending[matched]
+        positions[rows] = bank_rows[found[matched]]
+        stage_numbers[rows] = CASCADE_STAGES.index(stage)
+        confidence[rows] = stage_confidence[matched]
+        remaining[positions[rows]] = False
+        pending = pending[~matched]
+        print(f"Match cascade: {stage} matched {len(rows)} rows, {len(pending)} left")
+
+    return positions, stage_numbers, confidence
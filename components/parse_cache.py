@@ -0,0 +1,168 @@
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow as pa
+from components.compaction import write_frame_file, map_frame_file, frame_file_exact
+
+# Content-addressed cache of parsed statements: one Parquet file per key, or
+# for statements Parquet can't hold (object columns mixing numbers and text,
+# common in policy numbers) a type-tagged Feather file and its metadata
+PARSE_CACHE_DIR = "./cache/parsed"
+PARSE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Bump to invalidate every cached statement when parsing behaviour changes outside
+# the modules below (e.g. a pandas or pdf library upgrade)
+PARSER_VERSION = "1"
+
+# Modules whose source is part of the cache key, so editing a parsing rule
+# invalidates the statements parsed with the old rules
+PARSER_MODULES = [
+    "data_processing.py",
+    "excel_reader.py",
+    "data_cleaning.py",
+    "policy_normalization.py",
+    "pdf_processing.py",
+    "pdf_extractors.py",
+    "compaction.py",
+    "value_cleaning.py",
+]
+
+_parser_fingerprint = None
+
+
+def parser_fingerprint():
+    """Return PARSER_VERSION combined with a hash of the parsing modules' source."""
+    global _parser_fingerprint
+    if _parser_fingerprint is None:
+        digest = hashlib.sha256(PARSER_VERSION.encode())
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in PARSER_MODULES:
+            with open(os.path.join(module_dir, name), "rb") as f:
+                digest.update(f.read())
+        _parser_fingerprint = digest.hexdigest()
+    return _parser_fingerprint
+
+
+def parse_cache_key(file_bytes, bank_name):
+    """Build the cache key: SHA-256 of the file bytes + bank name + parser version."""
+    digest = hashlib.sha256(file_bytes)
+    digest.update(b"\0" + str(bank_name).encode())
+    digest.update(b"\0" + parser_fingerprint().encode())
+    return digest.hexdigest()
+
+
+def _cache_path(key, extension=".parquet"):
+    return os.path.join(PARSE_CACHE_DIR, f"{key}{extension}")
+
+
+def _read_cache_file(key):
+    """Return (path, DataFrame) of a cached statement, or (None, None) on a cache miss."""
+    path = _cache_path(key)
+    try:
+        return path, pd.read_parquet(path)
+    except (OSError, pa.ArrowException):
+        pass
+    path = _cache_path(key, ".feather")
+    try:
+        with open(_cache_path(key, ".feather.json")) as f:
+            meta = json.load(f)
+        return path, map_frame_file(path, meta)
+    except (OSError, ValueError, KeyError, pa.ArrowException):
+        return None, None
+
+
+def load_cached_frame(key):
+    """
+    Load a parsed statement from the cache.
+
+    Returns:
+    pd.DataFrame: The cached DataFrame, or None on a cache miss.
+    """
+    path, df = _read_cache_file(key)
+    if df is None:
+        return None
+
+    # Mark as recently used for LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+
+def store_cached_frame(key, df, max_bytes=PARSE_CACHE_MAX_BYTES):
+    """
+    Store a parsed statement in the cache and evict old entries above max_bytes.
+
+    Statements Parquet can't hold are stored with write_frame_file, which tags
+    the type of each value in columns mixing types or holding None so they
+    are read back as they were; statements neither format stores exactly are
+    not cached.
+    """
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        try:
+            df.to_parquet(tmp_path, index=False)
+        except (pa.ArrowException, ValueError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if not frame_file_exact(df):
+                print("Parsed statement not cached: it holds values the cache can't store exactly")
+                return
+            path = _cache_path(key, ".feather")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            meta = json.dumps(write_frame_file(df, tmp_path))
+            # The metadata is in place before the file that needs it
+            meta_path = _cache_path(key, ".feather.json")
+            with open(f"{meta_path}.{os.getpid()}.tmp", "w") as f:
+                f.write(meta)
+            os.replace(f"{meta_path}.{os.getpid()}.tmp", meta_path)
+        # Atomic rename, so concurrent readers never see a partial file
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Could not cache parsed statement: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    evict_parse_cache(max_bytes)
+
+
+def evict_parse_cache(max_bytes=PARSE_CACHE_MAX_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for name in os.listdir(PARSE_CACHE_DIR):
+        if name.endswith((".parquet", ".feather")):
+            try:
+                stat = os.stat(os.path.join(PARSE_CACHE_DIR, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(PARSE_CACHE_DIR, name))
+            total -= size
+        except OSError:
+            continue
+        if name.endswith(".feather"):
+            try:
+                os.remove(os.path.join(PARSE_CACHE_DIR, f"{name}.json"))
+            except OSError:
+                pass
+
+
+def clear_parse_cache():
+    """Delete every cached statement (e.g. after changing parsing rules)."""
+    if os.path.exists(PARSE_CACHE_DIR):
+        for name in os.listdir(PARSE_CACHE_DIR):
+            try:
+                os.remove(os.path.join(PARSE_CACHE_DIR, name))
+            except OSError as e:
+                print(f"Error removing cached file {name}: {e}")
@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import bisect
+import pdfplumber
+
+try:
+    import pymupdf
+except ImportError:  # PyMuPDF < 1.24 only ships the `fitz` module name
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+PYMUPDF = "pymupdf"
+PDFPLUMBER = "pdfplumber"
+
+# Backend tried first for banks without an entry in PDF_EXTRACTOR_CONFIG
+DEFAULT_PDF_BACKEND = PYMUPDF
+
+TEMPLATE = f"{PYMUPDF} (template)"
+
+# Learned table geometry (bounding box + column separators) per bank
+PDF_TEMPLATE_FILE = "./cache/pdf_templates.json"
+
+# Per-bank extractor settings:
+# - backend: extractor tried first; pages it can't read cleanly fall back to pdfplumber
+# - expected_columns: table width to expect (None = learn it from the first page)
+# - learn_geometry: reuse the table layout of the first page (or a stored template)
+#   for the remaining pages instead of running full table detection on each one
+PDF_EXTRACTOR_CONFIG = {
+    "The New India Pdf": {"backend": PYMUPDF, "expected_columns": None, "learn_geometry": True},
+    "United Pdf": {"backend": PYMUPDF, "expected_columns": None, "learn_geometry": True},
+}
+
+
+def get_extractor_config(bank_name):
+    """Return the extractor settings for a bank, filling in the defaults."""
+    config = {"backend": DEFAULT_PDF_BACKEND, "expected_columns": None, "learn_geometry": False}
+    config.update(PDF_EXTRACTOR_CONFIG.get(bank_name, {}))
+    if pymupdf is None or not hasattr(pymupdf.Page, "find_tables"):
+        # PyMuPDF missing or too old for table detection
+        config["backend"] = PDFPLUMBER
+        config["learn_geometry"] = False
+    return config
+
+
+def pymupdf_extract_tables(page):
+    """Extract the tables of a PyMuPDF page as lists of rows."""
+    tables = []
+    for table in page.find_tables().tables:
+        rows = table.extract()
+        # Headers detected above the table body are not part of extract()
+        if table.header.external:
+            rows = [list(table.header.names)] + rows
+        tables.append(rows)
+    return tables
+
+
+def pdfplumber_extract_tables(page):
+    """Extract the tables of a pdfplumber page as lists of rows."""
+    return page.extract_tables()
+
+
+def learn_table_template(page):
+    """
+    Detect the table geometry of a PyMuPDF page.
+
+    Returns:
+    dict: page_size, bbox of the largest table and its column separators
+        (x positions), or None when the page has no table.
+    """
+    tables = page.find_tables().tables
+    if not tables:
+        return None
+
+    table = max(tables, key=lambda t: (t.bbox[2] - t.bbox[0]) * (t.bbox[3] - t.bbox[1]))
+    columns = []
+    for x in sorted([cell[0] for cell in table.cells if cell] + [table.bbox[2]]):
+        # Cell edges within 2pt of each other are the same separator
+        if not columns or x - columns[-1] > 2:
+            columns.append(x)
+    if len(columns) < 2:
+        return None
+
+    return {
+        "page_size": [float(page.rect.width), float(page.rect.height)],
+        "bbox": [float(v) for v in table.bbox],
+        "columns": [float(x) for x in columns],
+    }
+
+
+def _row_separators(page, x0, x1):
+    """Return the y positions of horizontal rules spanning most of [x0, x1]."""
+    coverage = {}
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l" and abs(item[1].y - item[2].y) < 1:
+                segments = [(item[1].y, item[1].x, item[2].x)]
+            elif item[0] == "re":
+                rect = item[1]
+                segments = [(rect.y0, rect.x0, rect.x1), (rect.y1, rect.x0, rect.x1)]
+            else:
+                continue
+            for y, left, right in segments:
+                left, right = max(min(left, right), x0), min(max(left, right), x1)
+                if right > left:
+                    key = round(y)
+                    coverage[key] = coverage.get(key, 0) + (right - left)
+
+    separators = []
+    for y in sorted(y for y, width in coverage.items() if width >= 0.5 * (x1 - x0)):
+        if not separators or y - separators[-1] > 1:
+            separators.append(y)
+    return separators
+
+
+def extract_with_template(page, template):
+    """
+    Extract the table of a PyMuPDF page using stored geometry.
+
+    Words are placed into cells using the stored column separators and the
+    page's horizontal rules, which skips table detection entirely. A page
+    whose words cross the stored separators doesn't fit the template.
+
+    Returns:
+    list: The extracted tables, or None when the page doesn't fit the template.
+    """
+    width, height = template["page_size"]
+    if abs(page.rect.width - width) > 1 or abs(page.rect.height - height) > 1:
+        return None
+
+    columns = template["columns"]
+    x0, x1 = columns[0], columns[-1]
+    rows = _row_separators(page, x0, x1)
+    if len(rows) < 2:
+        return None
+
+    # cells[row][column] -> list of (y, x, word)
+    cells = [[[] for _ in range(len(columns) - 1)] for _ in range(len(rows) - 1)]
+    for wx0, wy0, wx1, wy1, word, *_ in page.get_text("words"):
+        x_mid, y_mid = (wx0 + wx1) / 2, (wy0 + wy1) / 2
+        if not (x0 <= x_mid <= x1 and rows[0] <= y_mid <= rows[-1]):
+            continue
+        column = bisect.bisect_right(columns, x_mid) - 1
+        if bisect.bisect_right(columns, wx0 + 1) != bisect.bisect_right(columns, wx1 - 1):
+            # A word crossing a column separator: this page has a different layout
+            return None
+        row = bisect.bisect_right(rows, y_mid) - 1
+        cells[min(row, len(rows) - 2)][min(column, len(columns) - 2)].append((round(wy0), wx0, word))
+
+    table = []
+    for row in cells:
+        values = []
+        for words in row:
+            lines = {}
+            for y, _, word in sorted(words):
+                lines.setdefault(y, []).append(word)
+            values.append("\n".join(" ".join(line) for line in lines.values()))
+        table.append(values)
+
+    if looks_malformed([table], len(columns) - 1):
+        return None
+    return [table]
+
+
+def load_table_template(bank_name):
+    """Load the stored table template for a bank, if any."""
+    try:
+        with open(PDF_TEMPLATE_FILE, "r") as f:
+            return json.load(f).get(bank_name)
+    except (OSError, ValueError):
+        return None
+
+
+def save_table_template(bank_name, template):
+    """Store the table template learned for a bank."""
+    try:
+        with open(PDF_TEMPLATE_FILE, "r") as f:
+            templates = json.load(f)
+    except (OSError, ValueError):
+        templates = {}
+
+    templates[bank_name] = template
+    os.makedirs(os.path.dirname(PDF_TEMPLATE_FILE), exist_ok=True)
+    tmp_path = f"{PDF_TEMPLATE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(templates, f)
+    os.replace(tmp_path, PDF_TEMPLATE_FILE)
+
+
+def looks_malformed(tables, expected_columns=None):
+    """
+    Check whether tables extracted from a page need a second opinion.
+
+    A page looks malformed when no table was found, a table has an empty
+    header row, its rows have different lengths, or its width differs from
+    `expected_columns`.
+    """
+    tables = [table for table in tables if table]
+    if not tables:
+        return True
+
+    for table in tables:
+        widths = {len(row) for row in table}
+        if len(widths) != 1:
+            return True
+        if not any(cell is not None and str(cell).strip() for cell in table[0]):
+            return True
+        if expected_columns and widths.pop() != expected_columns:
+            return True
+    return False
+
+
+def extract_pages(pdf_path, page_indices, backend=DEFAULT_PDF_BACKEND, expected_columns=None, template=None):
+    """
+    Extract the tables of the given pages, falling back to pdfplumber per page.
+
+    With a table template, each page is first read with the stored geometry;
+    pages that don't fit it go through full table detection.
+
+    Parameters:
+    pdf_path (str): Path to the PDF file.
+    page_indices (list): 0-based page indices, in order.
+    backend (str): Extractor tried first (PYMUPDF or PDFPLUMBER).
+    expected_columns (int): Expected table width, used to spot malformed pages.
+    template (dict): Table geometry from learn_table_template.
+
+    Returns:
+    list: One dict per page with page (1-based), tables, backend and seconds.
+    """
+    results = []
+    doc = pymupdf.open(pdf_path) if backend == PYMUPDF or template is not None else None
+    plumber = None
+    try:
+        for index in page_indices:
+            started = time.perf_counter()
+            tables, used = None, PDFPLUMBER
+
+            if template is not None and doc is not None:
+                tables = extract_with_template(doc[index], template)
+                used = TEMPLATE
+
+            if tables is None and backend == PYMUPDF:
+                tables = pymupdf_extract_tables(doc[index])
+                used = PYMUPDF
+                if looks_malformed(tables, expected_columns):
+                    tables = None
+
+            if tables is None:
+                if plumber is None:
+                    plumber = pdfplumber.open(pdf_path)
+                tables = pdfplumber_extract_tables(plumber.pages[index])
+                used = PDFPLUMBER if backend == PDFPLUMBER else f"{PDFPLUMBER} (fallback)"
+
+            results.append({
+                "page": index + 1,
+                "tables": tables,
+                "backend": used,
+                "seconds": time.perf_counter() - started,
+            })
+    finally:
+        if doc is not None:
+            doc.close()
+        if plumber is not None:
+            plumber.close()
+    return results
+
+
+def summarize_page_report(page_report):
+    """Summarize which backend handled how many pages and how long they took."""
+    summary = {}
+    for page in page_report:
+        entry = summary.setdefault(page["backend"], {"pages": 0, "seconds": 0.0})
+        entry["pages"] += 1
+        entry["seconds"] += page["seconds"]
+    return summary
@@ -1,64 +1,185 @@
+import os
 import pdfplumber
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from components.data_cleaning import clean_pdf_data
+from components.pdf_extractors import (
+    DEFAULT_PDF_BACKEND, TEMPLATE, pymupdf, extract_pages, get_extractor_config, learn_table_template,
+    load_table_template, save_table_template, summarize_page_report
+)
 
-def process_pdf_bank_data(pdf_path, bank_name):
+# Parallel extraction settings: worker processes (None = one per CPU) and pages per task
+PDF_WORKERS = None
+PDF_PAGE_CHUNK_SIZE = 25
+
+
+def extract_page_range(pdf_path, start, stop, backend=DEFAULT_PDF_BACKEND, expected_columns=None, template=None):
+    """
+    Extract the tables of pages [start, stop) (0-based) from a PDF.
+
+    Each call opens the PDF itself, so it can run in a separate worker process.
+
+    Returns:
+    list: Per-page dicts (page, tables, backend, seconds) in page order.
+    """
+    return extract_pages(
+        pdf_path, list(range(start, stop)), backend=backend, expected_columns=expected_columns, template=template
+    )
+
+
+def extract_pdf_tables(pdf_path, bank_name=None, parallel=False, workers=PDF_WORKERS, chunk_size=PDF_PAGE_CHUNK_SIZE,
+                       progress=None):
+    """
+    Extract the rows of every table in a PDF, in page order.
+
+    The first page is read in-process to learn the table width (unless the bank
+    configures one), which the remaining pages are checked against. For banks
+    with learn_geometry, the table layout comes from a stored template or the
+    first page, and the remaining pages are read with that geometry.
+
+    Parameters:
+    pdf_path (str): Path to the PDF file.
+    bank_name (str): Bank whose extractor settings to use (see PDF_EXTRACTOR_CONFIG).
+    parallel (bool): Split the page range across a process pool.
+    workers (int): Number of worker processes (None = one per CPU).
+    chunk_size (int): Number of pages handled by each worker task.
+    progress (callable): Called as progress(pages done, page count, "pages") as pages are extracted.
+
+    Returns:
+    tuple: (all table rows in sequential page order, per-page backend report)
+    """
+    config = get_extractor_config(bank_name)
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+    if page_count == 0:
+        return [], []
+
+    template = load_table_template(bank_name) if config["learn_geometry"] else None
+    page_report = extract_page_range(pdf_path, 0, 1, config["backend"], config["expected_columns"], template)
+    if progress:
+        progress(1, page_count, "pages")
+    if config["learn_geometry"] and page_report[0]["backend"] != TEMPLATE:
+        # No stored layout, or it doesn't fit this file: learn it from the first page
+        with pymupdf.open(pdf_path) as doc:
+            template = learn_table_template(doc[0])
+        if template is not None:
+            save_table_template(bank_name, template)
+
+    expected_columns = config["expected_columns"]
+    if expected_columns is None:
+        first_tables = [table for table in page_report[0]["tables"] if table]
+        expected_columns = len(first_tables[0][0]) if first_tables else None
+
+    chunk_size = max(1, int(chunk_size))
+    ranges = [(start, min(start + chunk_size, page_count)) for start in range(1, page_count, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    if parallel and len(ranges) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            # map() yields results in submission order, so pages stay in order
+            chunks = executor.map(
+                extract_page_range,
+                [pdf_path] * len(ranges),
+                [start for start, _ in ranges],
+                [stop for _, stop in ranges],
+                [config["backend"]] * len(ranges),
+                [expected_columns] * len(ranges),
+                [template] * len(ranges),
+            )
+            for chunk in chunks:
+                page_report.extend(chunk)
+                if progress:
+                    progress(len(page_report), page_count, "pages")
+    else:
+        for start, stop in ranges:
+            page_report.extend(extract_page_range(pdf_path, start, stop, config["backend"], expected_columns, template))
+            if progress:
+                progress(len(page_report), page_count, "pages")
+
+    all_tables = []
+    for page in page_report:
+        for table_num, table in enumerate(page["tables"], start=1):
+            if table:  # Check for non-empty tables
+                print(f"Page {page['page']}, Table {table_num} ({page['backend']}): Extracted {len(table)} rows.")
+                all_tables.extend(table)
+        # Only the backend and timing are kept in the report
+        del page["tables"]
+    return all_tables, page_report
+
+
+def build_table_frame(all_tables):
+    """
+    Build a DataFrame from extracted table rows, using the first row as headers.
+
+    Rows are padded to the same length; empty headers become Unnamed_<i> and
+    duplicate headers get a counter suffix.
+    """
+    # Ensure tables were extracted
+    if not all_tables:
+        raise ValueError("No tables found in the PDF.")
+
+    # Normalize rows to ensure consistent column lengths
+    max_cols = max(len(row) for row in all_tables if row)
+    normalized_table = [
+        row + [''] * (max_cols - len(row)) for row in all_tables
+    ]
+    df = pd.DataFrame(normalized_table)
+
+    print("Extracted DataFrame (Before Cleaning):")
+    print(df.head())
+
+    # Validate and assign headers
+    headers = df.iloc[0].fillna("").tolist()
+    headers = [f"Unnamed_{i}" if not col or col.strip() == "" else col for i, col in enumerate(headers)]
+
+    # Deduplicate headers by appending a counter to duplicates
+    seen = {}
+    unique_headers = []
+    for col in headers:
+        if col in seen:
+            seen[col] += 1
+            unique_headers.append(f"{col}_{seen[col]}")
+        else:
+            seen[col] = 0
+            unique_headers.append(col)
+
+    # Assign unique headers
+    df.columns = unique_headers
+    df = df.drop(0).reset_index(drop=True)
+
+    print("DataFrame After Header Assignment:")
+    print(df.head())
+
+    return df
+
+
+def process_pdf_bank_data(pdf_path, bank_name, parallel=False, workers=PDF_WORKERS, chunk_size=PDF_PAGE_CHUNK_SIZE,
+                          progress=None):
     """
     Extract tabular data from a PDF, clean it based on bank-specific rules, and return as a DataFrame.
 
     Parameters:
     pdf_path (str): Path to the PDF file.
     bank_name (str): The name of the bank to apply specific cleaning rules.
+    parallel (bool): Extract pages in parallel across a process pool.
+    workers (int): Number of worker processes for parallel extraction (None = one per CPU).
+    chunk_size (int): Number of pages per worker task for parallel extraction.
+    progress (callable): Called as progress(pages done, page count, "pages") during extraction.
 
     Returns:
     pd.DataFrame: Cleaned DataFrame containing extracted tabular data from the PDF.
+        The per-page backend report is available in `df.attrs["page_report"]`.
     """
     try:
-        # Extract tabular data using pdfplumber
-        with pdfplumber.open(pdf_path) as pdf:
-            all_tables = []
-            for page_num, page in enumerate(pdf.pages, start=1):
-                tables = page.extract_tables()
-                for table_num, table in enumerate(tables, start=1):
-                    if table:  # Check for non-empty tables
-                        print(f"Page {page_num}, Table {table_num}: Extracted {len(table)} rows.")
-                        all_tables.extend(table)
-
-        # Ensure tables were extracted
-        if not all_tables:
-            raise ValueError("No tables found in the PDF.")
-
-        # Normalize rows to ensure consistent column lengths
-        max_cols = max(len(row) for row in all_tables if row)
-        normalized_table = [
-            row + [''] * (max_cols - len(row)) for row in all_tables
-        ]
-        df = pd.DataFrame(normalized_table)
-
-        print("Extracted DataFrame (Before Cleaning):")
-        print(df.head())
-
-        # Validate and assign headers
-        headers = df.iloc[0].fillna("").tolist()
-        headers = [f"Unnamed_{i}" if not col or col.strip() == "" else col for i, col in enumerate(headers)]
-
-        # Deduplicate headers by appending a counter to duplicates
-        seen = {}
-        unique_headers = []
-        for col in headers:
-            if col in seen:
-                seen[col] += 1
-                unique_headers.append(f"{col}_{seen[col]}")
-            else:
-                seen[col] = 0
-                unique_headers.append(col)
-
-        # Assign unique headers
-        df.columns = unique_headers
-        df = df.drop(0).reset_index(drop=True)
-
-        print("DataFrame After Header Assignment:")
-        print(df.head())
+        # Extract tabular data with the bank's extractor backend (pdfplumber as fallback)
+        all_tables, page_report = extract_pdf_tables(
+            pdf_path, bank_name, parallel=parallel, workers=workers, chunk_size=chunk_size, progress=progress
+        )
+        for backend, stats in summarize_page_report(page_report).items():
+            print(f"{backend}: {stats['pages']} pages in {stats['seconds']:.2f}s")
+
+        # Build the raw table with headers from the first row
+        df = build_table_frame(all_tables)
 
         # Clean the data using bank-specific rules
         cleaned_df = clean_pdf_data(df, bank_name)
@@ -66,6 +187,9 @@ def process_pdf_bank_data(pdf_path, bank_name):
         print("Cleaned DataFrame (After Cleaning):")
         print(cleaned_df.head())
 
+        # Keep the per-page backend report with the result
+        cleaned_df.attrs["page_report"] = page_report
+
         return cleaned_df
 
     except Exception as e:
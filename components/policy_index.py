@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Keys are encoded and looked up in blocks of this many rows, which bounds the
+# temporary matrices
+BLOCK_ROWS = 65536
+
+def _encode(keys):
+    """
+    Encode keys as numpy byte strings (UTF-8), as they are and reversed.
+
+    The bytes are gathered from the Arrow buffers of the keys a block at a
+    time, without a Python call per key. UTF-8 byte order is code point order.
+
+    Returns:
+    tuple: (keys, reversed keys, missing) numpy arrays; missing keys are empty.
+    """
+    missing = keys.isna().to_numpy()
+    text = pa.array(keys.where(~missing, "").astype(str), from_pandas=True).cast(pa.large_binary())
+    offsets = np.frombuffer(text.buffers()[1], dtype=np.int64)[text.offset:text.offset + len(text) + 1]
+    data = np.frombuffer(text.buffers()[2], dtype=np.uint8) if text.buffers()[2] else np.zeros(1, dtype=np.uint8)
+    starts, lengths = offsets[:-1], np.diff(offsets)
+    width = max(int(lengths.max(initial=0)), 1)
+
+    forward = np.zeros((len(text), width), dtype=np.uint8)
+    backward = np.zeros((len(text), width), dtype=np.uint8)
+    columns = np.arange(width)
+    for start in range(0, len(text), BLOCK_ROWS):
+        block = slice(start, start + BLOCK_ROWS)
+        inside = columns < lengths[block, None]
+        forward[block][inside] = data[(starts[block, None] + columns)[inside]]
+        backward[block][inside] = data[(starts[block, None] + lengths[block, None] - 1 - columns)[inside]]
+    return forward.view(f"S{width}").ravel(), backward.view(f"S{width}").ravel(), missing
+
+
+def _insurer_groups(rows, insurers):
+    """Group row positions by insurer; returns [(insurer, rows)]."""
+    codes, names = pd.factorize(insurers.take(rows))
+    order = np.argsort(codes, kind='stable')
+    groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1)
+    return [(names[codes[group[0]]], rows[group]) for group in groups if len(group)]
+
+
+def _byte_matrix(values, width):
+    """View a bytes array as a (rows, width) uint8 matrix, zero-padded."""
+    return np.ascontiguousarray(values.astype(f"S{width}")).view(np.uint8).reshape(len(values), width)
+
+
+def _common_prefix_lengths(left, right):
+    """Length of the common prefix of each pair of byte strings."""
+    width = max(left.dtype.itemsize, right.dtype.itemsize)
+    differs = _byte_matrix(left, width) != _byte_matrix(right, width)
+    # The zero padding compares equal, so the result is capped by the shorter string
+    first_difference = np.where(differs.any(axis=1), differs.argmax(axis=1), width)
+    return np.minimum(first_difference, np.minimum(np.char.str_len(left), np.char.str_len(right)))
+
+
+class _SortedKeys:
+    """The distinct keys of one insurer in byte order, with the first row holding each."""
+
+    def __init__(self, keys, rows):
+        self.keys, first = np.unique(keys, return_index=True)
+        self.rows = rows[first]
+        # Common prefix length of each key with the key before it (0 for the first and past the last)
+        self.neighbours = np.zeros(len(self.keys) + 1, dtype=np.int64)
+        self.neighbours[1:-1] = _common_prefix_lengths(self.keys[:-1], self.keys[1:])
+
+    def longest_shared(self, queries):
+        """
+        Find the key sharing the longest prefix with each query.
+
+        In sorted order, the keys sharing the longest prefix with a query are
+        next to where the query would be inserted, so one binary search finds
+        the nearest of them. Another key shares as much of the query only if it
+        shares that much with the nearest key, which the neighbour prefix
+        lengths tell without searching again. When several do, the key that is
+        the shared prefix itself (one the query extends or equals) wins over
+        the keys that merely start with it; a second search finds it.
+
+        Returns:
+        tuple: (row of the key or -1 if several keys share the longest prefix,
+            none of them the shared prefix itself; shared length) numpy arrays.
+        """
+        count = len(self.keys)
+        positions = np.searchsorted(self.keys, queries)
+        before_key, after_key = np.maximum(positions - 1, 0), np.minimum(positions, count - 1)
+        before = np.where(positions > 0, _common_prefix_lengths(queries, self.keys[before_key]), 0)
+        after = np.where(positions < count, _common_prefix_lengths(queries, self.keys[after_key]), 0)
+        shared = np.maximum(before, after)
+
+        nearest = np.where(after >= before, after_key, before_key)
+        unique = (self.neighbours[nearest] < shared) & (self.neighbours[nearest + 1] < shared)
+        rows = np.where(unique, self.rows[nearest], -1)
+
+        # Ties: look the shared prefix itself up among the keys
+        tied = np.flatnonzero(~unique & (shared > 0))
+        if len(tied):
+            width = queries.dtype.itemsize
+            prefixes = _byte_matrix(queries[tied], width)
+            prefixes[np.arange(width) >= shared[tied, None]] = 0
+            prefixes = prefixes.view(f"S{width}").ravel()
+            found = np.minimum(np.searchsorted(self.keys, prefixes), count - 1)
+            whole = self.keys[found] == prefixes
+            rows[tied[whole]] = self.rows[found[whole]]
+        return rows, shared
+
+
+class PolicyKeyIndex:
+    """
+    Policy keys indexed per insurer for longest shared prefix / suffix lookups.
+
+    Each insurer's distinct keys are kept in two sorted byte arrays, as they
+    are (prefixes) and reversed (suffixes), so a lookup is a binary search
+    (np.searchsorted) over the keys of the query's insurer: O(log n)
+    per query, vectorized over all queries, for millions of keys. Lengths are
+    counted in UTF-8 bytes, i.e. characters for the ASCII policy numbers.
+
+    Truncated, padded or partly rewritten policy numbers (a suffix cut off, a
+    "/01" endorsement number added, trailing digits replaced) share a long
+    prefix or suffix with the original, so they are found without a rule per
+    insurer.
+    """
+
+    def __init__(self, keys, insurers=None):
+        """
+        Parameters:
+        keys (pd.Series): Policy keys; missing keys are not indexed.
+        insurers (pd.Series): Insurer of each key, aligned by position (default: one insurer for all).
+        """
+        forward, backward, missing = _encode(keys)
+        insurers = pd.Series("", index=keys.index) if insurers is None else insurers
+        rows = np.flatnonzero(~missing & insurers.notna().to_numpy())
+        self._prefixes = {}
+        self._suffixes = {}
+        for insurer, group in _insurer_groups(rows, insurers):
+            self._prefixes[insurer] = _SortedKeys(forward[group], group)
+            self._suffixes[insurer] = _SortedKeys(backward[group], group)
+        self.size = len(rows)
+
+    def __len__(self):
+        return self.size
+
+    def _lookup(self, keys, insurers, min_length):
+        """
+        Look keys up in the prefix and the suffix indexes of their insurers.
+
+        Returns:
+        list: [(rows, shared lengths) of the prefixes, (rows, shared lengths) of the suffixes].
+        """
+        forward, backward, missing = _encode(keys)
+        insurers = pd.Series("", index=keys.index) if insurers is None else insurers
+        queried = np.flatnonzero(~missing & insurers.isin(list(self._prefixes)).to_numpy())
+        groups = _insurer_groups(queried, insurers)
+
+        results = []
+        for indexes, encoded in ((self._prefixes, forward), (self._suffixes, backward)):
+            rows = np.full(len(keys), -1, dtype=np.int64)
+            shared = np.zeros(len(keys), dtype=np.int64)
+            for insurer, group in groups:
+                for start in range(0, len(group), BLOCK_ROWS):
+                    block = group[start:start + BLOCK_ROWS]
+                    rows[block], shared[block] = indexes[insurer].longest_shared(encoded[block])
+            rows[shared < min_length] = -1
+            results.append((rows, shared))
+        return results
+
+    def longest_prefix(self, keys, insurers=None, min_length=1):
+        """
+        Find the indexed key of the same insurer sharing the longest prefix with each key.
+
+        Parameters:
+        keys (pd.Series): Keys to look up.
+        insurers (pd.Series): Insurer of each key (omit if the index was built without insurers).
+        min_length (int): Shortest shared prefix that counts.
+
+        Returns:
+        tuple: (row of the indexed key, shared length) numpy arrays. The row is
+            -1 when no key shares `min_length` characters, or when several
+            different keys share the longest prefix (unless one of them is that
+            prefix itself, i.e. the key extends or equals it).
+        """
+        return self._lookup(keys, insurers, min_length)[0]
+
+    def longest_suffix(self, keys, insurers=None, min_length=1):
+        """Like longest_prefix, for the longest shared suffix."""
+        return self._lookup(keys, insurers, min_length)[1]
+
+    def longest_affix(self, keys, insurers=None, min_length=1):
+        """
+        Find the indexed key sharing the longest prefix or suffix with each key.
+
+        The longer of the two matches decides (so an ambiguous long prefix
+        isn't overruled by a shorter suffix); equally long ones must point to
+        the same key.
+
+        Returns:
+        tuple: (row of the indexed key, shared length) numpy arrays, as longest_prefix.
+        """
+        (prefix_rows, prefix_shared), (suffix_rows, suffix_shared) = self._lookup(keys, insurers, min_length)
+        rows = np.where(suffix_shared > prefix_shared, suffix_rows, prefix_rows)
+        rows[(prefix_shared == suffix_shared) & (prefix_rows != suffix_rows)] = -1
+        return rows, np.maximum(prefix_shared, suffix_shared)
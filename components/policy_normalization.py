@@ -0,0 +1,116 @@
+import re
+import pandas as pd
+
+# Precompiled patterns shared by the insurer rules below
+SLASH_AND_AFTER = re.compile(r"/.*")
+LEADING_ZERO = re.compile(r"^0")
+NEW_INDIA_ENDORSEMENT_SUFFIX = re.compile(r"(0{8})\d{3}$")
+FIVE_ZERO_SUFFIX = re.compile(r"0{5}\d{1,3}$")
+NON_DIGITS = re.compile(r"\D")
+NON_ALPHANUMERIC = re.compile(r"[^a-zA-Z0-9]")
+ALPHANUMERIC_ONLY = re.compile(r"^[a-zA-Z0-9]+$")
+
+# Rule-set key for the generic 9-digit numeric policy key
+NINE_DIGIT = "NINE_DIGIT"
+
+
+def split_before_slash(policies):
+    """Keep everything before the first '/' (GO DIGIT endorsement suffixes)."""
+    return policies.str.split("/", n=1).str[0].str.strip()
+
+
+def drop_after_slash(policies):
+    """Remove the first '/' and everything after it on the same line."""
+    return policies.str.replace(SLASH_AND_AFTER, "", regex=True)
+
+
+def strip_leading_zero(policies):
+    """Remove a single leading zero."""
+    return policies.str.replace(LEADING_ZERO, "", regex=True)
+
+
+def truncate(length):
+    """Build a rule that keeps only the first `length` characters."""
+    def _truncate(policies):
+        return policies.str[:length]
+    return _truncate
+
+
+def drop_new_india_endorsement_suffix(policies):
+    """Remove the last 3 digits when the number ends with 8 zeros + 3 digits."""
+    return policies.str.replace(NEW_INDIA_ENDORSEMENT_SUFFIX, r"\1", regex=True)
+
+
+def digits_only(policies):
+    """Remove everything except numbers."""
+    return policies.str.replace(NON_DIGITS, "", regex=True)
+
+
+def collapse_five_zero_suffix(policies):
+    """Remove the digits after the last set of five zeros."""
+    return policies.str.replace(FIVE_ZERO_SUFFIX, "00000", regex=True)
+
+
+def require_alphanumeric(policies):
+    """Blank out (NaN) policy numbers that are not purely alphanumeric."""
+    return policies.where(policies.str.match(ALPHANUMERIC_ONLY).fillna(False).astype(bool))
+
+
+def pad_to_nine_digits(policies):
+    """Trim to the first 9 digits, or zero-pad shorter numbers to 9 digits."""
+    return policies.str[:9].str.zfill(9)
+
+
+# Insurer-specific policy number rules, applied in order to every row of that insurer.
+# Keys are the insurer names as they appear in the data: full names on the broker side,
+# bank_config names for the PDF statements.
+POLICY_RULES = {
+    "GO DIGIT GENERAL INSURANCE LIMITED": [split_before_slash],
+    "TATA AIG GENERAL INSURANCE COMPANY LIMITED": [strip_leading_zero, truncate(10)],
+    "THE NEW INDIA ASSURANCE COMPANY LIMITED": [drop_new_india_endorsement_suffix],
+    "The New India Pdf": [digits_only, collapse_five_zero_suffix],
+    "United Pdf": [drop_after_slash, require_alphanumeric],
+    NINE_DIGIT: [digits_only, pad_to_nine_digits],
+}
+
+
+def apply_policy_rules(policies, rules):
+    """Run a list of vectorized rules over a Series of policy numbers."""
+    for rule in rules:
+        policies = rule(policies)
+    return policies
+
+
+def normalize_policy_numbers(policies, insurers):
+    """
+    Normalize policy numbers with the rules registered for each insurer.
+
+    Rows are grouped by insurer and each insurer's rules run once over the whole
+    group with vectorized string operations. Insurers without registered rules
+    are returned unchanged.
+
+    Parameters:
+    policies (pd.Series): Policy numbers (converted to strings).
+    insurers (pd.Series or str): Insurer of each row, or a single insurer / rule-set
+        key (e.g. "United Pdf", NINE_DIGIT) that applies to every row.
+
+    Returns:
+    pd.Series: Normalized policy numbers, aligned with `policies`.
+    """
+    policies = policies.astype(str)
+
+    if not isinstance(insurers, pd.Series):
+        return apply_policy_rules(policies, POLICY_RULES.get(insurers, []))
+
+    normalized = policies.astype(object)
+    insurers = pd.Series(insurers.to_numpy(), index=policies.index)
+    has_rules = insurers.isin(list(POLICY_RULES))
+    if not has_rules.any():
+        return policies
+
+    positions = pd.Series(range(len(policies)), index=policies.index)[has_rules]
+    for insurer, group in positions.groupby(insurers[has_rules], sort=False, observed=True):
+        rows = group.to_numpy()
+        normalized.iloc[rows] = apply_policy_rules(policies.iloc[rows], POLICY_RULES[insurer]).to_numpy()
+
+    return normalized
@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+from components.value_cleaning import parse_amounts
+
+# Rows sent to the browser per page, and the page sizes offered
+PAGE_ROWS = 100
+PAGE_SIZES = [50, 100, 500, 1000]
+
+# Columns the viewer filters and sorts on, by role: the first column present
+# (names compared stripped and upper-cased) is used. The comparison results
+# have SOURCE_BANK where the statements have Source.
+VIEW_COLUMNS = {
+    'FOUND': ['FOUND'],
+    'SOURCE': ['SOURCE', 'SOURCE_BANK'],
+    'DIFFERENCE': ['DIFFERENCE'],
+}
+
+# Sort key for the size of DIFFERENCE, offered besides the roles themselves
+ABS_DIFFERENCE = "|DIFFERENCE|"
+
+# Column the aggregates are grouped by: the insurer as the broker file names
+# it (results, broker data), else the statement the rows come from
+INSURER_COLUMNS = ['BANK NAME', 'SOURCE', 'SOURCE_BANK']
+
+# Amount columns summed per insurer, where present
+AGGREGATE_AMOUNTS = ['TOTAL PREMIUM', 'PREMIUM BANK', 'TOTAL COMMISSION BROKER', 'TOTAL COMMISSION', 'DIFFERENCE']
+
+
+def _find_column(df, names):
+    """The first column of df named one of `names` (compared stripped and upper-cased), or None."""
+    columns = {}
+    for col in df.columns:
+        columns.setdefault(str(col).strip().upper(), col)
+    for name in names:
+        if name in columns:
+            return columns[name]
+    return None
+
+
+def view_columns(df):
+    """The column of df playing each VIEW_COLUMNS role: {role: column}, for the roles present."""
+    found = {role: _find_column(df, names) for role, names in VIEW_COLUMNS.items()}
+    return {role: col for role, col in found.items() if col is not None}
+
+
+def _labels(values):
+    """Distinct labels of a column, in category order for categoricals, else sorted."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        present = set(values.dropna().unique())
+        return [str(label) for label in values.cat.categories if label in present]
+    return sorted(values.dropna().astype(str).unique())
+
+
+def view_options(df):
+    """
+    Values the viewer's filters offer, computed once per frame.
+
+    Returns:
+    dict: {role: column, ...} under 'columns'; the FOUND / SOURCE labels
+        present under their roles; (min, max) of DIFFERENCE under 'DIFFERENCE';
+        the sort keys under 'sort_keys'.
+    """
+    columns = view_columns(df)
+    options = {'columns': columns, 'sort_keys': list(columns)}
+    for role in ('FOUND', 'SOURCE'):
+        if role in columns:
+            options[role] = _labels(df[columns[role]])
+    if 'DIFFERENCE' in columns:
+        difference = parse_amounts(df[columns['DIFFERENCE']]).dropna()
+        options['DIFFERENCE'] = (float(difference.min()), float(difference.max())) if len(difference) else (0.0, 0.0)
+        options['sort_keys'].append(ABS_DIFFERENCE)
+    return options
+
+
+def view_rows(df, view):
+    """
+    Filter and sort the rows of df on the server; only positions are kept.
+
+    Parameters:
+    df (pd.DataFrame): The frame viewed.
+    view (dict): Optional keys FOUND and SOURCE (labels to keep), difference
+        ((low, high) bounds of DIFFERENCE, inclusive; None for no bound),
+        nonzero_difference (bool: only rows with a DIFFERENCE other than 0),
+        sort_by (a sort key of view_options) and ascending (bool). Roles df
+        doesn't have are ignored.
+
+    Returns:
+    np.ndarray: Positions of the rows to show, in order.
+    """
+    columns = view_columns(df)
+    keep = np.ones(len(df), dtype=bool)
+    for role in ('FOUND', 'SOURCE'):
+        if role in columns and view.get(role):
+            keep &= df[columns[role]].astype(str).isin(view[role]).to_numpy(dtype=bool)
+
+    difference = parse_amounts(df[columns['DIFFERENCE']]).to_numpy(dtype=float) if 'DIFFERENCE' in columns else None
+    if difference is not None:
+        low, high = view.get('difference') or (None, None)
+        if low is not None:
+            keep &= difference >= low
+        if high is not None:
+            keep &= difference <= high
+        if view.get('nonzero_difference'):
+            keep &= (difference != 0) & ~np.isnan(difference)
+    rows = np.flatnonzero(keep)
+
+    sort_by = view.get('sort_by')
+    if sort_by == ABS_DIFFERENCE and difference is not None:
+        values = pd.Series(np.abs(difference[rows]))
+    elif sort_by in columns:
+        values = df[columns[sort_by]].take(rows).reset_index(drop=True)
+    else:
+        return rows
+    # Stable, so rows with equal values keep their order; missing values go last
+    order = values.sort_values(ascending=view.get('ascending', True), kind='stable', na_position='last').index
+    return rows[order.to_numpy()]
+
+
+def page_count(rows, page_rows=PAGE_ROWS):
+    """Number of pages of `page_rows` rows the positions fill (at least 1)."""
+    return max(1, -(-len(rows) // page_rows))
+
+
+def result_page(df, rows, page, page_rows=PAGE_ROWS):
+    """
+    The rows of one page (numbered from 1, clamped to the pages there are).
+
+    Only this slice of df is copied, so the browser receives one page
+    however large df is. The original index is kept.
+    """
+    page = min(max(page, 1), page_count(rows, page_rows))
+    return df.take(rows[(page - 1) * page_rows:page * page_rows])
+
+
+def insurer_aggregates(df):
+    """
+    Aggregate df per insurer, as the default view of large frames.
+
+    Parameters:
+    df (pd.DataFrame): Comparison results, combined statements or broker data.
+
+    Returns:
+    pd.DataFrame: One row per insurer (the first INSURER_COLUMNS column of
+        df) with the row count, rows per FOUND label, rows with a non-zero
+        DIFFERENCE and the sums of the AGGREGATE_AMOUNTS columns present, plus
+        a TOTAL row; None if df has no insurer column.
+    """
+    insurer_col = _find_column(df, INSURER_COLUMNS)
+    if insurer_col is None:
+        return None
+
+    insurers = df[insurer_col].astype(object).where(df[insurer_col].notna(), "(none)").to_numpy()
+    data = {'Rows': np.ones(len(df), dtype=np.int64)}
+    found_col = _find_column(df, ['FOUND'])
+    if found_col is not None:
+        for label in _labels(df[found_col]):
+            data[label] = (df[found_col].astype(str) == label).to_numpy(dtype=np.int64)
+    difference_col = _find_column(df, ['DIFFERENCE'])
+    if difference_col is not None:
+        difference = parse_amounts(df[difference_col]).to_numpy(dtype=float)
+        data['Rows with a difference'] = ((difference != 0) & ~np.isnan(difference)).astype(np.int64)
+    for name in AGGREGATE_AMOUNTS:
+        col = _find_column(df, [name])
+        if col is not None:
+            data[col] = parse_amounts(df[col]).to_numpy(dtype=float)
+
+    return _with_total(pd.DataFrame(data).groupby(insurers, sort=True).sum(), str(insurer_col))
+
+
+def _with_total(aggregates, insurer_name):
+    """Append the TOTAL row to per-insurer aggregates and name the insurer column."""
+    total = aggregates.sum().to_frame('TOTAL').T
+    aggregates = pd.concat([aggregates, total]).astype(aggregates.dtypes)
+    return aggregates.rename_axis(insurer_name).reset_index()
+
+
+def combine_aggregates(frames):
+    """
+    Sum the insurer_aggregates of parts of a frame (e.g. the chunks of streamed
+    results) into those of the whole frame.
+
+    Returns:
+    pd.DataFrame: As insurer_aggregates; None if no part has an insurer column.
+    """
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return None
+    # Each part's TOTAL row is its last one; labels missing from a part count 0
+    parts = [frame.iloc[:-1].set_index(frame.columns[0]) for frame in frames]
+    dtypes = {}
+    for part in parts:
+        for col, dtype in part.dtypes.items():
+            dtypes.setdefault(col, dtype)
+    aggregates = pd.concat(parts).fillna(0).groupby(level=0, sort=True).sum().astype(dtypes)
+    return _with_total(aggregates, str(frames[0].columns[0]))
@@ -0,0 +1,133 @@
+import os
+import json
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+from components.compaction import SpilledFrame
+
+# A snapshot directory holds manifest.json plus one Feather file per DataFrame
+MANIFEST_NAME = "manifest.json"
+
+# Bump when the manifest layout changes; snapshots of another version are ignored
+SNAPSHOT_VERSION = 1
+
+
+def encode_output(value, directory, name, files=None):
+    """
+    Encode a stage output as JSON, writing its DataFrames to Feather files in `directory`.
+
+    The file names (`name` plus a counter) are appended to `files`.
+    """
+    files = [] if files is None else files
+    if isinstance(value, pd.DataFrame):
+        os.makedirs(directory, exist_ok=True)
+        file_name = f"{name}-{len(files)}.feather"
+        files.append(file_name)
+        return {"frame": file_name, "meta": SpilledFrame.write(value, directory, file_name).meta}
+    if isinstance(value, (list, tuple)):
+        items = [encode_output(item, directory, name, files) for item in value]
+        return {"list" if isinstance(value, list) else "tuple": items}
+    return {"value": value}
+
+
+def _frame_files(encoded):
+    """List the Feather files of an encoded stage output."""
+    if "frame" in encoded:
+        return [encoded["frame"]]
+    return [name for item in encoded.get("list", encoded.get("tuple", [])) for name in _frame_files(item)]
+
+
+def decode_output(encoded, directory):
+    """Inverse of encode_output; DataFrames are returned as (not yet loaded) SpilledFrames."""
+    if "frame" in encoded:
+        return SpilledFrame(os.path.join(directory, encoded["frame"]), encoded["meta"])
+    if "list" in encoded:
+        return [decode_output(item, directory) for item in encoded["list"]]
+    if "tuple" in encoded:
+        return tuple(decode_output(item, directory) for item in encoded["tuple"])
+    return encoded["value"]
+
+
+def save_session_snapshot(directory, session_id, state, outputs):
+    """
+    Save a session: its JSON state and the DataFrames of its stage outputs.
+
+    Each DataFrame goes to its own uncompressed Feather file, so a restored
+    session can memory-map only the frames it uses. Outputs already in the
+    snapshot (same fingerprint) are kept without being loaded; frames of
+    outputs no longer part of the session are deleted.
+
+    Parameters:
+    directory (str): The snapshot directory (e.g. in the session's workspace).
+    session_id (str): The session saved.
+    state (dict): JSON-serializable session values (uploads, flags, ...).
+    outputs (dict): {fingerprint: (stage name, function returning the output)}
+        of the stage outputs to keep.
+    """
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_manifest(directory)
+    saved = previous["outputs"] if previous else {}
+
+    files = []
+    encoded = {}
+    for fingerprint, (stage, get_output) in outputs.items():
+        if fingerprint in saved:
+            encoded[fingerprint] = saved[fingerprint]
+            files.extend(_frame_files(saved[fingerprint]["value"]))
+            continue
+        try:
+            value = encode_output(get_output(), directory, f"{stage}-{fingerprint[:24]}", files)
+            encoded[fingerprint] = {"stage": stage, "value": value}
+        except (OSError, pa.ArrowException, TypeError, ValueError) as e:
+            print(f"Could not save the {stage} output to the session snapshot: {e}")
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "session_id": session_id,
+        "saved_at": datetime.now().isoformat(timespec='seconds'),
+        "state": state,
+        "outputs": encoded,
+    }
+    # Atomic replace, so a concurrent restore never reads a partial manifest
+    tmp_path = os.path.join(directory, f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, default=str)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+    keep = set(files) | {MANIFEST_NAME}
+    for name in os.listdir(directory):
+        if name not in keep and not name.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def _read_manifest(directory):
+    """Return the manifest in a snapshot directory, or None if missing, unreadable or outdated."""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == SNAPSHOT_VERSION else None
+
+
+def load_session_snapshot(directory):
+    """
+    Read a session snapshot without loading any DataFrame.
+
+    Returns:
+    tuple: (state dict, {fingerprint: (stage name, output with SpilledFrames)}),
+        or None if the directory holds no (readable) snapshot.
+    """
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        return None
+
+    outputs = {
+        fingerprint: (entry["stage"], decode_output(entry["value"], directory))
+        for fingerprint, entry in manifest["outputs"].items()
+    }
+    return manifest["state"], outputs
+
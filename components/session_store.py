@@ -0,0 +1,165 @@
+import os
+import time
+import shutil
+import secrets
+import sqlite3
+import threading
+
+# Per-session working directories (uploads, session snapshot, spilled frames)
+WORKSPACES_DIR = "./workspaces"
+SESSION_DB_PATH = os.path.join(WORKSPACES_DIR, "sessions.sqlite3")
+
+# Sessions (and their workspaces) expire this many seconds after login
+SESSION_TTL_SECONDS = 8 * 60 * 60
+
+# Expired sessions are cleaned up at most this often per process
+CLEANUP_INTERVAL_SECONDS = 10 * 60
+
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+"""
+
+# One connection per thread and database: Streamlit runs each session's script
+# in its own thread, and sqlite3 connections can't be shared between threads
+_connections = threading.local()
+_last_cleanup = 0.0
+
+
+def _enable_wal(conn, attempts=100):
+    """Switch a database to WAL mode (persistent, so this is only done once per database)."""
+    for _ in range(attempts):
+        try:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                return
+            # Switching needs an exclusive lock and doesn't wait for it like other statements
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError:
+            time.sleep(0.05)
+    raise sqlite3.OperationalError("Could not switch the database to WAL mode.")
+
+
+def open_database(path, schema):
+    """
+    Return this thread's connection to a WAL-mode SQLite database, creating it with `schema` if needed.
+
+    WAL mode lets any number of readers (threads or server processes) work
+    while one writer commits; writers wait up to 30s for each other.
+    """
+    connections = getattr(_connections, "by_path", None)
+    if connections is None:
+        connections = _connections.by_path = {}
+    if path not in connections:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        _enable_wal(conn)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(schema)
+        connections[path] = conn
+    return connections[path]
+
+
+def open_session_store(path=SESSION_DB_PATH):
+    """Return this thread's connection to the session store."""
+    return open_database(path, SESSION_SCHEMA)
+
+
+def workspace_dir(session_id, workspaces_dir=WORKSPACES_DIR):
+    """Return (and create) the workspace directory of a session."""
+    path = os.path.join(workspaces_dir, session_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def create_session(conn, username, ttl=SESSION_TTL_SECONDS, workspaces_dir=WORKSPACES_DIR):
+    """
+    Start a session for a logged-in user.
+
+    Returns:
+    dict: The session (session_id, username, created_at, expires_at).
+    """
+    created_at = time.time()
+    session = {
+        'session_id': secrets.token_hex(16),
+        'username': username,
+        'created_at': created_at,
+        'expires_at': created_at + ttl,
+    }
+    with conn:
+        conn.execute(
+            "INSERT INTO sessions (session_id, username, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            (session['session_id'], username, session['created_at'], session['expires_at'])
+        )
+    workspace_dir(session['session_id'], workspaces_dir)
+    return session
+
+
+def get_session(conn, session_id):
+    """
+    Look up a session.
+
+    Returns:
+    dict: The session, or None if it doesn't exist or has expired.
+    """
+    if not session_id:
+        return None
+    row = conn.execute(
+        "SELECT session_id, username, created_at, expires_at FROM sessions "
+        "WHERE session_id = ? AND expires_at > ?",
+        (str(session_id), time.time())
+    ).fetchone()
+    if row is None:
+        return None
+    return {'session_id': row[0], 'username': row[1], 'created_at': row[2], 'expires_at': row[3]}
+
+
+def end_session(conn, session_id, workspaces_dir=WORKSPACES_DIR):
+    """Delete a session and its workspace (only this session's files)."""
+    with conn:
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    shutil.rmtree(os.path.join(workspaces_dir, session_id), ignore_errors=True)
+
+
+def cleanup_expired_sessions(conn, workspaces_dir=WORKSPACES_DIR, force=False):
+    """
+    Delete expired sessions and their workspaces.
+
+    Workspaces without a live session (e.g. left by a crashed process) are
+    removed once they are older than the session TTL. Runs at most every
+    CLEANUP_INTERVAL_SECONDS per process unless `force` is set.
+
+    Returns:
+    int: Number of workspaces removed.
+    """
+    global _last_cleanup
+    now = time.time()
+    if not force and now - _last_cleanup < CLEANUP_INTERVAL_SECONDS:
+        return 0
+    _last_cleanup = now
+
+    expired = [row[0] for row in conn.execute("SELECT session_id FROM sessions WHERE expires_at <= ?", (now,))]
+    removed = 0
+    for session_id in expired:
+        end_session(conn, session_id, workspaces_dir)
+        removed += 1
+
+    live = {row[0] for row in conn.execute("SELECT session_id FROM sessions")}
+    for name in os.listdir(workspaces_dir) if os.path.isdir(workspaces_dir) else []:
+        path = os.path.join(workspaces_dir, name)
+        if name in live or not os.path.isdir(path):
+            continue
+        try:
+            if now - os.path.getmtime(path) < SESSION_TTL_SECONDS:
+                continue  # possibly a session being created right now
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return removed
@@ -0,0 +1,158 @@
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from components.compaction import SpilledFrame, frame_file_exact
+from components.comparison import compare_bank_and_broker, insurer_shards
+
+# Shards are compared in this many worker processes (None = one per CPU)
+SHARD_WORKERS = None
+
+# Shard inputs and results are handed between processes as Feather files in
+# temporary directories here, memory-mapped by the receiving process
+SHARD_DIR = "./cache/shards"
+
+# Broker row order of each shard's rows (regular policies, then endorsements),
+# carried through the shard comparison to put the results back in order
+ORDER_COLUMN = "\0BROKER ORDER"
+
+def _handoff(df, directory, name):
+    """Prepare df for another process: a SpilledFrame when Feather can hold it, else df itself (pickled)."""
+    if frame_file_exact(df):
+        try:
+            return SpilledFrame.write(df, directory, f"{name}.feather")
+        except (pa.ArrowException, ValueError, TypeError):
+            pass
+    return df
+
+
+def _receive(handoff):
+    return handoff.load() if isinstance(handoff, SpilledFrame) else handoff
+
+
+def _compare_shard(number, insurer, bank_handoff, broker_handoff, directory, compare_kwargs):
+    """Compare one shard in a worker process; returns (insurer, result handoff, seconds)."""
+    started = time.perf_counter()
+    merged_df = compare_bank_and_broker(_receive(bank_handoff), _receive(broker_handoff), **compare_kwargs)
+    seconds = time.perf_counter() - started
+    return insurer, _handoff(merged_df, directory, f"result-{number}"), seconds
+
+
+def _shard_frames(combined_df, broker_df, shard, broker_rows):
+    """The bank and broker rows of a shard, the broker rows tagged with their ORDER_COLUMN."""
+    insurer, bank_rows, regular_rows, endorsement_rows = shard
+    rows = np.concatenate([regular_rows, endorsement_rows])
+    # Regular policies come first in the results, then endorsements, each in broker order
+    order = np.concatenate([regular_rows, endorsement_rows + broker_rows])
+    return (combined_df.take(bank_rows).rename(columns=str),
+            broker_df.take(rows).rename(columns=str).assign(**{ORDER_COLUMN: order}))
+
+
+def compare_sharded(combined_df, broker_df, workers=SHARD_WORKERS, progress=None, timings=None, **compare_kwargs):
+    """
+    Reconcile bank and broker data one insurer at a time, in parallel.
+
+    The data is split with insurer_shards and each shard goes through
+    compare_bank_and_broker in a pool of worker processes. Shards are handed
+    over as uncompressed Feather files the workers memory-map (pickled when
+    Feather can't hold a frame unchanged), and the results come back the same
+    way. The results are put back in the row order compare_bank_and_broker
+    produces, so the output is the same as comparing everything at once. When
+    an exact key crosses insurers (the shards would match differently) or
+    there is only one shard, everything is compared at once instead.
+
+    Parameters:
+    combined_df (pd.DataFrame): Combined output of the processed bank statements.
+    broker_df (pd.DataFrame): Output of broker_data_process.
+    workers (int): Worker processes (None = one per CPU; 1 compares the shards in this process).
+    progress (callable): Called as progress(broker rows matched, broker rows to match, "rows")
+        as shards finish.
+    timings (list): If given, one dict per shard (insurer, bank_rows, broker_rows,
+        result_rows, seconds) is appended, in the order the shards finish.
+    **compare_kwargs: Options of compare_bank_and_broker (reserved_bank_rows is split with the bank rows).
+
+    Returns:
+    pd.DataFrame: Like compare_bank_and_broker.
+
+    Raises:
+    ValueError: Like compare_bank_and_broker.
+    """
+    shards = insurer_shards(combined_df, broker_df)
+    if shards is None or len(shards) < 2:
+        reason = "policy keys shared across insurers" if shards is None else "a single insurer"
+        print(f"Sharded comparison: {reason}, comparing all insurers at once")
+        return compare_bank_and_broker(combined_df, broker_df, progress=progress, **compare_kwargs)
+
+    reserved = compare_kwargs.pop('reserved_bank_rows', None)
+
+    def shard_kwargs(shard):
+        if reserved is None:
+            return compare_kwargs
+        return {**compare_kwargs, 'reserved_bank_rows': np.asarray(reserved, dtype=bool)[shard[1]]}
+
+    # Largest shards first, so a big one doesn't start last
+    shards.sort(key=lambda shard: -(len(shard[1]) + len(shard[2]) + len(shard[3])))
+    sizes = {shard[0]: (len(shard[1]), len(shard[2]) + len(shard[3])) for shard in shards}
+    total_rows = sum(broker_rows for _, broker_rows in sizes.values())
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+
+    results = []
+    done_rows = 0
+
+    def record(insurer, merged_df, seconds):
+        nonlocal done_rows
+        results.append(merged_df)
+        bank_rows, broker_rows = sizes[insurer]
+        done_rows += broker_rows
+        print(f"Shard {insurer}: {broker_rows} broker / {bank_rows} bank rows -> {len(merged_df)} rows "
+              f"in {seconds:.2f}s")
+        if timings is not None:
+            timings.append({'insurer': insurer, 'bank_rows': bank_rows, 'broker_rows': broker_rows,
+                            'result_rows': len(merged_df), 'seconds': seconds})
+        if progress:
+            progress(done_rows, total_rows, "rows")
+
+    started = time.perf_counter()
+    if workers <= 1:
+        for shard in shards:
+            shard_started = time.perf_counter()
+            merged_df = compare_bank_and_broker(
+                *_shard_frames(combined_df, broker_df, shard, len(broker_df)), **shard_kwargs(shard)
+            )
+            record(shard[0], merged_df, time.perf_counter() - shard_started)
+    else:
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        directory = tempfile.mkdtemp(dir=SHARD_DIR)
+        try:
+            # Spawned rather than forked workers, as for jobs (see create_job_pool)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = []
+                for number, shard in enumerate(shards):
+                    bank_shard, broker_shard = _shard_frames(combined_df, broker_df, shard, len(broker_df))
+                    futures.append(pool.submit(
+                        _compare_shard,
+                        number,
+                        shard[0],
+                        _handoff(bank_shard, directory, f"bank-{number}"),
+                        _handoff(broker_shard, directory, f"broker-{number}"),
+                        directory,
+                        shard_kwargs(shard)
+                    ))
+                for future in as_completed(futures):
+                    insurer, handoff, seconds = future.result()
+                    record(insurer, _receive(handoff), seconds)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    # Stable, so the rows of a broker record matching several bank rows keep their order
+    merged_df = pd.concat(results, ignore_index=True)
+    merged_df = merged_df.take(np.argsort(merged_df[ORDER_COLUMN].to_numpy(), kind='stable'))
+    merged_df = merged_df.drop(columns=ORDER_COLUMN).reset_index(drop=True)
+    print(f"Sharded comparison: {len(shards)} shards in {workers} processes, "
+          f"{time.perf_counter() - started:.2f}s")
+    return merged_df
@@ -0,0 +1,233 @@
+import os
+import sys
+import uuid
+import shutil
+import hashlib
+import weakref
+from collections import OrderedDict, namedtuple
+import pandas as pd
+import pyarrow as pa
+from components.compaction import SPILL_DIR, SpilledFrame, frame_memory
+
+# Memory budget of the memoized stage outputs (per graph, i.e. per session)
+STAGE_CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+# Outputs pushed out of the memory budget are spilled to disk up to this size;
+# only DataFrames of at least SPILL_MIN_BYTES are worth spilling
+STAGE_SPILL_MAX_BYTES = 4 * 1024 ** 3
+SPILL_MIN_BYTES = 1024 ** 2
+
+# An input value with a precomputed fingerprint (e.g. an upload identified by
+# the hash of its bytes), so it isn't hashed again on every rerun
+Fingerprinted = namedtuple("Fingerprinted", ["value", "fingerprint"])
+
+
+def fingerprint_value(value):
+    """Return a stable hex fingerprint of an input value."""
+    digest = hashlib.sha256()
+    if isinstance(value, Fingerprinted):
+        digest.update(b"F" + str(value.fingerprint).encode())
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        digest.update(b"B" + bytes(value))
+    elif isinstance(value, pd.DataFrame):
+        digest.update(b"D" + repr(list(value.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"L")
+        for item in value:
+            digest.update(fingerprint_value(item).encode())
+    elif isinstance(value, dict):
+        digest.update(b"M")
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode() + fingerprint_value(value[key]).encode())
+    else:
+        digest.update(b"R" + repr(value).encode())
+    return digest.hexdigest()
+
+
+def estimate_size(value):
+    """Estimate the memory held by a stage output, in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return frame_memory(value)
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+def spill_value(value, directory):
+    """
+    Replace the large DataFrames in a stage output by SpilledFrames.
+
+    Returns:
+    tuple: (the spilled output, bytes written to disk); 0 bytes if nothing was spilled.
+    """
+    if isinstance(value, pd.DataFrame) and frame_memory(value) >= SPILL_MIN_BYTES:
+        spilled = SpilledFrame.write(value, directory)
+        return spilled, spilled.nbytes
+    if isinstance(value, (list, tuple)) and not isinstance(value, Fingerprinted):
+        items = [spill_value(item, directory) for item in value]
+        return type(value)(item for item, _ in items), sum(size for _, size in items)
+    return value, 0
+
+
+def restore_value(value):
+    """Inverse of spill_value: memory-map the spilled DataFrames of an output back."""
+    if isinstance(value, SpilledFrame):
+        return value.load()
+    if isinstance(value, (list, tuple)) and not isinstance(value, Fingerprinted):
+        return type(value)(restore_value(item) for item in value)
+    return value
+
+
+def remove_spilled(value):
+    """Delete the spill files of a spilled stage output."""
+    if isinstance(value, SpilledFrame):
+        value.remove()
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            remove_spilled(item)
+
+
+class StageGraph:
+    """
+    A small graph of pipeline stages whose outputs are memoized.
+
+    Each stage is a function of named inputs: other stages, or external
+    inputs passed to run(). A stage's fingerprint combines its name with the
+    fingerprints of its inputs, so running a stage again only recomputes the
+    stages whose inputs changed. Outputs are kept in an LRU cache bounded by
+    `max_bytes`. Outputs pushed out of it (or larger than the whole budget)
+    have their DataFrames spilled to disk, up to `max_spill_bytes`, and are
+    memory-mapped back when used again. Outputs saved elsewhere (e.g. in a
+    session snapshot) can be registered with restore().
+    """
+
+    def __init__(self, max_bytes=STAGE_CACHE_MAX_BYTES, max_spill_bytes=STAGE_SPILL_MAX_BYTES,
+                 spill_dir=SPILL_DIR):
+        self.max_bytes = max_bytes
+        self.max_spill_bytes = max_spill_bytes
+        self.spill_dir = os.path.join(spill_dir, uuid.uuid4().hex)
+        self.stages = {}
+        self._cache = OrderedDict()  # fingerprint -> (value, size)
+        self._spilled = OrderedDict()  # fingerprint -> (spilled value, bytes on disk)
+        self._restored = {}  # fingerprint -> output with SpilledFrames owned by someone else
+        self.used_bytes = 0
+        self.spilled_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # The spill files go with the graph (e.g. when a session ends)
+        weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+
+    def add_stage(self, name, func, inputs=()):
+        """Register a stage computing func(*inputs) from stages or external inputs."""
+        self.stages[name] = (func, tuple(inputs))
+
+    def fingerprint(self, name, **inputs):
+        """Return the fingerprint of a stage for the given external inputs."""
+        return self._fingerprint(name, inputs, {})
+
+    def _fingerprint(self, name, inputs, seen):
+        if name in seen:
+            return seen[name]
+        if name in self.stages:
+            digest = hashlib.sha256(b"S" + name.encode())
+            for dependency in self.stages[name][1]:
+                digest.update(self._fingerprint(dependency, inputs, seen).encode())
+            seen[name] = digest.hexdigest()
+        elif name in inputs:
+            seen[name] = fingerprint_value(inputs[name])
+        else:
+            raise KeyError(f"Missing input '{name}'.")
+        return seen[name]
+
+    def run(self, name, **inputs):
+        """Return a stage's output, recomputing only the stages whose inputs changed."""
+        return self._run(name, inputs, {})
+
+    def _run(self, name, inputs, seen):
+        if name not in self.stages:
+            value = inputs[name]
+            return value.value if isinstance(value, Fingerprinted) else value
+
+        key = self._fingerprint(name, inputs, seen)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key][0]
+        if key in self._spilled:
+            self._spilled.move_to_end(key)
+            self.hits += 1
+            return restore_value(self._spilled[key][0])
+        if key in self._restored:
+            self.hits += 1
+            return restore_value(self._restored[key])
+
+        self.misses += 1
+        func, dependencies = self.stages[name]
+        value = func(*[self._run(dependency, inputs, seen) for dependency in dependencies])
+        self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            self._spill(key, value)
+            return
+        self._cache[key] = (value, size)
+        self.used_bytes += size
+        # Spill least recently used outputs until the cache fits its budget
+        while self.used_bytes > self.max_bytes:
+            evicted_key, (evicted, evicted_size) = self._cache.popitem(last=False)
+            self.used_bytes -= evicted_size
+            self._spill(evicted_key, evicted)
+
+    def _spill(self, key, value):
+        """Move an output to disk; outputs without large DataFrames are dropped."""
+        try:
+            spilled, size = spill_value(value, self.spill_dir)
+        except (OSError, pa.ArrowException, ValueError) as e:
+            print(f"Could not spill stage output: {e}")
+            return
+        if size == 0:
+            return
+        self._spilled[key] = (spilled, size)
+        self.spilled_bytes += size
+        while self.spilled_bytes > self.max_spill_bytes:
+            _, (evicted, evicted_size) = self._spilled.popitem(last=False)
+            self.spilled_bytes -= evicted_size
+            remove_spilled(evicted)
+
+    def restore(self, fingerprint, value):
+        """
+        Register a stage output stored outside the graph, under its fingerprint.
+
+        The SpilledFrames in `value` are only memory-mapped when the stage is
+        used, and their files are left alone by spilling and clear().
+        """
+        self._restored[fingerprint] = value
+
+    def is_memoized(self, fingerprint):
+        """Whether an output with this fingerprint is held (in memory, spilled or restored)."""
+        return fingerprint in self._cache or fingerprint in self._spilled or fingerprint in self._restored
+
+    def clear(self):
+        """Drop every memoized output, in memory and on disk."""
+        self._cache.clear()
+        self._restored.clear()
+        for spilled, _ in self._spilled.values():
+            remove_spilled(spilled)
+        self._spilled.clear()
+        self.used_bytes = 0
+        self.spilled_bytes = 0
+
+    def summary(self):
+        """Return cache statistics: entries and bytes in memory, spilled entries and bytes, hits and misses."""
+        return {
+            "entries": len(self._cache), "bytes": self.used_bytes,
+            "spilled_entries": len(self._spilled), "spilled_bytes": self.spilled_bytes,
+            "hits": self.hits, "misses": self.misses,
+        }
@@ -0,0 +1,138 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from components.data_processing import BANK_CONFIG, process_bank_data, read_bank_excel
+from components.pdf_processing import PDF_WORKERS, process_pdf_bank_data
+from components.parse_cache import parse_cache_key, load_cached_frame, store_cached_frame
+
+# Statement file types by extension
+FILE_TYPES = {
+    ".xlsx": "Excel",
+    ".xlsm": "Excel",
+    ".xlsb": "Excel",
+    ".xls": "Excel",
+    ".pdf": "PDF",
+}
+
+
+def statement_file_type(file_path):
+    """Return the statement file type ("Excel" / "PDF") for a path, or None."""
+    return FILE_TYPES.get(os.path.splitext(str(file_path))[1].lower())
+
+
+def parse_statement(file_path, file_type, bank_name, use_cache=True, parallel=False, workers=PDF_WORKERS,
+                    progress=None):
+    """
+    Parse an insurer statement into the standard bank columns.
+
+    Parameters:
+    file_path (str): Path to the statement.
+    file_type (str): "Excel" or "PDF".
+    bank_name (str): The bank whose rules apply (a BANK_CONFIG / PDF bank name).
+    use_cache (bool): Serve and store results in the parse cache.
+    parallel (bool): Extract PDF pages across a process pool.
+    workers (int): Worker processes of that pool (None = one per CPU).
+    progress (callable): Called as progress(done, total, unit) with pages of a PDF, or rows once an Excel
+        statement (or a cached result) is processed.
+
+    Returns:
+    tuple: (processed DataFrame, whether it came from the parse cache)
+    """
+    if file_type not in ("Excel", "PDF"):
+        raise ValueError("Only Excel and PDF files are currently supported for processing.")
+
+    cache_key = None
+    if use_cache:
+        with open(file_path, "rb") as f:
+            cache_key = parse_cache_key(f.read(), bank_name)
+        cached = load_cached_frame(cache_key)
+        if cached is not None:
+            if progress:
+                progress(len(cached), len(cached), "rows")
+            return cached, True
+
+    if file_type == "Excel":
+        # Read only the bank's configured columns and pass them to process_bank_data
+        processed_data = process_bank_data(read_bank_excel(file_path, bank_name), bank_name)
+        if progress:
+            progress(len(processed_data), len(processed_data), "rows")
+    else:
+        processed_data = process_pdf_bank_data(
+            file_path, bank_name, parallel=parallel, workers=workers, progress=progress
+        )
+
+    if cache_key is not None and not processed_data.empty:
+        store_cached_frame(cache_key, processed_data)
+    return processed_data, False
+
+
+def _bank_key(name):
+    """Normalize a bank or file name for matching: lowercase alphanumerics only."""
+    return "".join(ch for ch in str(name).casefold() if ch.isalnum())
+
+
+def detect_bank_from_filename(file_path, bank_names=None):
+    """
+    Guess the bank of a statement from its file name.
+
+    PDF statements are matched against the PDF banks ("... Pdf") and Excel
+    statements against the rest; the longest bank name found in the file
+    name wins.
+
+    Returns:
+    str: The bank name, or None if no bank name appears in the file name.
+    """
+    file_type = statement_file_type(file_path)
+    name = _bank_key(os.path.splitext(os.path.basename(file_path))[0])
+
+    best = None
+    for bank in bank_names or BANK_CONFIG:
+        is_pdf_bank = bank.lower().endswith(" pdf")
+        if is_pdf_bank != (file_type == "PDF"):
+            continue
+        key = _bank_key(bank[:-4] if is_pdf_bank else bank)
+        if key.startswith("the") and len(key) > 3:
+            key = key[3:]
+        if key and key in name and (best is None or len(key) > len(best[0])):
+            best = (key, bank)
+    return best[1] if best else None
+
+
+def _parse_statement_task(task):
+    """Parse one statement in a worker process, capturing timing and errors."""
+    file_path, file_type, bank_name = task
+    started = time.perf_counter()
+    try:
+        df, from_cache = parse_statement(file_path, file_type, bank_name)
+        error = None
+    except Exception as e:
+        df, from_cache, error = None, False, str(e)
+    return {
+        "file": os.path.basename(file_path),
+        "bank": bank_name,
+        "rows": 0 if df is None else len(df),
+        "seconds": time.perf_counter() - started,
+        "from_cache": from_cache,
+        "error": error,
+        "data": df,
+    }
+
+
+def parse_statements(tasks, workers=None):
+    """
+    Parse several statements in parallel across a process pool.
+
+    Parameters:
+    tasks (list): (file_path, file_type, bank_name) tuples.
+    workers (int): Number of worker processes (None = one per CPU).
+
+    Returns:
+    list: One result dict per task, in task order, with file, bank, rows,
+        seconds, from_cache, error and data (the DataFrame, or None on error).
+    """
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        return [_parse_statement_task(task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_parse_statement_task, tasks))
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Amounts as written in Indian statements: digits grouped with commas
+# ("1,23,456.70"), an optional currency marker, a "Cr"/"Dr" side (debits are
+# negative) or accounting parentheses for negatives. Numbers exported as text
+# in exponent form ("1.5E+05") are amounts too. The patterns are RE2 (pyarrow
+# compute) regular expressions, applied to upper-cased text without commas and
+# spaces.
+AMOUNT_MARKERS = r"(CR|DR)\.?$|^(RS\.?|INR|₹)"
+AMOUNT_NUMBER = r"^[-+]?(\d+\.?\d*|\.\d+)(E[-+]?\d+)?$"
+
+
+def _is_text(values):
+    return values.dtype == object or isinstance(values.dtype, pd.StringDtype)
+
+
+def _arrow_text(values):
+    """A column of strings (and missing values) as a pyarrow array; raises if it holds other values."""
+    if isinstance(values.dtype, pd.StringDtype):
+        return pa.array(values.array, from_pandas=True).cast(pa.large_string())
+    return pa.array(values.to_numpy(dtype=object), type=pa.large_string(), from_pandas=True)
+
+
+def _parse_amount_text(text):
+    """Parse a pyarrow array of amount strings; returns float64 numpy amounts (NaN if not an amount)."""
+    text = pc.utf8_upper(pc.utf8_trim_whitespace(text))
+    opens, closes = pc.starts_with(text, "("), pc.ends_with(text, ")")
+    # Parentheses mark a negative only when both are there
+    parenthesized = pc.and_(opens, closes)
+    text = pc.if_else(parenthesized, pc.utf8_slice_codeunits(text, 1, -1), text)
+    debit = pc.match_substring_regex(text, r"DR\.?$")
+    text = pc.replace_substring(pc.replace_substring(text, ",", ""), " ", "")
+    text = pc.replace_substring_regex(text, AMOUNT_MARKERS, "")
+    valid = pc.and_(pc.match_substring_regex(text, AMOUNT_NUMBER), pc.equal(opens, closes))
+    numbers = pc.cast(pc.if_else(valid, text, None), pa.float64()).to_numpy(zero_copy_only=False)
+    negative = pc.fill_null(pc.or_(parenthesized, debit), False).to_numpy(zero_copy_only=False)
+    return np.where(negative, -numbers, numbers)
+
+
+def parse_amounts(values):
+    """
+    Parse a column of amounts into float64, vectorized.
+
+    Text is parsed with pyarrow compute kernels in one pass over the column:
+    commas, spaces and currency markers are dropped, "(1,200.00)" and
+    "1,200.00 Dr" become negative, "1,200.00 Cr" stays positive. Numbers are
+    converted directly, also when mixed with text in an object column.
+
+    Parameters:
+    values (pd.Series): Amounts as numbers and / or text.
+
+    Returns:
+    pd.Series: float64 amounts; NaN for blanks and values that aren't amounts.
+    """
+    if pd.api.types.is_bool_dtype(values) or not (_is_text(values) or pd.api.types.is_numeric_dtype(values)):
+        return pd.to_numeric(values, errors='coerce').astype('float64')
+    if not _is_text(values):
+        return values.astype('float64')
+
+    try:
+        return pd.Series(_parse_amount_text(_arrow_text(values)), index=values.index, dtype='float64')
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    # Numbers mixed with text: the numbers are converted directly, the rest parsed
+    amounts = pd.to_numeric(values, errors='coerce').astype('float64')
+    pending = (amounts.isna() & values.notna()).to_numpy()
+    if pending.any():
+        amounts[pending] = _parse_amount_text(_arrow_text(values[pending].astype(str)))
+    return amounts
+
+
+def _text_series(text, index):
+    """Wrap a pyarrow string array as a Series (the default string dtype of the installed pandas)."""
+    return text.to_pandas().set_axis(index)
+
+
+def normalize_text(values, case="upper"):
+    """
+    Trim text, collapse inner whitespace and set its case, vectorized.
+
+    Missing values stay missing and blank text becomes missing; other
+    values are converted to text.
+
+    Parameters:
+    values (pd.Series): The column to normalize.
+    case (str): "upper", "lower" or None to keep the case.
+
+    Returns:
+    pd.Series: The normalized text.
+    """
+    try:
+        text = _arrow_text(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        text = _arrow_text(values.astype(str).where(values.notna()))
+    text = pc.utf8_trim_whitespace(text)
+    # Collapsing whitespace takes a regex replace; only run it if some value needs it
+    if pc.any(pc.match_substring_regex(text, r"\s\s|[\t\n\r\f\v]")).as_py():
+        text = pc.replace_substring_regex(text, r"\s+", " ")
+    if case == "upper":
+        text = pc.utf8_upper(text)
+    elif case == "lower":
+        text = pc.utf8_lower(text)
+    return _text_series(pc.if_else(pc.equal(text, ""), None, text), values.index)
+
+
+def blank_to_na(values):
+    """Trim the strings of a column and turn blank ones into NA; other values are kept."""
+    if not _is_text(values):
+        return values
+    try:
+        text = pc.utf8_trim_whitespace(_arrow_text(values))
+        return _text_series(pc.if_else(pc.equal(text, ""), None, text), values.index)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    try:
+        stripped = values.str.strip()
+    except AttributeError:
+        # An object column without strings (e.g. only numbers)
+        return values
+    # Strings mixed with other values: .str methods return NaN for the values
+    # that aren't strings, which are kept as they are
+    is_text = stripped.notna()
+    cleaned = values.where(~is_text, stripped)
+    return cleaned.mask(is_text & (stripped == ""), pd.NA)
+
+
+def clean_text_columns(df):
+    """Trim the strings of every text column and turn blank ones into NA, one pass per column."""
+    # By position, so duplicate column names (e.g. from PDF tables) work too
+    positions = [i for i in range(df.shape[1]) if _is_text(df.iloc[:, i])]
+    if not positions:
+        return df
+    cleaned = df.copy(deep=False)
+    for i in positions:
+        cleaned.isetitem(i, blank_to_na(df.iloc[:, i]))
+    return cleaned